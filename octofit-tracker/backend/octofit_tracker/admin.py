@@ -1,13 +1,142 @@
-from django.contrib import admin
-from .models import User, Team, Activity, Leaderboard, Workout
+"""
+Admin for OctoFit Tracker.
+
+The activity, leaderboard and user changelists are built for tables with
+millions of rows: they page with ``EstimatedCountPaginator`` and skip the
+unfiltered total (``show_full_result_count = False``). Search matches
+prefixes or exact values, which can use an index, instead of ``icontains``
+scans. Emails and leaderboard usernames are matched case-sensitively so the
+match can use an index.
+``list_filter`` choices and counts come from ``CachedFacetFilter`` instead
+of a ``DISTINCT`` over the whole table. Users and workouts are also searched
+through the in-memory index of ``octofit_tracker.search``.
+"""
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Sum
+from django.utils.functional import cached_property
+
+from .aggregation import _collection, uses_mongo
+from .models import User, Team, Activity, ActivityRollup, Leaderboard, Workout
+from .search import indexes
+
+FACET_KEY = 'octofit:admin-facets:{}:{}'
+COUNT_KEY = 'octofit:admin-count:{}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs an unbounded ``COUNT(*)``.
+
+    Unfiltered tables use MongoDB's collection metadata count, or a count
+    cached for ``count_timeout`` seconds on other databases. Filtered or
+    searched results are counted up to ``max_count`` rows only, so a broad
+    search shows at most that many results' worth of pages;
+    ``count_is_estimate`` tells whether the count stopped there.
+    """
+    max_count = 10000
+    count_timeout = 300
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            count = queryset.order_by()[:self.max_count].count()
+            self.count_is_estimate = count >= self.max_count
+            return count
+        model = queryset.model
+        if uses_mongo(queryset.db):
+            return _collection(model, queryset.db).estimated_document_count()
+        return cache.get_or_set(
+            COUNT_KEY.format(model._meta.label_lower), lambda: queryset.order_by().count(), self.count_timeout,
+        )
+
+
+class CachedFacetFilter(admin.SimpleListFilter):
+    """
+    Exact-match list filter on ``parameter_name`` whose choices and counts
+    are computed with one grouped query and cached for ``facet_timeout``
+    seconds.
+    """
+    facet_timeout = 600
+
+    def lookups(self, request, model_admin):
+        key = FACET_KEY.format(model_admin.model._meta.label_lower, self.parameter_name)
+        counts = cache.get_or_set(key, lambda: list(self.get_facet_counts(model_admin.model)), self.facet_timeout)
+        return [(value, f'{value} ({count})') for value, count in counts if value]
+
+    def get_facet_counts(self, model):
+        """Return ``(value, count)`` pairs ordered by value."""
+        field = self.parameter_name
+        return model.objects.values_list(field).annotate(count=Count('pk')).order_by(field)
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(**{self.parameter_name: self.value()})
+
+
+class TeamFilter(CachedFacetFilter):
+    title = 'team'
+    parameter_name = 'team'
+
+
+class ActivityTypeFilter(CachedFacetFilter):
+    title = 'activity type'
+    parameter_name = 'activity_type'
+
+    def get_facet_counts(self, model):
+        # Summed from the daily rollups instead of grouping every activity
+        return (
+            ActivityRollup.objects.values_list('activity_type')
+            .annotate(count=Sum('activity_count'))
+            .order_by('activity_type')
+        )
+
+
+class IndexedSearchAdmin(admin.ModelAdmin):
+    """
+    Search the model's in-memory inverted index, plus the (indexable)
+    ``search_fields``, instead of scanning text columns.
+    """
+    search_max_results = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term.strip():
+            return results, may_have_duplicates
+        matches = [pk for pk, _ in indexes[self.model].search(search_term, self.search_max_results)]
+        return results | queryset.filter(pk__in=matches), may_have_duplicates
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too large to count or scan"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None and changelist.paginator.count_is_estimate:
+            self.message_user(
+                request,
+                f'At least {changelist.result_count} results match; only that many are counted and paged. '
+                'Narrow the search or filters to see the rest.',
+                messages.WARNING,
+            )
+        return response
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(IndexedSearchAdmin, LargeTableAdmin):
     """Admin configuration for User model"""
     list_display = ('username', 'email', 'team', 'created_at')
-    search_fields = ('username', 'email', 'team')
-    list_filter = ('team',)
+    # Username and team are matched through the search index
+    search_fields = ('email__startswith',)
+    list_filter = (TeamFilter,)
     ordering = ('username',)
 
 
@@ -20,27 +149,30 @@ class TeamAdmin(admin.ModelAdmin):
 
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(LargeTableAdmin):
     """Admin configuration for Activity model"""
     list_display = ('user_email', 'activity_type', 'duration', 'calories_burned', 'date')
-    search_fields = ('user_email', 'activity_type')
-    list_filter = ('activity_type', 'date')
-    ordering = ('-date',)
+    search_fields = ('user_email__startswith', 'activity_type__exact')
+    list_filter = (ActivityTypeFilter, 'date')
+    ordering = ('-date', '-id')
 
 
 @admin.register(Leaderboard)
-class LeaderboardAdmin(admin.ModelAdmin):
+class LeaderboardAdmin(LargeTableAdmin):
     """Admin configuration for Leaderboard model"""
     list_display = ('rank', 'username', 'team', 'total_calories', 'total_activities', 'updated_at')
-    search_fields = ('username', 'user_email', 'team')
-    list_filter = ('team',)
-    ordering = ('rank',)
+    # Case-sensitive prefixes, so the match can use leaderboard_username_idx
+    search_fields = ('username__startswith', 'user_email__startswith', 'team__exact')
+    list_filter = (TeamFilter,)
+    # Same order as rank, served by leaderboard_calories_idx
+    ordering = ('-total_calories', 'id')
 
 
 @admin.register(Workout)
-class WorkoutAdmin(admin.ModelAdmin):
+class WorkoutAdmin(IndexedSearchAdmin):
     """Admin configuration for Workout model"""
     list_display = ('name', 'category', 'difficulty', 'duration', 'calories_estimate')
-    search_fields = ('name', 'category', 'difficulty')
+    # Name, category and description are matched through the search index
+    search_fields = ('difficulty__iexact',)
     list_filter = ('category', 'difficulty')
     ordering = ('name',)
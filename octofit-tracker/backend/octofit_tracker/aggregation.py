@@ -0,0 +1,108 @@
+"""
+Leaderboard and team aggregations pushed down into the database.
+
+On djongo the ORM's ``GROUP BY`` support is limited and aggregates can end
+up being computed client-side, so the totals run as native MongoDB
+aggregation pipelines through pymongo. Other backends (SQLite in local
+development and tests) run the equivalent ORM ``annotate`` queries. Both
+paths return the same rows.
+"""
+from django.db import connections
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import User, Activity
+
+
+def uses_mongo(using='default'):
+    return connections[using].vendor == 'djongo'
+
+
+def _collection(model, using):
+    connection = connections[using]
+    connection.ensure_connection()
+    # djongo's connection object is the pymongo Database
+    return connection.connection[model._meta.db_table]
+
+
+def user_totals(using='default', email_range=None):
+    """
+    Return ``{'user_email', 'calories', 'activities'}`` rows, one per user
+    with activities, ordered by calories descending. ``email_range`` is an
+    optional ``(low, high)`` pair limiting the rows to ``low <= user_email
+    < high``; either bound may be ``None``.
+    """
+    low, high = email_range or (None, None)
+    if uses_mongo(using):
+        bounds = {}
+        if low is not None:
+            bounds['$gte'] = low
+        if high is not None:
+            bounds['$lt'] = high
+        pipeline = [{'$match': {'user_email': bounds}}] if bounds else []
+        pipeline += [
+            {'$group': {
+                '_id': '$user_email',
+                'calories': {'$sum': '$calories_burned'},
+                'activities': {'$sum': 1},
+            }},
+            {'$sort': {'calories': -1, '_id': 1}},
+            {'$project': {'_id': 0, 'user_email': '$_id', 'calories': 1, 'activities': 1}},
+        ]
+        return list(_collection(Activity, using).aggregate(pipeline, allowDiskUse=True))
+    activities = Activity.objects.using(using)
+    if low is not None:
+        activities = activities.filter(user_email__gte=low)
+    if high is not None:
+        activities = activities.filter(user_email__lt=high)
+    return list(
+        activities
+        .values('user_email')
+        .annotate(calories=Sum('calories_burned'), activities=Count('id'))
+        .order_by('-calories', 'user_email')
+    )
+
+
+def team_totals(using='default'):
+    """
+    Return ``{'team', 'calories', 'activities', 'members'}`` rows, one per
+    team, ordered by calories descending. ``members`` counts users with at
+    least one activity; activities of unknown users or users without a team
+    are grouped under ``''``.
+    """
+    if uses_mongo(using):
+        pipeline = [
+            {'$group': {
+                '_id': '$user_email',
+                'calories': {'$sum': '$calories_burned'},
+                'activities': {'$sum': 1},
+            }},
+            {'$lookup': {
+                'from': User._meta.db_table,
+                'localField': '_id',
+                'foreignField': 'email',
+                'as': 'user',
+            }},
+            {'$unwind': {'path': '$user', 'preserveNullAndEmptyArrays': True}},
+            {'$group': {
+                '_id': {'$ifNull': ['$user.team', '']},
+                'calories': {'$sum': '$calories'},
+                'activities': {'$sum': '$activities'},
+                'members': {'$sum': 1},
+            }},
+            {'$sort': {'calories': -1, '_id': 1}},
+            {'$project': {'_id': 0, 'team': '$_id', 'calories': 1, 'activities': 1, 'members': 1}},
+        ]
+        return list(_collection(Activity, using).aggregate(pipeline, allowDiskUse=True))
+    team = User.objects.using(using).filter(email=OuterRef('user_email')).values('team')[:1]
+    return list(
+        Activity.objects.using(using)
+        .annotate(team=Coalesce(Subquery(team), Value('')))
+        .values('team')
+        .annotate(
+            calories=Sum('calories_burned'),
+            activities=Count('id'),
+            members=Count('user_email', distinct=True),
+        )
+        .order_by('-calories', 'team')
+    )
@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+
+
+class OctofitTrackerConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'octofit_tracker'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .metrics import install_query_wrapper
+
+        connection_created.connect(install_query_wrapper)
+
+        if settings.DATABASES['default']['ENGINE'] == 'djongo':
+            from .db_monitoring import register_pool_listener
+            register_pool_listener()
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
 application = get_asgi_application()
+
+# Replay activities left by a previous process in buffered ingestion mode
+from octofit_tracker import ingestion  # noqa: E402
+
+ingestion.start()
@@ -0,0 +1,89 @@
+"""
+Native async read views for OctoFit Tracker.
+
+These mirror the list and retrieve endpoints of the DRF viewsets under
+``/api/async/``, reusing each viewset's filters, ordering, keyset
+pagination, fast read plan and ``?q=`` search, but run as ``async def``
+Django views on the async ORM API. Under an ASGI server a request waiting
+on a slow client holds no worker thread. See ``docs/asgi_deployment.md``.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from . import views
+from .metrics import timed_render
+from .renderers import dumps
+
+RESOURCES = {
+    'users': views.UserViewSet,
+    'teams': views.TeamViewSet,
+    'activities': views.ActivityViewSet,
+    'leaderboard': views.LeaderboardViewSet,
+    'workouts': views.WorkoutViewSet,
+}
+
+
+def _json_response(data, status=200):
+    return HttpResponse(timed_render(dumps)(data), status=status, content_type='application/json')
+
+
+async def api_root(request):
+    """
+    OctoFit Tracker async API root
+    """
+    return _json_response({
+        name: request.build_absolute_uri(reverse('async-list', kwargs={'resource': name}))
+        for name in RESOURCES
+    })
+
+
+class AsyncReadView(View):
+    """
+    Async list (``pk`` absent) and retrieve (``pk`` given) for one resource.
+    """
+
+    def get_viewset(self, request, resource, action):
+        try:
+            viewset_class = RESOURCES[resource]
+        except KeyError:
+            raise Http404
+        return viewset_class(request=Request(request), format_kwarg=None, args=(), kwargs={}, action=action)
+
+    async def get(self, request, resource, pk=None):
+        viewset = self.get_viewset(request, resource, 'list' if pk is None else 'retrieve')
+        try:
+            plan = viewset.get_read_plan()
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            if pk is None and getattr(viewset, 'get_window', None) and viewset.get_window() != 'all':
+                return _json_response(await sync_to_async(viewset.get_window_data)(viewset.get_window()))
+            if pk is None and getattr(viewset, 'get_search_query', None) and viewset.get_search_query():
+                # Matches come from the in-memory search index, as on the sync endpoint
+                return _json_response(await sync_to_async(viewset.get_search_data)(viewset.get_search_query()))
+            if pk is None:
+                return await self.list(viewset, queryset, plan)
+            return await self.retrieve(viewset, queryset, plan, pk)
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return _json_response(data, status=exc.status_code)
+
+    async def list(self, viewset, queryset, plan):
+        paginator = viewset.paginator
+        rows = queryset.values_list(*viewset.get_read_columns(plan, queryset), named=True)
+        page_queryset = paginator.get_page_queryset(rows, viewset.request, viewset) if paginator else None
+        if page_queryset is None:
+            return _json_response([plan.to_representation(row) async for row in rows])
+        page = paginator.set_page([row async for row in page_queryset])
+        return _json_response(paginator.get_paginated_data([plan.to_representation(row) for row in page]))
+
+    async def retrieve(self, viewset, queryset, plan, pk):
+        try:
+            row = await queryset.filter(**{viewset.lookup_field: pk}).values_list(*plan.columns).afirst()
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            return _json_response({'detail': 'Not found.'}, status=404)
+        return _json_response(plan.to_representation(row))
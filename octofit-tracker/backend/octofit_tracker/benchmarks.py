@@ -0,0 +1,305 @@
+"""
+Benchmark suite for the OctoFit Tracker API.
+
+``run_benchmarks`` seeds the database at each requested scale with
+``populate_db --scale`` and measures seeding, leaderboard rebuilds, bulk
+inserts through the API and every router endpoint in process.
+``compare_results`` diffs two result files and flags regressions past a
+threshold. Used by the ``benchmark`` and ``benchmark_compare`` commands.
+
+``benchmark_profiles`` starts fresh worker processes under each settings
+profile (``OCTOFIT_PROFILE``) and reports their startup time and the
+latency of warm requests, for the ``benchmark_profiles`` command.
+"""
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+
+from .leaderboard import engine
+from .management.commands.populate_db import synthetic_email
+from .models import Activity
+from .urls import router
+
+ACTIVITIES_PER_USER = 100
+
+
+def _timings(samples):
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]  # noqa: E731
+    return {
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'p50_ms': round(pick(0.50) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'p99_ms': round(pick(0.99) * 1000, 3),
+        'requests_per_second': round(len(ordered) / sum(ordered), 1) if sum(ordered) else None,
+    }
+
+
+def _timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def endpoint_paths():
+    """Return the list and detail path of every router endpoint."""
+    paths = []
+    for prefix, viewset, basename in router.registry:
+        paths.append(f'/api/{prefix}/')
+        first = viewset.queryset.order_by('pk').values_list('pk', flat=True).first()
+        if first is not None:
+            paths.append(f'/api/{prefix}/{first}/')
+    return paths
+
+
+def benchmark_endpoints(iterations):
+    client = Client(HTTP_HOST='localhost')
+    results = {}
+    for path in endpoint_paths():
+        cache.clear()
+        samples, status_codes = [], set()
+        for _ in range(iterations):
+            elapsed, response = _timed(lambda: client.get(path))
+            samples.append(elapsed)
+            status_codes.add(response.status_code)
+        results[f'GET {path}'] = dict(_timings(samples), status_codes=sorted(status_codes))
+    return results
+
+
+def benchmark_bulk_insert(batches, batch_size, users):
+    client = Client(HTTP_HOST='localhost')
+    today = datetime.date.today().isoformat()
+    samples = []
+    for batch in range(batches):
+        items = [
+            {
+                'user_email': synthetic_email(number % users),
+                'activity_type': 'Running',
+                'duration': 30,
+                'calories_burned': 300 + number % 50,
+                'date': today,
+            }
+            for number in range(batch * batch_size, (batch + 1) * batch_size)
+        ]
+        elapsed, _ = _timed(lambda: client.post('/api/activities/bulk/', items, content_type='application/json'))
+        samples.append(elapsed)
+    total = sum(samples)
+    return {
+        'batches': batches,
+        'batch_size': batch_size,
+        'seconds': round(total, 3),
+        'rows_per_second': round(batches * batch_size / total, 1),
+    }
+
+
+def run_benchmarks(scales, iterations=20, bulk_batches=5, bulk_batch_size=500, workers=1, log=None):
+    """Seed and measure the API at each scale (number of activities)."""
+    log = log or (lambda message: None)
+    results = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': iterations,
+        },
+        'scales': {},
+    }
+    for scale in scales:
+        users = max(1, scale // ACTIVITIES_PER_USER)
+        log(f'Seeding ~{scale} activities for {users} users...')
+        seed_seconds, _ = _timed(lambda: call_command(
+            'populate_db', '--scale', '--users', str(users), '--activities-per-user', str(ACTIVITIES_PER_USER),
+            '--seed', '0', '--workers', str(workers), stdout=_Discard(),
+        ))
+        activities = Activity.objects.count()
+        entry = {
+            'activities': activities,
+            'seed': {'seconds': round(seed_seconds, 3), 'rows_per_second': round(activities / seed_seconds, 1)},
+        }
+
+        log('Rebuilding leaderboard...')
+        rebuild_seconds, entries = _timed(engine.rebuild)
+        entry['leaderboard_rebuild'] = {'seconds': round(rebuild_seconds, 3), 'entries': entries}
+
+        log(f'Requesting {len(router.registry)} router endpoints {iterations} times each...')
+        entry['endpoints'] = benchmark_endpoints(iterations)
+
+        log('Posting bulk inserts...')
+        entry['bulk_insert'] = benchmark_bulk_insert(bulk_batches, bulk_batch_size, users)
+        results['scales'][str(scale)] = entry
+    return results
+
+
+class _Discard:
+    def write(self, *args, **kwargs):
+        pass
+
+    def flush(self):
+        pass
+
+
+# Metric name -> True when higher is better
+METRIC_DIRECTIONS = {
+    'mean_ms': False,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'seconds': False,
+    'requests_per_second': True,
+    'rows_per_second': True,
+}
+
+
+def _flatten(results):
+    metrics = {}
+    for scale, entry in results.get('scales', {}).items():
+        groups = [('seed', entry.get('seed', {})), ('leaderboard_rebuild', entry.get('leaderboard_rebuild', {})),
+                  ('bulk_insert', entry.get('bulk_insert', {}))]
+        groups.extend(entry.get('endpoints', {}).items())
+        for name, values in groups:
+            for metric, value in values.items():
+                if metric in METRIC_DIRECTIONS and isinstance(value, (int, float)):
+                    metrics[(scale, name, metric)] = value
+    return metrics
+
+
+def compare_results(baseline, candidate, threshold=0.10):
+    """
+    Compare two benchmark results.
+
+    Returns one row per metric present in both, with the relative change
+    (positive means worse) and whether it is a regression past ``threshold``.
+    """
+    before, after = _flatten(baseline), _flatten(candidate)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        scale, name, metric = key
+        old, new = before[key], after[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        if METRIC_DIRECTIONS[metric]:
+            change = -change
+        rows.append({
+            'scale': scale,
+            'name': name,
+            'metric': metric,
+            'baseline': old,
+            'candidate': new,
+            'change': round(change, 4),
+            'regression': change > threshold,
+        })
+    return rows
+
+
+# Runs in a fresh interpreter: start a WSGI worker, then time requests made
+# straight to the WSGI callable (no HTTP server or test client)
+STARTUP_PROBE = """
+import io, json, resource, sys, time
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.time()
+
+def get(path):
+    path, _, query = path.partition('?')
+    statuses = []
+    response = application({
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(response)
+    response.close()
+    return int(statuses[0].split()[0])
+
+paths, requests = json.loads(sys.argv[1]), int(sys.argv[2])
+first_started = time.perf_counter()
+status_codes = {path: get(path) for path in paths}
+first_request = time.perf_counter() - first_started
+samples = {}
+for path in paths:
+    samples[path] = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        get(path)
+        samples[path].append(time.perf_counter() - started)
+
+from django.conf import settings
+print(json.dumps({
+    'ready': ready, 'first_request': first_request, 'samples': samples, 'status_codes': status_codes,
+    'modules': len(sys.modules), 'installed_apps': len(settings.INSTALLED_APPS),
+    'middleware': len(settings.MIDDLEWARE), 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def probe_startup(profile, paths, requests):
+    """Start one worker process under ``profile`` and return what ``STARTUP_PROBE`` measured."""
+    environment = dict(
+        os.environ, OCTOFIT_PROFILE=profile, DJANGO_SETTINGS_MODULE='octofit_tracker.settings',
+        PYTHONPATH=os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+    )
+    started = time.time()
+    completed = subprocess.run(
+        [sys.executable, '-c', STARTUP_PROBE, json.dumps(paths), str(requests)],
+        env=environment, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['ready'] -= started
+    return result
+
+
+def benchmark_profiles(profiles, paths, runs=5, requests=200, log=None):
+    """
+    Measure worker startup and warm request latency for each settings profile.
+
+    ``ready_ms`` is the median time from process spawn until the WSGI
+    application is loaded, ``first_request_ms`` the median time to serve
+    the first request to each path (URLconf and view imports included), and
+    ``serving_ms`` the median of their sum: how long a new worker takes to
+    answer its first requests.
+    """
+    log = log or (lambda message: None)
+    results = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'runs': runs,
+            'requests': requests,
+        },
+        'profiles': {},
+    }
+    for profile in profiles:
+        log(f'Starting {runs} workers with OCTOFIT_PROFILE={profile}...')
+        probes = [probe_startup(profile, paths, requests) for _ in range(runs)]
+        results['profiles'][profile] = {
+            'installed_apps': probes[0]['installed_apps'],
+            'middleware': probes[0]['middleware'],
+            'modules': probes[0]['modules'],
+            'max_rss_mb': round(statistics.median(probe['max_rss_kb'] for probe in probes) / 1024, 1),
+            'ready_ms': round(statistics.median(probe['ready'] for probe in probes) * 1000, 1),
+            'first_request_ms': round(statistics.median(probe['first_request'] for probe in probes) * 1000, 1),
+            'serving_ms': round(
+                statistics.median(probe['ready'] + probe['first_request'] for probe in probes) * 1000, 1,
+            ),
+            'endpoints': {
+                f'GET {path}': dict(
+                    _timings([sample for probe in probes for sample in probe['samples'][path]]),
+                    status_codes=sorted({probe['status_codes'][path] for probe in probes}),
+                )
+                for path in paths
+            },
+        }
+    return results
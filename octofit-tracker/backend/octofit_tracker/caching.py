@@ -0,0 +1,112 @@
+"""
+HTTP response caching for read-heavy OctoFit Tracker endpoints.
+
+Every cached model has a version number in the cache. Writes bump it, which
+moves readers to fresh cache keys, so stale responses are never served and
+never need to be deleted one by one. The version is a nanosecond timestamp,
+which doubles as the ``Last-Modified`` time and seeds the ``ETag``.
+
+Only Django's cache API is used, so the local-memory and file-based
+backends both work. With local memory each process keeps its own versions;
+use the file backend to share invalidation between worker processes, and
+with commands such as ``rebuild_leaderboard`` that write from a process of
+their own.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+VERSION_KEY = 'octofit:version:{}'
+RESPONSE_KEY = 'octofit:response:{}:{}:{}'
+
+
+def is_process_local():
+    """Return whether cache versions are kept per process, so other processes miss invalidations."""
+    return isinstance(caches['default'], LocMemCache)
+
+
+def get_version(model):
+    """Return the current cache version for ``model``."""
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(model):
+    key = VERSION_KEY.format(model._meta.label_lower)
+    cache.set(key, max(time.time_ns(), (cache.get(key) or 0) + 1), None)
+
+
+def invalidate(model):
+    """
+    Move ``model`` to a new cache version.
+
+    The version is bumped right away and again once the surrounding
+    transaction commits, so a response rendered from uncommitted data is
+    never cached under the final version.
+    """
+    bump_version(model)
+    transaction.on_commit(lambda: bump_version(model))
+
+
+class CachedResponseMixin:
+    """
+    Cache rendered list and retrieve responses of a viewset under versioned
+    keys, and answer conditional requests with ``304 Not Modified``.
+    """
+    response_cache_timeout = 300
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_model(self, request):
+        """Return the model whose version the cached response follows."""
+        return self.get_queryset().model
+
+    def get_cache_variant(self, request):
+        """Return what, besides the model version, a cached response depends on."""
+        return f'{request.accepted_media_type}|{request.get_full_path()}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        model = self.get_cache_model(request)
+        version = get_version(model)
+        variant = self.get_cache_variant(request)
+        digest = hashlib.md5(variant.encode('utf-8')).hexdigest()
+        key = RESPONSE_KEY.format(model._meta.label_lower, version, digest)
+        etag = quote_etag(f'{version:x}-{digest[:16]}')
+        last_modified = version // 1_000_000_000
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(
+                        key, (rendered.content, rendered['Content-Type']), self.response_cache_timeout,
+                    )
+                )
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,131 @@
+"""
+Negotiated response compression for OctoFit Tracker.
+
+``CompressionMiddleware`` gzip- or deflate-encodes responses at least
+``COMPRESSION_MIN_LENGTH`` bytes long, picking the client's preferred
+encoding from ``Accept-Encoding``. It is configured through the
+``REST_FRAMEWORK`` setting:
+
+    REST_FRAMEWORK = {
+        'COMPRESSION_ENCODINGS': ['gzip', 'deflate'],  # server preference, [] disables
+        'COMPRESSION_MIN_LENGTH': 1024,
+        'COMPRESSION_LEVEL': 6,
+    }
+
+It runs after the response cache, so cached bodies stay uncompressed and
+any client can be served from them. Streaming responses (exports) are
+compressed on the fly.
+"""
+import asyncio
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+DEFAULTS = {
+    'COMPRESSION_ENCODINGS': ['gzip', 'deflate'],
+    'COMPRESSION_MIN_LENGTH': 1024,
+    'COMPRESSION_LEVEL': 6,
+}
+
+_accept_encoding_re = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+
+
+def get_setting(name):
+    return getattr(settings, 'REST_FRAMEWORK', {}).get(name, DEFAULTS[name])
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """
+    Return the encoding in ``encodings`` the client prefers, or ``None``.
+
+    Ties in quality go to the order of ``encodings``.
+    """
+    qualities = {}
+    for part in accept_encoding.split(','):
+        match = _accept_encoding_re.fullmatch(part)
+        if not match:
+            continue
+        try:
+            qualities[match[1].lower()] = float(match[2]) if match[2] is not None else 1.0
+        except ValueError:
+            continue
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding, level):
+    if encoding == 'gzip':
+        return gzip.compress(content, compresslevel=level, mtime=0)
+    return zlib.compress(content, level)
+
+
+def compress_stream(chunks, encoding, level):
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the negotiated ``Content-Encoding``.
+
+    Place it right after ``RequestMetricsMiddleware`` so the recorded
+    response size is the size on the wire.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        encodings = get_setting('COMPRESSION_ENCODINGS')
+        if not encodings or response.has_header('Content-Encoding') or response.status_code == 304:
+            return response
+        if not response.streaming and len(response.content) < get_setting('COMPRESSION_MIN_LENGTH'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), encodings)
+        if encoding is None:
+            return response
+
+        level = get_setting('COMPRESSION_LEVEL')
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding, level)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation of the same resource
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
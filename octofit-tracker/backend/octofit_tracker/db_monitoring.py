@@ -0,0 +1,104 @@
+"""
+Database connection diagnostics for OctoFit Tracker.
+
+On djongo a pymongo ``ConnectionPoolListener`` is registered when the app
+loads, so every ``MongoClient`` created afterwards reports pool events into
+process-wide counters. ``pool_stats()`` combines those counters with the
+configured pool settings and Django's persistent-connection state.
+"""
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+POOL_SETTINGS = (
+    'maxPoolSize', 'minPoolSize', 'maxIdleTimeMS', 'waitQueueTimeoutMS',
+    'serverSelectionTimeoutMS', 'connectTimeoutMS', 'socketTimeoutMS',
+)
+
+
+class PoolCounters:
+    """Thread-safe counters of connection pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ('pools_created', 'pools_cleared', 'connections_created', 'connections_closed',
+             'checkouts', 'checkins', 'checkout_failures'),
+            0,
+        )
+
+    def increment(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['connections_open'] = counts['connections_created'] - counts['connections_closed']
+        counts['checked_out'] = counts['checkouts'] - counts['checkins']
+        return counts
+
+
+counters = PoolCounters()
+_registered = False
+
+
+def register_pool_listener():
+    """Register the pymongo pool listener once per process."""
+    global _registered
+    if _registered:
+        return
+    from pymongo import monitoring
+
+    class PoolStatsListener(monitoring.ConnectionPoolListener):
+        def pool_created(self, event):
+            counters.increment('pools_created')
+
+        def pool_cleared(self, event):
+            counters.increment('pools_cleared')
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            counters.increment('connections_created')
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            counters.increment('connections_closed')
+
+        def connection_check_out_started(self, event):
+            pass
+
+        def connection_check_out_failed(self, event):
+            counters.increment('checkout_failures')
+
+        def connection_checked_out(self, event):
+            counters.increment('checkouts')
+
+        def connection_checked_in(self, event):
+            counters.increment('checkins')
+
+    monitoring.register(PoolStatsListener())
+    _registered = True
+
+
+def pool_stats(using='default'):
+    """Return connection settings and pool counters for the ``using`` database."""
+    connection = connections[using]
+    database = settings.DATABASES[using]
+    stats = {
+        'engine': database['ENGINE'],
+        'vendor': connection.vendor,
+        'conn_max_age': database.get('CONN_MAX_AGE', 0),
+        'conn_health_checks': database.get('CONN_HEALTH_CHECKS', False),
+        'connection_open': connection.connection is not None,
+    }
+    if connection.vendor == 'djongo':
+        client = database.get('CLIENT', {})
+        stats['pool'] = {name: client[name] for name in POOL_SETTINGS if name in client}
+        stats['pool_events'] = counters.snapshot()
+    return stats
@@ -0,0 +1,44 @@
+"""
+Streaming activity exports.
+
+Rows are read with ``iterator(chunk_size=...)`` and encoded one at a time,
+so memory use does not grow with the size of the table and the first bytes
+are sent before the query has finished.
+"""
+import csv
+
+from .renderers import dumps
+from .serializers import get_read_plan
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for ``csv.writer``"""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, serializer_class, chunk_size=2000):
+    """Yield serialized dicts for ``queryset`` through the fast read plan."""
+    plan = get_read_plan(serializer_class)
+    for row in queryset.values_list(*plan.columns).iterator(chunk_size=chunk_size):
+        yield plan.to_representation(row)
+
+
+def iter_ndjson(queryset, serializer_class, chunk_size=2000):
+    for item in iter_rows(queryset, serializer_class, chunk_size):
+        yield dumps(item).decode('utf-8') + '\n'
+
+
+def iter_csv(queryset, serializer_class, chunk_size=2000):
+    plan = get_read_plan(serializer_class)
+    writer = csv.writer(_Echo())
+    yield writer.writerow(plan.keys)
+    for item in iter_rows(queryset, serializer_class, chunk_size):
+        yield writer.writerow(item.values())
+
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
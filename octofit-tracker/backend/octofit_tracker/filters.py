@@ -0,0 +1,74 @@
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Filters a queryset on the query parameters declared in the view's
+    ``filter_params``, a mapping of parameter name to ``(lookup, field)``.
+
+    Each value is parsed with its serializer field, so malformed values
+    give a 400 response instead of an unfiltered list.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_filters(request, view)
+        return queryset.filter(**filters) if filters else queryset
+
+    def get_filters(self, request, view):
+        """Return the validated ``{lookup: value}`` filters requested."""
+        filters, errors = {}, {}
+        for param, (lookup, field) in getattr(view, 'filter_params', {}).items():
+            if param not in request.query_params:
+                continue
+            try:
+                filters[lookup] = field.run_validation(request.query_params[param])
+            except serializers.ValidationError as exc:
+                errors[param] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return filters
+
+
+def get_requested_ordering(request, queryset, view):
+    """
+    Return the whitelisted ordering requested through the view's
+    ``OrderingFilter``, or ``None`` when the client did not ask for one.
+    """
+    for backend_class in getattr(view, 'filter_backends', ()):
+        if issubclass(backend_class, OrderingFilter):
+            backend = backend_class()
+            if backend.ordering_param in request.query_params:
+                return backend.get_ordering(request, queryset, view)
+    return None
+
+
+def get_requested_fields(request, available):
+    """
+    Return the sparse fieldset requested with ``?fields=`` and/or
+    ``?exclude=`` (comma-separated names) as a tuple in ``available`` order,
+    or ``None`` when the client asked for every field.
+    """
+    requested, excluded = (
+        [name.strip() for name in request.query_params[param].split(',') if name.strip()]
+        if param in request.query_params else None
+        for param in ('fields', 'exclude')
+    )
+    if requested is None and excluded is None:
+        return None
+
+    errors = {}
+    for param, names in (('fields', requested), ('exclude', excluded)):
+        unknown = [name for name in names or () if name not in available]
+        if unknown:
+            errors[param] = [f"Unknown field: {name}." for name in unknown]
+    if errors:
+        raise serializers.ValidationError(errors)
+
+    selected = tuple(
+        name for name in available
+        if (requested is None or name in requested) and name not in (excluded or ())
+    )
+    if not selected:
+        raise serializers.ValidationError({'fields': ['Select at least one field.']})
+    return selected
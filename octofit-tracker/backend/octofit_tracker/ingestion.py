@@ -0,0 +1,304 @@
+"""
+Write-behind activity ingestion for OctoFit Tracker.
+
+With ``OCTOFIT_INGESTION['MODE'] = 'buffered'``, ``POST /api/activities/``
+validates the activity, puts it in a bounded in-process queue and answers
+``202 Accepted``. A background thread writes the queue with batched
+``bulk_create`` and folds each batch into the leaderboard and rollups, so
+database write latency is no longer client-facing.
+
+When the queue is full, requests wait up to ``SUBMIT_TIMEOUT`` seconds and
+then get ``503`` with ``Retry-After``. Batches that cannot be written, and
+anything still queued at shutdown that cannot be written, are appended to
+an NDJSON spill file in ``SPILL_DIR``. Accepted activities are not visible
+in reads until they are flushed, normally within ``FLUSH_INTERVAL`` seconds.
+
+The batch being written is first saved to an in-flight journal in
+``SPILL_DIR/inflight``, which the process keeps under an exclusive file
+lock (POSIX only). A journal left by a process that died before its batch
+committed is replayed like a spill file, so a batch taken off the queue is
+written at least once. Activities still in the queue when a process is
+killed are lost. ``start()``, called when the WSGI or ASGI application
+loads, starts the flusher, which replays spill files and orphaned
+journals first.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no journal locking on Windows
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Activity
+from .renderers import dumps
+from .serializers import ActivitySerializer
+from .signals import record_bulk_created
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'sync',
+    'BUFFER_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'SUBMIT_TIMEOUT': 0.05,
+    'SPILL_DIR': None,
+}
+
+
+class BufferFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many activities are waiting to be written. Retry shortly.'
+    default_code = 'buffer_full'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+class WriteBehindBuffer:
+    """A bounded queue of validated activities written in batches by a background thread"""
+
+    def __init__(self, capacity, batch_size, flush_interval, submit_timeout, spill_dir, background=True):
+        self.queue = queue.Queue(maxsize=capacity)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.submit_timeout = submit_timeout
+        self.spill_dir = spill_dir
+        self.background = background
+        self.counters = {'accepted': 0, 'rejected': 0, 'written': 0, 'spilled': 0, 'replayed': 0}
+        self._counter_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._journal = None
+
+    def count(self, name, value=1):
+        with self._counter_lock:
+            self.counters[name] += value
+
+    def submit(self, data):
+        """Queue validated activity data, or raise ``BufferFull``."""
+        if self.background:
+            self.start()
+        try:
+            self.queue.put(data, timeout=self.submit_timeout)
+        except queue.Full:
+            self.count('rejected')
+            raise BufferFull()
+        self.count('accepted')
+
+    def stats(self):
+        with self._counter_lock:
+            counters = dict(self.counters)
+        return dict(counters, queued=self.queue.qsize(), capacity=self.queue.maxsize)
+
+    def start(self):
+        # A process forked after start() (e.g. gunicorn --preload) needs its own flusher
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._journal = None
+                self._thread_pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='octofit-ingestion', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        """Stop the flusher and write (or spill) whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        with self._write_lock:
+            if self._journal is not None:
+                os.remove(self._journal.name)
+                self._journal.close()
+                self._journal = None
+
+    def _run(self):
+        try:
+            self.replay_spill()
+            while not self._stop.is_set():
+                batch = self._take(self.flush_interval)
+                if batch:
+                    self.write(batch)
+        finally:
+            connection.close()
+
+    def _take(self, timeout):
+        """Wait up to ``timeout`` for one item, then take what is queued up to a batch."""
+        try:
+            batch = [self.queue.get(timeout=timeout) if timeout else self.queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything queued now, in the calling thread."""
+        while True:
+            batch = self._take(0)
+            if not batch:
+                return
+            self.write(batch)
+
+    def write(self, batch):
+        activities = [Activity(**data) for data in batch]
+        with self._write_lock:
+            self.journal(batch)
+            try:
+                with transaction.atomic():
+                    Activity.objects.bulk_create(activities, batch_size=self.batch_size)
+                    record_bulk_created(activities)
+            except Exception:
+                logger.exception('Writing %d buffered activities failed; spilling them to disk', len(batch))
+                self.spill(batch)
+                self.journal(None)
+                return
+            self.journal(None)
+        self.count('written', len(batch))
+
+    def journal(self, batch):
+        """Save ``batch`` as the in-flight batch of this process, or clear it with ``None``."""
+        if not self.spill_dir or fcntl is None:
+            return
+        if self._journal is None:
+            if batch is None:
+                return
+            os.makedirs(self.journal_dir(), exist_ok=True)
+            path = os.path.join(self.journal_dir(), f'{os.getpid()}-{uuid.uuid4().hex}.ndjson')
+            self._journal = open(path, 'w+b')
+            # Held until the process exits; replay_spill takes only unlocked journals
+            fcntl.flock(self._journal, fcntl.LOCK_EX)
+        self._journal.seek(0)
+        self._journal.truncate()
+        if batch is not None:
+            self._journal.write(b''.join(dumps(data) + b'\n' for data in batch))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def journal_dir(self):
+        return os.path.join(self.spill_dir, 'inflight')
+
+    def spill_path(self):
+        return os.path.join(self.spill_dir, f'activities-{os.getpid()}.ndjson')
+
+    def spill(self, batch):
+        if not self.spill_dir:
+            logger.error('No OCTOFIT_INGESTION SPILL_DIR; %d activities were lost', len(batch))
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(self.spill_path(), 'ab') as spill_file:
+            spill_file.write(b''.join(dumps(data) + b'\n' for data in batch))
+            spill_file.flush()
+            os.fsync(spill_file.fileno())
+        self.count('spilled', len(batch))
+
+    def claim_journals(self):
+        """Turn the journals of processes that have exited into spill files; return their new paths."""
+        if fcntl is None:
+            return []
+        own = self._journal.name if self._journal is not None else None
+        claimed = []
+        for path in sorted(glob.glob(os.path.join(self.journal_dir(), '*.ndjson'))):
+            if path == own:
+                continue
+            try:
+                with open(path, 'rb') as journal:
+                    fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    # Skip the file if another process claimed it while we waited
+                    if os.fstat(journal.fileno()).st_ino != os.stat(path).st_ino:
+                        continue
+                    target = os.path.join(self.spill_dir, f'activities-inflight-{os.path.basename(path)}')
+                    os.rename(path, target)
+            except OSError:
+                # Locked by a live process, or already claimed
+                continue
+            claimed.append(target)
+        return claimed
+
+    def replay_spill(self):
+        """
+        Write the activities of every spill file and orphaned in-flight
+        journal in ``SPILL_DIR``, then remove the files.
+        """
+        if not self.spill_dir:
+            return 0
+        replayed = 0
+        self.claim_journals()
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, 'activities-*.ndjson'))):
+            claimed = f'{path}.replay-{os.getpid()}'
+            try:
+                # Another process may be replaying the same file
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            batch = []
+            with open(claimed, 'rb') as spill_file:
+                for number, line in enumerate(spill_file, start=1):
+                    try:
+                        batch.append(ActivitySerializer().run_validation(json.loads(line)))
+                    except Exception:
+                        logger.error('Skipping unreadable line %d of spill file %s', number, path)
+                        continue
+                    if len(batch) >= self.batch_size:
+                        self.write(batch)
+                        replayed += len(batch)
+                        batch = []
+            if batch:
+                self.write(batch)
+                replayed += len(batch)
+            os.remove(claimed)
+        self.count('replayed', replayed)
+        return replayed
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'OCTOFIT_INGESTION', {}).get(name, DEFAULTS[name])
+
+
+def get_buffer():
+    """Return the process's write-behind buffer, or ``None`` in synchronous mode."""
+    global _buffer
+    if get_setting('MODE') != 'buffered':
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    capacity=get_setting('BUFFER_SIZE'),
+                    batch_size=get_setting('BATCH_SIZE'),
+                    flush_interval=get_setting('FLUSH_INTERVAL'),
+                    submit_timeout=get_setting('SUBMIT_TIMEOUT'),
+                    spill_dir=get_setting('SPILL_DIR'),
+                )
+    return _buffer
+
+
+def start():
+    """Start the flusher of a buffered-mode process, replaying leftover spills; a no-op in sync mode."""
+    buffer = get_buffer()
+    if buffer is not None and buffer.background:
+        buffer.start()
@@ -0,0 +1,327 @@
+"""
+Incremental leaderboard maintenance for OctoFit Tracker.
+
+Activity writes are folded into the matching ``Leaderboard`` row as deltas
+instead of re-aggregating every activity. Ranks use competition ranking
+(1 + number of entries with strictly more calories), so a change to one
+entry only moves the entries whose totals sit between its old and new
+value. Those are shifted with a single ``UPDATE``, and the entry's own rank
+is counted from the ``total_calories`` index in the same transaction, so
+every worker process computes ranks from the same, current table.
+
+Full rebuilds aggregate shards of users in parallel processes and write
+only the entries that changed, in one transaction where the database
+supports them.
+
+Weekly and monthly leaderboards are ranked from the per-user totals of the
+current calendar week or month (``UserPeriodTotal``), which activity writes
+keep current, so they never read raw activities or sum rollups, and move
+to a new window as the date rolls over.
+"""
+import datetime
+import heapq
+import multiprocessing
+import time
+from collections import namedtuple
+
+import django
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import caching
+from .aggregation import user_totals
+from .models import User, Leaderboard, UserPeriodTotal
+from .rollups import period_start
+from .suspendable import SuspendableMixin
+
+
+class LeaderboardEngine(SuspendableMixin):
+    """
+    Applies activity deltas to the leaderboard and keeps ranks current.
+
+    The engine keeps no state besides ``enabled``; ranks are read from and
+    written to the ``leaderboard`` table only, so any number of worker
+    processes can record activities side by side.
+    """
+
+    def record(self, user_email, calories=0, activities=0):
+        """Add ``calories`` and ``activities`` to the entry for ``user_email``."""
+        if not self.enabled or (not calories and not activities):
+            return
+        with transaction.atomic():
+            self._apply(user_email, calories, activities)
+
+    def _apply(self, user_email, calories, activities):
+        # Concurrent writes for the same user wait here for the row lock
+        entry = Leaderboard.objects.select_for_update().filter(user_email=user_email).first()
+        if entry is None:
+            if activities <= 0:
+                return
+            user = User.objects.filter(email=user_email).values('username', 'team').first() or {}
+            entry = Leaderboard(
+                user_email=user_email,
+                username=user.get('username') or user_email,
+                team=user.get('team') or '',
+            )
+            try:
+                # Inserting takes the row lock; ranks are shifted only once it is held
+                with transaction.atomic():
+                    entry.save()
+            except IntegrityError:
+                # Created concurrently; wait for its lock and add to it instead
+                return self._apply(user_email, calories, activities)
+            old_total = None
+        else:
+            old_total = entry.total_calories
+
+        entry.total_calories += calories
+        entry.total_activities += activities
+
+        if entry.total_activities <= 0:
+            entry.delete()
+            self._shift_ranks(old_total, None, None)
+            return
+
+        new_total = entry.total_calories
+        self._shift_ranks(old_total, new_total, entry.pk)
+        entry.rank = rank_of(new_total, exclude=entry.pk)
+        entry.save()
+
+    @staticmethod
+    def _shift_ranks(old_total, new_total, pk):
+        """Move the ranks of every entry whose position is affected by one entry moving."""
+        entries = Leaderboard.objects.exclude(pk=pk) if pk is not None else Leaderboard.objects.all()
+        if old_total is None:
+            entries.filter(total_calories__lt=new_total).update(rank=F('rank') + 1)
+        elif new_total is None:
+            entries.filter(total_calories__lt=old_total).update(rank=F('rank') - 1)
+        elif new_total > old_total:
+            entries.filter(
+                total_calories__gte=old_total, total_calories__lt=new_total,
+            ).update(rank=F('rank') + 1)
+        elif new_total < old_total:
+            entries.filter(
+                total_calories__gte=new_total, total_calories__lt=old_total,
+            ).update(rank=F('rank') - 1)
+
+    def rebuild(self, workers=1, shards=None, batch_size=1000):
+        """Recompute the whole leaderboard from activities; return the number of entries."""
+        return self.rebuild_sharded(workers, shards, batch_size)['entries']
+
+    def rebuild_sharded(self, workers=1, shards=None, batch_size=1000):
+        """
+        Recompute the whole leaderboard from activities.
+
+        Users are split into ``shards`` ranges of email addresses (by
+        default four per worker). ``workers`` processes aggregate the
+        activities and user details of one shard at a time, and the
+        shards, each sorted by calories, are merged and ranked in one
+        pass. Only entries whose values changed are written, with
+        ``bulk_update``, ``bulk_create`` and batched deletes, in a single
+        transaction. On transactional backends (SQLite, PostgreSQL, ...)
+        readers see either the old or the new board. djongo has no
+        multi-document transactions: on MongoDB each batch is visible as
+        soon as it is written, so readers may briefly see a mix of old
+        and new entries, and an error part way leaves the writes done so
+        far in place (run the rebuild again to finish it).
+
+        Activities written by other processes while the shards are being
+        aggregated may be overwritten; run it while writes are quiet. The
+        cached responses of other processes only move to the new board if
+        they share the cache (see ``caching.is_process_local``).
+        Returns counts of entries, created, updated, deleted and unchanged
+        rows, plus the time spent aggregating and writing.
+        """
+        workers = max(1, workers)
+        bounds = shard_bounds(shards or workers * 4)
+        started = time.monotonic()
+        if workers > 1 and len(bounds) > 1:
+            # Forked workers must open their own database connections
+            connections.close_all()
+            # Workers started with "spawn" (macOS, Windows) need the app registry before unpickling tasks
+            with multiprocessing.Pool(min(workers, len(bounds)), initializer=django.setup) as pool:
+                results = pool.map(aggregate_shard, bounds)
+        else:
+            results = [aggregate_shard(shard) for shard in bounds]
+        aggregated = time.monotonic()
+
+        # Shards are each sorted by (-calories, email), so merging keeps the global order
+        merged = heapq.merge(*results, key=lambda row: (-row[1], row[0]))
+        entries = assign_ranks([
+            Leaderboard(
+                user_email=email, username=username, team=team,
+                total_calories=calories, total_activities=activities,
+            )
+            for email, calories, activities, username, team in merged
+        ])
+
+        counts = {'entries': len(entries), 'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        fields = ('username', 'team', 'total_calories', 'total_activities', 'rank')
+        with transaction.atomic():
+            existing = {
+                row[1]: row
+                for row in Leaderboard.objects.values_list('pk', 'user_email', *fields).iterator(chunk_size=5000)
+            }
+            now = timezone.now()
+            created, updated = [], []
+            for entry in entries:
+                row = existing.pop(entry.user_email, None)
+                if row is None:
+                    created.append(entry)
+                elif row[2:] != tuple(getattr(entry, field) for field in fields):
+                    entry.pk, entry.updated_at = row[0], now
+                    updated.append(entry)
+                else:
+                    counts['unchanged'] += 1
+            stale = [row[0] for row in existing.values()]
+
+            Leaderboard.objects.bulk_update(updated, fields + ('updated_at',), batch_size=batch_size)
+            Leaderboard.objects.bulk_create(created, batch_size=batch_size)
+            for first in range(0, len(stale), batch_size):
+                Leaderboard.objects.filter(pk__in=stale[first:first + batch_size]).delete()
+            counts.update(created=len(created), updated=len(updated), deleted=len(stale))
+            caching.invalidate(Leaderboard)
+            # Windowed boards show the usernames and teams of these entries
+            caching.invalidate(UserPeriodTotal)
+        counts.update(
+            shards=len(bounds),
+            aggregate_seconds=round(aggregated - started, 3),
+            write_seconds=round(time.monotonic() - aggregated, 3),
+        )
+        return counts
+
+
+def rank_of(total_calories, exclude=None):
+    """Return the competition rank of ``total_calories``: 1 + entries with strictly more."""
+    entries = Leaderboard.objects.filter(total_calories__gt=total_calories)
+    if exclude is not None:
+        entries = entries.exclude(pk=exclude)
+    return entries.count() + 1
+
+
+def assign_ranks(entries):
+    """Set competition ranks on ``entries``, which must be sorted by calories descending."""
+    previous = None
+    for position, entry in enumerate(entries, start=1):
+        if entry.total_calories != previous:
+            rank = position
+            previous = entry.total_calories
+        entry.rank = rank
+    return entries
+
+
+def shard_bounds(shards):
+    """
+    Split the email address space into ``shards`` contiguous ``(low, high)``
+    ranges holding about the same number of users. The first and last
+    ranges are open, so activities of unknown users are covered too.
+    """
+    if shards <= 1:
+        return [(None, None)]
+    users = User.objects.order_by('email').values_list('email', flat=True)
+    total = users.count()
+    shards = max(1, min(shards, total))
+    cuts = []
+    for shard in range(1, shards):
+        email = users[shard * total // shards]
+        if not cuts or email > cuts[-1]:
+            cuts.append(email)
+    edges = [None] + cuts + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def aggregate_shard(bounds):
+    """
+    Return ``(email, calories, activities, username, team)`` for the users
+    with activities in the ``bounds`` email range, by calories descending.
+    """
+    low, high = bounds
+    users = User.objects.all()
+    if low is not None:
+        users = users.filter(email__gte=low)
+    if high is not None:
+        users = users.filter(email__lt=high)
+    details = {email: (username, team) for email, username, team in users.values_list('email', 'username', 'team')}
+    rows = []
+    for row in user_totals(email_range=bounds):
+        username, team = details.get(row['user_email'], (row['user_email'], ''))
+        rows.append((row['user_email'], row['calories'], row['activities'], username, team or ''))
+    return rows
+
+
+engine = LeaderboardEngine()
+
+
+WINDOWS = ('week', 'month', 'all')
+WINDOW_KEY = 'octofit:leaderboard-window:{}:{}:{}'
+WINDOW_CACHE_TIMEOUT = 300
+
+# The rows of a windowed leaderboard, with the fields of ``Leaderboard``
+WindowEntry = namedtuple('WindowEntry', [
+    'id', 'user_email', 'username', 'team', 'total_calories', 'total_activities', 'rank', 'updated_at',
+])
+
+
+def window_bounds(window, today=None):
+    """Return the ``[start, end)`` dates of the current ``window`` ('week' or 'month')."""
+    today = today or datetime.date.today()
+    start = period_start(today, window)
+    if window == 'week':
+        return start, start + datetime.timedelta(days=7)
+    return start, (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def window_leaderboard(window, today=None):
+    """
+    Return the ranked ``WindowEntry`` rows of the current ``window``.
+
+    Rows are cached under the ``UserPeriodTotal`` cache version, which
+    writes to the current week or month and leaderboard rebuilds bump, and
+    the window start, so a new week or month starts a fresh board. Each
+    entry keeps the ``id``, username and team of the user's all-time
+    ``Leaderboard`` row, and ``updated_at`` is when the user's total in the
+    window last changed. Users without a ``Leaderboard`` row (e.g. after a
+    bulk load, until the leaderboard is rebuilt) are listed with their
+    ``User`` details and no ``id``.
+    """
+    start, end = window_bounds(window, today)
+    key = WINDOW_KEY.format(window, start.isoformat(), caching.get_version(UserPeriodTotal))
+    entries = cache.get(key)
+    if entries is not None:
+        return entries
+
+    totals = list(
+        UserPeriodTotal.objects.filter(period=window, start=start, activity_count__gt=0)
+        .order_by('-total_calories', 'user_email')
+        .values_list('user_email', 'total_calories', 'activity_count', 'updated_at')
+    )
+    profiles = window_profiles([row[0] for row in totals])
+    entries, previous = [], None
+    for user_email, calories, activities, updated_at in totals:
+        if calories != previous:
+            rank, previous = len(entries) + 1, calories
+        pk, username, team = profiles.get(user_email) or (None, user_email, '')
+        entries.append(WindowEntry(pk, user_email, username, team, calories, activities, rank, updated_at))
+    cache.set(key, entries, WINDOW_CACHE_TIMEOUT)
+    return entries
+
+
+def window_profiles(emails, batch_size=1000):
+    """
+    Return ``{email: (leaderboard id, username, team)}`` for ``emails``,
+    from their ``Leaderboard`` rows or, failing that, their ``User`` rows.
+    """
+    profiles = {}
+    for first in range(0, len(emails), batch_size):
+        batch = emails[first:first + batch_size]
+        rows = Leaderboard.objects.filter(user_email__in=batch).values_list('user_email', 'id', 'username', 'team')
+        for user_email, pk, username, team in rows:
+            profiles[user_email] = (pk, username, team)
+        missing = [email for email in batch if email not in profiles]
+        if missing:
+            users = User.objects.filter(email__in=missing).values_list('email', 'username', 'team')
+            for email, username, team in users:
+                profiles[email] = (None, username or email, team or '')
+    return profiles
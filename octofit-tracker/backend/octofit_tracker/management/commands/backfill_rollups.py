@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker.rollups import rollups
+from octofit_tracker.sketches import sketches
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily activity rollups and percentile sketches from the activities collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding activity rollups...')
+        buckets = rollups.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Activity rollups rebuilt: {buckets} buckets'))
+        self.stdout.write('Rebuilding percentile sketches...')
+        count = sketches.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Percentile sketches rebuilt: {count} sketches'))
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from octofit_tracker.benchmarks import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Seed the database at several scales and benchmark the API, leaderboard rebuilds and bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1000,100000,1000000',
+                            help='Comma-separated numbers of activities to seed and measure')
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per endpoint')
+        parser.add_argument('--bulk-batches', type=int, default=5, help='Bulk insert requests per scale')
+        parser.add_argument('--bulk-batch-size', type=int, default=500, help='Activities per bulk insert request')
+        parser.add_argument('--workers', type=int, default=1, help='Processes used to generate activities')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+        parser.add_argument('--force', action='store_true',
+                            help='Run against a database other than SQLite (its data is replaced)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' and not options['force']:
+            raise CommandError(
+                'The benchmark replaces all data. Run it against SQLite '
+                '(OCTOFIT_DB_ENGINE=sqlite OCTOFIT_DB_NAME=/tmp/octofit-bench.sqlite3) or pass --force.'
+            )
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',') if scale.strip()]
+        except ValueError:
+            raise CommandError('--scales must be a comma-separated list of integers')
+
+        results = run_benchmarks(
+            scales,
+            iterations=max(1, options['iterations']),
+            bulk_batches=max(1, options['bulk_batches']),
+            bulk_batch_size=max(1, options['bulk_batch_size']),
+            workers=max(1, options['workers']),
+            log=lambda message: self.stderr.write(message),
+        )
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.benchmarks import compare_results
+
+
+class Command(BaseCommand):
+    help = 'Compare two benchmark result files and flag regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='JSON results of the reference run')
+        parser.add_argument('candidate', help='JSON results of the run to check')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative slowdown that counts as a regression (0.10 = 10%%)')
+        parser.add_argument('--all', action='store_true', help='List every metric, not only regressions')
+
+    def handle(self, *args, **options):
+        results = []
+        for path in (options['baseline'], options['candidate']):
+            try:
+                with open(path) as handle:
+                    results.append(json.load(handle))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read {path}: {exc}')
+
+        rows = compare_results(*results, threshold=options['threshold'])
+        regressions = [row for row in rows if row['regression']]
+        for row in rows if options['all'] else regressions:
+            line = (
+                f"{row['scale']:>8} {row['name']} {row['metric']}: "
+                f"{row['baseline']} -> {row['candidate']} ({row['change']:+.1%})"
+            )
+            self.stdout.write(self.style.ERROR(line) if row['regression'] else line)
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} of {len(rows)} metrics regressed by more than {options['threshold']:.0%}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions past {options['threshold']:.0%} in {len(rows)} metrics"))
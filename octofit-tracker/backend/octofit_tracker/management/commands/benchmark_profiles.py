@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.benchmarks import benchmark_profiles
+
+
+class Command(BaseCommand):
+    help = 'Compare worker startup time and per-request overhead of the settings profiles (OCTOFIT_PROFILE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(settings.PROFILES),
+                            help='Comma-separated profiles to measure; the first is the baseline')
+        parser.add_argument('--paths', default='/api/,/api/workouts/?page_size=10',
+                            help='Comma-separated paths to request in each worker')
+        parser.add_argument('--runs', type=int, default=5, help='Worker processes started per profile')
+        parser.add_argument('--requests', type=int, default=200, help='Warm requests per path and worker')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        profiles = [profile for profile in options['profiles'].split(',') if profile.strip()]
+        unknown = set(profiles) - set(settings.PROFILES)
+        if unknown or not profiles:
+            raise CommandError(f"--profiles must be from: {', '.join(settings.PROFILES)}")
+        paths = [path for path in options['paths'].split(',') if path.strip()]
+
+        results = benchmark_profiles(
+            profiles, paths, runs=max(1, options['runs']), requests=max(1, options['requests']),
+            log=lambda message: self.stderr.write(message),
+        )
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(json.dumps(results, indent=2) + '\n')
+
+        rows = [
+            ('installed apps', 'installed_apps', ''), ('middleware', 'middleware', ''),
+            ('modules loaded', 'modules', ''), ('max RSS', 'max_rss_mb', ' MB'),
+            ('ready', 'ready_ms', ' ms'), ('first requests', 'first_request_ms', ' ms'),
+            ('spawn to first responses', 'serving_ms', ' ms'),
+        ]
+        measured = results['profiles']
+        baseline = measured[profiles[0]]
+        self.stdout.write(f"{'':<36}" + ''.join(f'{profile:>14}' for profile in profiles) + f"{'change':>10}")
+        for label, key, unit in rows:
+            self.write_row(label, [measured[profile][key] for profile in profiles], unit)
+        for endpoint in baseline['endpoints']:
+            values = [measured[profile]['endpoints'][endpoint]['p50_ms'] * 1000 for profile in profiles]
+            self.write_row(f'{endpoint} p50', [round(value) for value in values], ' us')
+
+    def write_row(self, label, values, unit):
+        change = f'{(values[-1] - values[0]) / values[0]:+.0%}' if len(values) > 1 and values[0] else ''
+        self.stdout.write(f'{label:<36}' + ''.join(f'{value:>11}{unit:<3}' for value in values) + f'{change:>10}')
@@ -0,0 +1,161 @@
+import asyncio
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _summary(name, path, latencies, elapsed, failures):
+    return {
+        'server': name,
+        'path': path,
+        'requests': len(latencies),
+        'failures': failures,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 2),
+            'p50': round(_percentile(latencies, 0.50) * 1000, 2),
+            'p99': round(_percentile(latencies, 0.99) * 1000, 2),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI and ASGI throughput at high concurrency with slow clients, in process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server')
+        parser.add_argument('--concurrency', type=int, default=500, help='Clients in flight at once')
+        parser.add_argument('--threads', type=int, default=32,
+                            help='WSGI worker threads, as in a threaded server such as gunicorn --threads')
+        parser.add_argument('--client-delay', type=float, default=0.05,
+                            help='Seconds each client takes to send its request (simulates slow mobile links)')
+        parser.add_argument('--wsgi-path', default='/api/activities/?page_size=20', help='Path served by WSGI')
+        parser.add_argument('--asgi-path', default='/api/async/activities/?page_size=20',
+                            help='Path served by the native async views under ASGI')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        results = [
+            self.run_wsgi(options),
+            self.run_asgi(options),
+        ]
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(self.style.SUCCESS(f"{result['server']} {result['path']}"))
+            self.stdout.write(
+                f"  {result['requests_per_second']} req/s, "
+                f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms, "
+                f"{result['failures']} failures"
+            )
+
+    def run_wsgi(self, options):
+        from octofit_tracker.wsgi import application
+
+        path, _, query = options['wsgi_path'].partition('?')
+        delay = options['client_delay']
+
+        def handle_request():
+            # A threaded server holds the worker while the client is still sending
+            time.sleep(delay)
+            statuses = []
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '8000',
+                'HTTP_HOST': 'localhost',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': io.StringIO(),
+                'wsgi.url_scheme': 'http',
+            }
+            body = application(environ, lambda status, headers: statuses.append(status))
+            b''.join(body)
+            if hasattr(body, 'close'):
+                body.close()
+            return statuses[0].startswith('200')
+
+        async def request(semaphore, pool):
+            async with semaphore:
+                started = time.perf_counter()
+                ok = await asyncio.get_running_loop().run_in_executor(pool, handle_request)
+                return time.perf_counter() - started, ok
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                return await asyncio.gather(*(request(semaphore, pool) for _ in range(options['requests'])))
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        return _summary(
+            f"WSGI ({options['threads']} threads)", options['wsgi_path'],
+            [latency for latency, _ in outcomes], elapsed, sum(1 for _, ok in outcomes if not ok),
+        )
+
+    def run_asgi(self, options):
+        from octofit_tracker.asgi import application
+
+        path, _, query = options['asgi_path'].partition('?')
+        delay = options['client_delay']
+
+        async def request(semaphore):
+            async with semaphore:
+                started = time.perf_counter()
+                scope = {
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': '1.1',
+                    'method': 'GET',
+                    'scheme': 'http',
+                    'path': path,
+                    'raw_path': path.encode(),
+                    'query_string': query.encode(),
+                    'root_path': '',
+                    'headers': [(b'host', b'localhost')],
+                    'server': ('localhost', 8000),
+                    'client': ('127.0.0.1', 40000),
+                }
+                sent_body = False
+
+                async def receive():
+                    nonlocal sent_body
+                    if not sent_body:
+                        # The event loop keeps serving other clients meanwhile
+                        await asyncio.sleep(delay)
+                        sent_body = True
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    await asyncio.Event().wait()
+
+                statuses = []
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        statuses.append(message['status'])
+
+                await application(scope, receive, send)
+                return time.perf_counter() - started, statuses[0] == 200
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(request(semaphore) for _ in range(options['requests'])))
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        return _summary(
+            'ASGI (event loop)', options['asgi_path'],
+            [latency for latency, _ in outcomes], elapsed, sum(1 for _, ok in outcomes if not ok),
+        )
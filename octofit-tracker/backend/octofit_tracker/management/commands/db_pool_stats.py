@@ -0,0 +1,13 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from octofit_tracker.db_monitoring import pool_stats
+
+
+class Command(BaseCommand):
+    help = 'Connect to the database and print connection settings and pool statistics'
+
+    def handle(self, *args, **options):
+        connection.ensure_connection()
+        self.stdout.write(json.dumps(pool_stats(), indent=2))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from octofit_tracker.exports import EXPORT_FORMATS
+from octofit_tracker.models import Activity
+from octofit_tracker.serializers import ActivitySerializer
+from octofit_tracker.views import ActivityViewSet
+
+
+class Command(BaseCommand):
+    help = 'Stream activities to NDJSON or CSV with the same filters as the activities API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson', help='Output format')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--chunk-size', type=int, default=ActivityViewSet.export_chunk_size,
+                            help='Rows fetched from the database per round trip')
+        for param in ActivityViewSet.filter_params:
+            parser.add_argument(f"--{param.replace('_', '-')}", dest=param, help=f'Filter on {param}')
+
+    def handle(self, *args, **options):
+        filters = {}
+        for param, (lookup, field) in ActivityViewSet.filter_params.items():
+            if options[param] is None:
+                continue
+            try:
+                filters[lookup] = field.run_validation(options[param])
+            except serializers.ValidationError as exc:
+                raise CommandError(f'Invalid {param}: {exc.detail}')
+
+        queryset = Activity.objects.filter(**filters).order_by(*ActivityViewSet.keyset_ordering)
+        generate, _ = EXPORT_FORMATS[options['format']]
+        chunks = generate(queryset, ActivitySerializer, options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                count += 1
+        rows = count - 1 if options['format'] == 'csv' else count
+        self.stderr.write(self.style.SUCCESS(f'Exported {rows} activities to {options["output"]}'))
@@ -0,0 +1,67 @@
+import os
+import time
+from collections import Counter
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.snapshots import EPOCH_ORDINAL, Snapshot, numpy
+
+
+class Command(BaseCommand):
+    help = 'Memory-map an activity snapshot and summarize it per activity type or user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', help='Snapshot file written by snapshot_activities')
+        parser.add_argument('--by', choices=('activity_type', 'user_email'), default='activity_type',
+                            help='Group totals by this column')
+        parser.add_argument('--limit', type=int, default=20, help='Groups to show, by activity count')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            snapshot = Snapshot(options['snapshot'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        with snapshot:
+            loaded = time.monotonic() - started
+            self.stdout.write(
+                f"{snapshot.rows} activities, {os.path.getsize(options['snapshot']) / 1e6:.1f} MB, "
+                f'mapped in {loaded * 1000:.1f} ms'
+            )
+            for name, column in snapshot.columns.items():
+                self.stdout.write(f"  {name}: {column['dtype']}")
+            if not snapshot.rows:
+                return
+
+            started = time.monotonic()
+            groups = self.summarize(snapshot, options['by'])
+            dates = snapshot.column('date')
+            first, last = (int(dates.min()), int(dates.max())) if numpy is not None else (min(dates), max(dates))
+            self.stdout.write(
+                f'Dates: {date.fromordinal(EPOCH_ORDINAL + first)} to {date.fromordinal(EPOCH_ORDINAL + last)}'
+            )
+            self.stdout.write(f'\n{options["by"]:<40} {"activities":>12} {"duration":>14} {"calories":>14}')
+            for key, count, duration, calories in groups[:options['limit']]:
+                self.stdout.write(f'{key:<40} {count:>12} {duration:>14} {calories:>14}')
+            self.stdout.write(f'\nSummarized in {(time.monotonic() - started) * 1000:.1f} ms')
+
+    @staticmethod
+    def summarize(snapshot, by):
+        """Return ``(key, activities, duration, calories)`` per group, most activities first."""
+        codes = snapshot.column(by)
+        size = len(snapshot.dictionaries[by])
+        if numpy is not None:
+            counts = numpy.bincount(codes, minlength=size)
+            durations = numpy.bincount(codes, weights=snapshot.column('duration'), minlength=size)
+            calories = numpy.bincount(codes, weights=snapshot.column('calories_burned'), minlength=size)
+            totals = zip(counts.tolist(), durations.astype('int64').tolist(), calories.astype('int64').tolist())
+        else:
+            counts, durations, calories = Counter(), Counter(), Counter()
+            for code, duration, calories_burned in zip(codes, snapshot.column('duration'),
+                                                        snapshot.column('calories_burned')):
+                counts[code] += 1
+                durations[code] += duration
+                calories[code] += calories_burned
+            totals = ((counts[code], durations[code], calories[code]) for code in range(size))
+        groups = [(key, *total) for key, total in zip(snapshot.dictionaries[by], totals)]
+        return sorted(groups, key=lambda group: (-group[1], group[0]))
@@ -1,13 +1,163 @@
 from django.core.management.base import BaseCommand
-from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout
-from datetime import datetime, timedelta
+from django.db import connections
+from octofit_tracker.aggregation import _collection, uses_mongo
+from octofit_tracker.models import (
+    User, Team, Activity, ActivityRollup, ActivitySketch, Leaderboard, UserPeriodTotal, Workout,
+)
+from octofit_tracker.leaderboard import engine
+from octofit_tracker.rollups import rollups
+from octofit_tracker.sketches import sketches
+from datetime import date, datetime, timedelta
+import multiprocessing
 import random
+import time
+
+ACTIVITY_TYPES = ['Running', 'Cycling', 'Swimming', 'Weightlifting', 'Yoga', 'Boxing', 'CrossFit']
+
+
+def synthetic_email(number):
+    return f'user{number}@octofit.test'
+
+
+def generate_activities(task):
+    """
+    Generate activity rows for users ``first`` to ``last - 1``.
+
+    Runs in pool workers, so it returns plain tuples. Each chunk is seeded on
+    its own, so the output does not depend on the number of workers.
+    """
+    seed, first, last, per_user, days, today = task
+    rng = random.Random(f'{seed}-{first}')
+    rows = []
+    for number in range(first, last):
+        email = synthetic_email(number)
+        for _ in range(rng.randint(max(1, per_user // 2), per_user + per_user // 2)):
+            duration = rng.randint(20, 120)
+            rows.append((
+                email,
+                rng.choice(ACTIVITY_TYPES),
+                duration,
+                duration * rng.randint(5, 12),
+                today - rng.randint(0, days - 1),
+            ))
+    return rows
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='store_true',
+                            help='Generate a large synthetic dataset for load testing instead of the superhero data')
+        parser.add_argument('--users', type=int, default=1000, help='Number of synthetic users (scale mode)')
+        parser.add_argument('--teams', type=int, default=10, help='Number of synthetic teams (scale mode)')
+        parser.add_argument('--activities-per-user', type=int, default=100,
+                            help='Average number of activities per user (scale mode)')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread activities over this many days up to today (scale mode)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (scale mode)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert (scale mode)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to generate activities (scale mode)')
+
+    def handle(self, *args, **options):
+        # Bulk loading: skip per-activity leaderboard, rollup and sketch updates and rebuild once at the end
+        with engine.suspended(), rollups.suspended(), sketches.suspended():
+            if options['scale']:
+                self.populate_scale(options)
+            else:
+                self.populate()
+
+    def clear(self, *models):
+        for model in models:
+            # One statement per table; QuerySet.delete() would load every row to send delete signals
+            using = model.objects.db
+            if uses_mongo(using):
+                _collection(model, using).delete_many({})
+                continue
+            connection = connections[using]
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+
+    def populate_scale(self, options):
+        users, teams = max(1, options['users']), max(1, options['teams'])
+        per_user, days = max(1, options['activities_per_user']), max(1, options['days'])
+        batch_size, seed = max(1, options['batch_size']), options['seed']
+        started = time.monotonic()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generating {users} users in {teams} teams with ~{per_user} activities each...'
+        ))
+
+        self.stdout.write('Clearing existing users, teams, activities and leaderboard...')
+        self.clear(User, Team, Activity, ActivityRollup, ActivitySketch, Leaderboard, UserPeriodTotal)
+
+        self.stdout.write('Creating teams...')
+        team_names = [f'Team {number}' for number in range(1, teams + 1)]
+        Team.objects.bulk_create(
+            [Team(name=name, description=f'Synthetic load-test team {name}') for name in team_names],
+            batch_size=batch_size,
+        )
+
+        self.stdout.write('Creating users...')
+        for first in range(0, users, batch_size):
+            User.objects.bulk_create([
+                User(
+                    username=f'User {number}',
+                    email=synthetic_email(number),
+                    password='octofit123',
+                    team=team_names[number % teams],
+                )
+                for number in range(first, min(first + batch_size, users))
+            ], batch_size=batch_size)
+
+        self.stdout.write('Creating activities...')
+        users_per_chunk = max(1, batch_size // per_user)
+        today = date.today().toordinal()
+        tasks = [
+            (seed, first, min(first + users_per_chunk, users), per_user, days, today)
+            for first in range(0, users, users_per_chunk)
+        ]
+        created = 0
+        pool = multiprocessing.Pool(options['workers']) if options['workers'] > 1 else None
+        try:
+            chunks = pool.imap(generate_activities, tasks) if pool else map(generate_activities, tasks)
+            for done, rows in enumerate(chunks, start=1):
+                Activity.objects.bulk_create([
+                    Activity(
+                        user_email=email,
+                        activity_type=activity_type,
+                        duration=duration,
+                        calories_burned=calories,
+                        date=date.fromordinal(day),
+                    )
+                    for email, activity_type, duration, calories, day in rows
+                ], batch_size=batch_size)
+                created += len(rows)
+                self.stdout.write(
+                    f'  {created} activities ({done}/{len(tasks)} chunks, {time.monotonic() - started:.1f}s)'
+                )
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stdout.write('Creating leaderboard...')
+        entries = engine.rebuild(workers=options['workers'], batch_size=batch_size)
+        self.stdout.write('Creating activity rollups...')
+        buckets = rollups.rebuild(batch_size=batch_size)
+        self.stdout.write('Creating percentile sketches...')
+        sketch_count = sketches.rebuild(batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS('\n=== Synthetic Data Generation Complete ==='))
+        self.stdout.write(f'Teams created: {teams}')
+        self.stdout.write(f'Users created: {users}')
+        self.stdout.write(f'Activities created: {created}')
+        self.stdout.write(f'Leaderboard entries: {entries}')
+        self.stdout.write(f'Rollup buckets: {buckets}')
+        self.stdout.write(f'Percentile sketches: {sketch_count}')
+        self.stdout.write(self.style.SUCCESS(f'Finished in {time.monotonic() - started:.1f}s'))
+
+    def populate(self):
         self.stdout.write(self.style.SUCCESS('Starting database population...'))
         
         # Clear existing data
@@ -72,13 +222,11 @@ class Command(BaseCommand):
         
         # Create Activities
         self.stdout.write('Creating activities...')
-        activity_types = ['Running', 'Cycling', 'Swimming', 'Weightlifting', 'Yoga', 'Boxing', 'CrossFit']
-        
         for user in all_users:
             # Create 5-10 random activities for each user
             num_activities = random.randint(5, 10)
             for i in range(num_activities):
-                activity_type = random.choice(activity_types)
+                activity_type = random.choice(ACTIVITY_TYPES)
                 duration = random.randint(20, 120)
                 calories = duration * random.randint(5, 12)
                 days_ago = random.randint(0, 30)
@@ -94,24 +242,15 @@ class Command(BaseCommand):
         
         # Create Leaderboard entries
         self.stdout.write('Creating leaderboard...')
-        for user in all_users:
-            user_activities = Activity.objects.filter(user_email=user.email)
-            total_calories = sum(activity.calories_burned for activity in user_activities)
-            total_activities = user_activities.count()
-            
-            Leaderboard.objects.create(
-                user_email=user.email,
-                username=user.username,
-                team=user.team,
-                total_calories=total_calories,
-                total_activities=total_activities
-            )
+        engine.rebuild()
+        
+        # Create activity rollups
+        self.stdout.write('Creating activity rollups...')
+        rollups.rebuild()
         
-        # Update ranks
-        leaderboard_entries = Leaderboard.objects.all().order_by('-total_calories')
-        for rank, entry in enumerate(leaderboard_entries, start=1):
-            entry.rank = rank
-            entry.save()
+        # Create percentile sketches
+        self.stdout.write('Creating percentile sketches...')
+        sketches.rebuild()
         
         # Create Workouts
         self.stdout.write('Creating workouts...')
@@ -191,5 +330,6 @@ class Command(BaseCommand):
         self.stdout.write(f'Users created: {User.objects.count()}')
         self.stdout.write(f'Activities created: {Activity.objects.count()}')
         self.stdout.write(f'Leaderboard entries: {Leaderboard.objects.count()}')
+        self.stdout.write(f'Rollup buckets: {ActivityRollup.objects.count()}')
         self.stdout.write(f'Workouts created: {Workout.objects.count()}')
         self.stdout.write(self.style.SUCCESS('Database successfully populated with superhero test data!'))
@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand
+from octofit_tracker import caching
+from octofit_tracker.leaderboard import engine
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the leaderboard from activities, aggregating shards of users in parallel processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes aggregating shards (default: one per CPU)')
+        parser.add_argument('--shards', type=int, help='Ranges of users to split the work into (default: 4 per worker)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk write')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Rebuilding leaderboard with {workers} workers...')
+        counts = engine.rebuild_sharded(
+            workers=workers, shards=options['shards'], batch_size=max(1, options['batch_size']),
+        )
+        self.stdout.write(
+            f"Aggregated {counts['shards']} shards in {counts['aggregate_seconds']:.1f}s, "
+            f"wrote changes in {counts['write_seconds']:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Leaderboard rebuilt: {counts['entries']} entries "
+            f"({counts['created']} created, {counts['updated']} updated, "
+            f"{counts['deleted']} deleted, {counts['unchanged']} unchanged)"
+        ))
+        if caching.is_process_local():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to each process, so running API workers keep serving their cached '
+                'leaderboard responses until they expire. Set OCTOFIT_CACHE_DIR to share invalidation.'
+            ))
@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from octofit_tracker.models import Activity
+from octofit_tracker.snapshots import write_snapshot
+from octofit_tracker.views import ActivityViewSet
+
+
+class Command(BaseCommand):
+    help = 'Write activities to a compact columnar snapshot file for offline analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Snapshot file to write')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Rows fetched from the database per round trip')
+        for param in ActivityViewSet.filter_params:
+            parser.add_argument(f"--{param.replace('_', '-')}", dest=param, help=f'Filter on {param}')
+
+    def handle(self, *args, **options):
+        filters = {}
+        for param, (lookup, field) in ActivityViewSet.filter_params.items():
+            if options[param] is None:
+                continue
+            try:
+                filters[lookup] = field.run_validation(options[param])
+            except serializers.ValidationError as exc:
+                raise CommandError(f'Invalid {param}: {exc.detail}')
+
+        started = time.monotonic()
+        header = write_snapshot(options['output'], Activity.objects.filter(**filters), options['chunk_size'])
+        size = os.path.getsize(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {header['rows']} activities to {options['output']} "
+            f"({size / 1e6:.1f} MB, {time.monotonic() - started:.1f}s)"
+        ))
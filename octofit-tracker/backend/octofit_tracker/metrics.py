@@ -0,0 +1,215 @@
+"""
+Per-request performance instrumentation for OctoFit Tracker.
+
+``RequestMetricsMiddleware`` records, for every request, the total
+latency, database query count and time, response render time and
+response size. Render time is the time spent in the response's renderer
+(``accepted_renderer.render`` for DRF responses, the JSON encoding of the
+async views, or a template render). Building the data, including
+``FastReadMixin`` serialization, counts as app time, and compression and
+other middleware count only towards total latency. Each response gets a
+``Server-Timing`` header, and the values are aggregated into per-view
+histograms served at ``/api/metrics/`` in the Prometheus text format.
+
+Queries are counted by a database execute wrapper that reports to the
+request through a context variable, so it also sees queries that async
+views run in ``sync_to_async`` threads. Collection costs a few timer
+reads and dict updates per request. Histograms are kept per process.
+"""
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+
+from django.db import connection
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current = contextvars.ContextVar('octofit_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper that adds each query to the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def timed_render(render):
+    """Wrap a render function so its run time is added to the current request."""
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.render_time += time.perf_counter() - started
+    return timed
+
+
+def install_query_wrapper(sender=None, connection=connection, **kwargs):
+    """Add ``record_query`` to a connection's execute wrappers once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in sorted(self.series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        labels = ('view', 'method')
+        self.requests = {}
+        self.histograms = {
+            'latency': Histogram('octofit_request_duration_seconds', 'Request latency.', labels, LATENCY_BUCKETS),
+            'queries': Histogram('octofit_db_queries', 'Database queries per request.', labels, QUERY_COUNT_BUCKETS),
+            'db': Histogram('octofit_db_duration_seconds', 'Database time per request.', labels, LATENCY_BUCKETS),
+            'render': Histogram('octofit_render_duration_seconds', 'Response rendering time per request.',
+                                labels, LATENCY_BUCKETS),
+            'size': Histogram('octofit_response_size_bytes', 'Response body size.', labels, SIZE_BUCKETS),
+        }
+
+    def observe(self, view, method, status, values):
+        with self._lock:
+            key = (view, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, value in values.items():
+                self.histograms[name].observe((view, method), value)
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP octofit_requests_total Requests served.', '# TYPE octofit_requests_total counter']
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'octofit_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure each request and add a ``Server-Timing`` header.
+
+    Should be first in ``MIDDLEWARE`` so the latency covers the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_wrapper()
+        started, metrics, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, started, metrics)
+
+    async def __acall__(self, request):
+        started, metrics, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, started, metrics)
+
+    def process_template_response(self, request, response):
+        # Runs after the view and right before the response is rendered
+        renderer = getattr(response, 'accepted_renderer', None)
+        if renderer is not None:
+            # Renderers are instantiated per request, so only this response is affected
+            renderer.render = timed_render(renderer.render)
+        else:
+            response.render = timed_render(response.render)
+        return response
+
+    @staticmethod
+    def start(request):
+        metrics = RequestMetrics()
+        return time.perf_counter(), metrics, _current.set(metrics)
+
+    @staticmethod
+    def finish(request, response, started, metrics):
+        total = time.perf_counter() - started
+        render = metrics.render_time
+        values = {'latency': total, 'queries': metrics.queries, 'db': metrics.db_time, 'render': render}
+        if not response.streaming:
+            values['size'] = len(response.content)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        registry.observe(view, request.method, response.status_code, values)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'render;dur={render * 1000:.2f}',
+            f'app;dur={max(total - metrics.db_time - render, 0) * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the request histograms for this process."""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
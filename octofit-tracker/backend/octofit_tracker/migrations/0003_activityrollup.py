@@ -0,0 +1,45 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0002_activity_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_email', models.EmailField(max_length=254)),
+                ('team', models.CharField(blank=True, default='', max_length=100)),
+                ('activity_type', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('activity_count', models.IntegerField(default=0)),
+                ('total_duration', models.IntegerField(default=0, help_text='Duration in minutes')),
+                ('total_calories', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'activity_rollups',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activityrollup',
+            index=models.Index(fields=['user_email', 'day'], name='rollup_user_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activityrollup',
+            index=models.Index(fields=['team', 'day'], name='rollup_team_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activityrollup',
+            index=models.Index(fields=['day'], name='rollup_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='activityrollup',
+            constraint=models.UniqueConstraint(fields=('user_email', 'team', 'activity_type', 'day'), name='activity_rollup_bucket_unique'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0004_user_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('activity_count', models.IntegerField(default=0)),
+                ('duration', models.BinaryField(default=b'')),
+                ('calories', models.BinaryField(default=b'')),
+            ],
+            options={
+                'db_table': 'activity_sketches',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='activitysketch',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key'), name='activity_sketch_unique'),
+        ),
+    ]
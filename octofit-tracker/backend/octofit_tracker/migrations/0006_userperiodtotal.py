@@ -0,0 +1,36 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0005_activitysketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPeriodTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_email', models.EmailField(max_length=254)),
+                ('period', models.CharField(max_length=10)),
+                ('start', models.DateField()),
+                ('activity_count', models.IntegerField(default=0)),
+                ('total_calories', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'user_period_totals',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userperiodtotal',
+            index=models.Index(fields=['period', 'start', '-total_calories'], name='period_total_calories_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='userperiodtotal',
+            constraint=models.UniqueConstraint(fields=('period', 'start', 'user_email'), name='user_period_total_unique'),
+        ),
+    ]
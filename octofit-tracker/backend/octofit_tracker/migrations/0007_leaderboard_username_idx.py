@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0006_userperiodtotal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['username'], name='leaderboard_username_idx'),
+        ),
+    ]
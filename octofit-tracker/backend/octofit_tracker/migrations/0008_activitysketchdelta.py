@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0007_leaderboard_username_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySketchDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('activity_count', models.IntegerField()),
+                ('duration', models.BinaryField(default=b'')),
+                ('calories', models.BinaryField(default=b'')),
+            ],
+            options={
+                'db_table': 'activity_sketch_deltas',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0008_activitysketchdelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitysketch',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
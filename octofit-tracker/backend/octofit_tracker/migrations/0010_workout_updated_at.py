@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0009_activitysketch_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:27
+
+from django.db import migrations, models
+
+
+def merge_duplicate_entries(apps, schema_editor):
+    """Fold entries created twice for one user into the oldest; ``rebuild_leaderboard`` fixes the ranks."""
+    Leaderboard = apps.get_model('octofit_tracker', 'Leaderboard')
+    entries = {}
+    duplicates = []
+    for entry in Leaderboard.objects.order_by('user_email', 'id').iterator():
+        first = entries.get(entry.user_email)
+        if first is None:
+            entries[entry.user_email] = entry
+            continue
+        first.total_calories += entry.total_calories
+        first.total_activities += entry.total_activities
+        first.save(update_fields=['total_calories', 'total_activities'])
+        duplicates.append(entry.pk)
+    Leaderboard.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0010_workout_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_entries, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='leaderboard',
+            name='leaderboard_user_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboard',
+            constraint=models.UniqueConstraint(fields=('user_email',), name='leaderboard_user_unique'),
+        ),
+    ]
@@ -11,6 +11,10 @@ class User(models.Model):
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['username'], name='user_username_idx'),
+            models.Index(fields=['team'], name='user_team_idx'),
+        ]
     
     def __str__(self):
         return self.username
@@ -41,11 +45,100 @@ class Activity(models.Model):
     class Meta:
         db_table = 'activities'
         verbose_name_plural = 'Activities'
+        indexes = [
+            models.Index(fields=['user_email', 'date'], name='activity_user_date_idx'),
+            models.Index(fields=['activity_type', 'date'], name='activity_type_date_idx'),
+            models.Index(fields=['date'], name='activity_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user_email} - {self.activity_type}"
 
 
+class ActivityRollup(models.Model):
+    """Daily activity totals per user, team and activity type"""
+    user_email = models.EmailField()
+    team = models.CharField(max_length=100, blank=True, default='')
+    activity_type = models.CharField(max_length=100)
+    day = models.DateField()
+    activity_count = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0, help_text="Duration in minutes")
+    total_calories = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'activity_rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_email', 'team', 'activity_type', 'day'], name='activity_rollup_bucket_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user_email', 'day'], name='rollup_user_day_idx'),
+            models.Index(fields=['team', 'day'], name='rollup_team_day_idx'),
+            models.Index(fields=['day'], name='rollup_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_email} - {self.activity_type} on {self.day}"
+
+
+class UserPeriodTotal(models.Model):
+    """Activity totals of one user in one calendar week or month, for windowed leaderboards"""
+    user_email = models.EmailField()
+    period = models.CharField(max_length=10)
+    start = models.DateField()
+    activity_count = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'user_period_totals'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start', 'user_email'], name='user_period_total_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'start', '-total_calories'], name='period_total_calories_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_email} - {self.period} of {self.start}"
+
+
+class ActivitySketch(models.Model):
+    """Quantile sketches of activity duration and calories for one activity type or team"""
+    dimension = models.CharField(max_length=20)
+    key = models.CharField(max_length=100, blank=True, default='')
+    activity_count = models.IntegerField(default=0)
+    duration = models.BinaryField(default=b'')
+    calories = models.BinaryField(default=b'')
+    # Incremented by every merge into the row; readers reload when the sum changes
+    version = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'activity_sketches'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='activity_sketch_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.dimension} {self.key}"
+
+
+class ActivitySketchDelta(models.Model):
+    """Activities added to (or, with a negative count, removed from) an ``ActivitySketch`` and not yet merged"""
+    dimension = models.CharField(max_length=20)
+    key = models.CharField(max_length=100, blank=True, default='')
+    activity_count = models.IntegerField()
+    duration = models.BinaryField(default=b'')
+    calories = models.BinaryField(default=b'')
+    
+    class Meta:
+        db_table = 'activity_sketch_deltas'
+    
+    def __str__(self):
+        return f"{self.dimension} {self.key} {self.activity_count:+d}"
+
+
 class Leaderboard(models.Model):
     """Leaderboard model for competitive rankings"""
     user_email = models.EmailField()
@@ -59,6 +152,14 @@ class Leaderboard(models.Model):
     class Meta:
         db_table = 'leaderboard'
         ordering = ['-total_calories']
+        constraints = [
+            models.UniqueConstraint(fields=['user_email'], name='leaderboard_user_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['-total_calories', 'id'], name='leaderboard_calories_idx'),
+            models.Index(fields=['team', '-total_calories'], name='leaderboard_team_calories_idx'),
+            models.Index(fields=['username'], name='leaderboard_username_idx'),
+        ]
     
     def __str__(self):
         return f"{self.username} - {self.total_calories} calories"
@@ -73,6 +174,7 @@ class Workout(models.Model):
     calories_estimate = models.IntegerField()
     category = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'workouts'
@@ -0,0 +1,278 @@
+"""
+Keyset (cursor) pagination for OctoFit Tracker list endpoints.
+
+Pages are selected with a ``WHERE`` on the last row's ordering key instead
+of an ``OFFSET``, so page 1000 costs the same as page 1. Each view declares
+its ordering in ``keyset_ordering``; the last field must be unique (usually
+``id``) so the ordering is total and no row is skipped or repeated. An
+ordering requested through ``OrderingFilter`` replaces it, with ``id``
+appended as the tie-breaker.
+
+Cursor values are converted with the ordering fields' ``to_python()``, so
+a tampered cursor is answered with ``404 Invalid cursor``. Ordering keys
+that are not model fields can be declared in the view's ``keyset_fields``
+(name to model field instance); undeclared ones are used as decoded.
+
+NULLs of nullable ordering fields sort before every value, on every
+database, and cursors on them select the following rows with ``IS NULL``
+conditions.
+"""
+import base64
+import binascii
+import datetime
+import json
+from collections import namedtuple
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .filters import get_requested_ordering
+
+Cursor = namedtuple('Cursor', ['position', 'reverse'])
+
+
+def sort_key(value):
+    """Order ``None`` before every value, as nullable keyset fields are ordered in the database."""
+    return (value is not None, value)
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates on a compound ordering key with opaque cursors.
+
+    Responses have the same ``next``/``previous``/``results`` shape as DRF's
+    ``CursorPagination``.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        requested = get_requested_ordering(request, queryset, view)
+        if requested:
+            ordering = tuple(name for name in requested if name.lstrip('-') not in ('id', 'pk'))
+            return ordering + ('id',)
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Return the sliced queryset for the requested page without running it.
+
+        Callers evaluate it (synchronously or asynchronously) and pass the
+        rows to ``set_page``.
+        """
+        fields = self.start_page(request, queryset, view)
+        if fields is None:
+            return None
+        queryset = queryset.order_by(*[
+            (F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_first=True))
+            if name in self.nullable else ('-' if descending else '') + name
+            for name, descending in fields
+        ])
+        if self.cursor is not None:
+            queryset = queryset.filter(self.after(fields, self.cursor.position))
+        return queryset[:self.page_size + 1]
+
+    def paginate_list(self, rows, request, view=None):
+        """
+        Paginate an in-memory list of rows with attributes named like the
+        ordering fields, with the same cursors as ``paginate_queryset``.
+        """
+        fields = self.start_page(request, view.get_queryset().none(), view)
+        if fields is None:
+            return None
+        rows = list(rows)
+        # Stable sorts from the last ordering field to the first
+        for name, descending in reversed(fields):
+            get_value = attrgetter(name)
+            rows.sort(key=lambda row: sort_key(get_value(row)), reverse=descending)
+        if self.cursor is not None:
+            position = self.cursor.position
+            rows = [row for row in rows if self.follows(row, fields, position)]
+        return self.set_page(rows[:self.page_size + 1])
+
+    def start_page(self, request, queryset, view):
+        """Read the page size, ordering and cursor; return the ``(name, descending)`` sort fields."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request, queryset.model, view)
+
+        fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.nullable = set()
+        for name, _ in fields:
+            field = self.get_field(queryset.model, view, name)
+            if field is not None and field.null:
+                self.nullable.add(name)
+        self.reverse = self.cursor is not None and self.cursor.reverse
+        if self.reverse:
+            fields = [(name, not descending) for name, descending in fields]
+        return fields
+
+    def set_page(self, results):
+        """Trim the fetched rows to the page and work out the links."""
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        self.page = results
+        return results
+
+    @staticmethod
+    def after(fields, position):
+        """Build the filter selecting rows that sort after ``position``, with NULL before any value."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(fields, position):
+            if value is None:
+                # Only values follow NULL ascending; nothing follows it descending
+                following = None if descending else Q(**{f'{name}__isnull': False})
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                following = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                if descending:
+                    following |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            if following is not None:
+                condition |= equal & following
+            equal &= same
+        return condition
+
+    @staticmethod
+    def follows(row, fields, position):
+        """Return whether ``row`` sorts after ``position``, as ``after`` selects in the database."""
+        for (name, descending), value in zip(fields, position):
+            current, value = sort_key(getattr(row, name)), sort_key(value)
+            if current != value:
+                return current < value if descending else current > value
+        return False
+
+    def get_position(self, row):
+        return [
+            _encode_value(getattr(row, name.lstrip('-')))
+            for name in self.ordering
+        ]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(position=self.get_position(self.page[-1]), reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(position=self.get_position(self.page[0]), reverse=True))
+
+    def decode_cursor(self, request, model=None, view=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = data['p']
+            reverse = bool(data.get('r'))
+        except (binascii.Error, KeyError, TypeError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if model is not None:
+            try:
+                position = [
+                    self.to_python(model, view, name.lstrip('-'), value)
+                    for name, value in zip(self.ordering, position)
+                ]
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        return Cursor(position=position, reverse=reverse)
+
+    @staticmethod
+    def get_field(model, view, name):
+        """Return the field of ordering key ``name``, from ``keyset_fields`` or the model, or ``None``."""
+        field = getattr(view, 'keyset_fields', {}).get(name)
+        if field is None:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+        return field
+
+    @classmethod
+    def to_python(cls, model, view, name, value):
+        """Convert one cursor value to the Python type of ordering field ``name``."""
+        field = cls.get_field(model, view, name)
+        if field is None:
+            return value
+        if value is None and field.null:
+            return None
+        if value is None or isinstance(value, (dict, list)):
+            raise ValueError(f'Invalid cursor value for {name}')
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError(f'Invalid cursor value for {name}')
+        return value
+
+    def encode_cursor(self, cursor):
+        data = {'p': cursor.position}
+        if cursor.reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
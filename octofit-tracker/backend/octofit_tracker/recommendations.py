@@ -0,0 +1,198 @@
+"""
+Personalized workout recommendations for OctoFit Tracker.
+
+Every workout is a row of a feature matrix: one column per category, then
+difficulty level (0-2), duration and calories. The matrix is built once per
+catalog version and shared by all requests. The version is read from the
+database (workout count, highest id and latest ``updated_at``), so workout
+changes made by other processes are picked up as well; queryset
+``update()`` calls, which leave ``updated_at`` alone, are not. A user's
+profile comes from their daily activity rollups over the last
+``PROFILE_DAYS`` days: category affinity (activity types mapped to workout
+categories), typical duration and calories per activity, and a target
+difficulty from their calories per minute. Scoring the whole catalog is one
+matrix-vector product plus element-wise penalties.
+
+NumPy (in ``requirements.txt``) is imported on first use, to keep it out
+of worker startup. Without it the same scores are computed row by row,
+which is slower but gives the same results. Results are cached per user
+until their next activity write or a workout change.
+"""
+import datetime
+import heapq
+import threading
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from .models import ActivityRollup, Workout
+from .serializers import WorkoutSerializer, get_read_plan
+
+PROFILE_DAYS = 30
+RESULT_KEY = 'octofit:recommended:{}'
+RESULT_TIMEOUT = 300
+
+DIFFICULTY_LEVELS = {'beginner': 0.0, 'intermediate': 1.0, 'advanced': 2.0}
+
+# Workout categories each activity type trains, with weights summing to 1
+ACTIVITY_CATEGORIES = {
+    'Running': {'Cardio': 1.0},
+    'Cycling': {'Cardio': 1.0},
+    'Swimming': {'Cardio': 1.0},
+    'Weightlifting': {'Strength': 1.0},
+    'Yoga': {'Flexibility': 0.7, 'Core': 0.3},
+    'Boxing': {'Agility': 0.5, 'HIIT': 0.5},
+    'CrossFit': {'HIIT': 0.6, 'Strength': 0.4},
+}
+
+# Score = affinity - the weighted relative distance from the user's typical workout
+WEIGHTS = {'category': 1.0, 'difficulty': 0.4, 'duration': 0.3, 'calories': 0.3}
+
+# NumPy module, ``None`` when not installed, ``False`` until first imported
+_numpy = False
+
+
+def get_numpy():
+    """Return NumPy, imported on first use, or ``None`` when it is not installed."""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - numpy is optional
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+class WorkoutCatalog:
+    """The serialized workouts and their feature matrix for one catalog version"""
+
+    def __init__(self, version):
+        self.version = version
+        self.numpy = numpy = get_numpy()
+        plan = get_read_plan(WorkoutSerializer)
+        rows = list(Workout.objects.values_list(*plan.columns))
+        self.items = [plan.to_representation(row) for row in rows]
+        self.categories = sorted({item['category'] for item in self.items})
+        column = {category: index for index, category in enumerate(self.categories)}
+        width = len(self.categories)
+        features = []
+        for item in self.items:
+            row = [0.0] * (width + 3)
+            row[column[item['category']]] = 1.0
+            row[width] = DIFFICULTY_LEVELS.get(item['difficulty'].lower(), 1.0)
+            row[width + 1] = float(item['duration'])
+            row[width + 2] = float(item['calories_estimate'])
+            features.append(row)
+        self.features = numpy.array(features, dtype=float).reshape(-1, width + 3) if numpy else features
+
+    def top(self, profile, limit):
+        """Return ``(index, score)`` of the ``limit`` best workouts for ``profile``, best first."""
+        width = len(self.categories)
+        affinity = [profile.affinity.get(category, 0.0) for category in self.categories]
+        numpy = self.numpy
+        if numpy is not None:
+            features = self.features
+            scores = (
+                WEIGHTS['category'] * (features[:, :width] @ numpy.array(affinity, dtype=float))
+                - WEIGHTS['difficulty'] * numpy.abs(features[:, width] - profile.difficulty) / 2
+                - WEIGHTS['duration'] * numpy.abs(features[:, width + 1] - profile.duration) / profile.duration
+                - WEIGHTS['calories'] * numpy.abs(features[:, width + 2] - profile.calories) / profile.calories
+            )
+            if limit < len(scores):
+                candidates = numpy.argpartition(-scores, limit - 1)[:limit]
+            else:
+                candidates = numpy.arange(len(scores))
+            best = sorted(candidates.tolist(), key=lambda index: (-scores[index], index))
+            return [(index, float(scores[index])) for index in best]
+        scores = [
+            WEIGHTS['category'] * sum(value * weight for value, weight in zip(row, affinity))
+            - WEIGHTS['difficulty'] * abs(row[width] - profile.difficulty) / 2
+            - WEIGHTS['duration'] * abs(row[width + 1] - profile.duration) / profile.duration
+            - WEIGHTS['calories'] * abs(row[width + 2] - profile.calories) / profile.calories
+            for row in self.features
+        ]
+        best = heapq.nsmallest(limit, range(len(scores)), key=lambda index: (-scores[index], index))
+        return [(index, scores[index]) for index in best]
+
+
+class Profile:
+    """A user's recent training: category affinity, typical duration and calories, target difficulty"""
+
+    def __init__(self, affinity, duration, calories, difficulty):
+        self.affinity = affinity
+        self.duration = max(duration, 1.0)
+        self.calories = max(calories, 1.0)
+        self.difficulty = difficulty
+
+    @classmethod
+    def for_user(cls, user_email, today=None):
+        since = (today or datetime.date.today()) - datetime.timedelta(days=PROFILE_DAYS)
+        totals = (
+            ActivityRollup.objects.filter(user_email=user_email, day__gte=since)
+            .values('activity_type')
+            .annotate(count=Sum('activity_count'), duration=Sum('total_duration'), calories=Sum('total_calories'))
+            .order_by()
+        )
+        count = duration = calories = 0
+        affinity = {}
+        for row in totals:
+            if row['count'] <= 0:
+                continue
+            count += row['count']
+            duration += row['duration']
+            calories += row['calories']
+            for category, weight in ACTIVITY_CATEGORIES.get(row['activity_type'], {}).items():
+                affinity[category] = affinity.get(category, 0.0) + weight * row['count']
+        if not count:
+            # No recent activity: no category preference, a short beginner workout
+            return cls({}, 30.0, 200.0, 0.0)
+        per_minute = calories / duration if duration else 0.0
+        return cls(
+            {category: value / count for category, value in affinity.items()},
+            duration / count,
+            calories / count,
+            min(max((per_minute - 5.0) / 4.0, 0.0), 2.0),
+        )
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the workout catalog, rebuilt when workouts have changed."""
+    global _catalog
+    version = catalog_version()
+    catalog = _catalog
+    if catalog is None or catalog.version != version:
+        with _catalog_lock:
+            if _catalog is None or _catalog.version != version:
+                _catalog = WorkoutCatalog(version)
+            catalog = _catalog
+    return catalog
+
+
+def catalog_version():
+    """Return a version of the workout table that changes with every saved, created or deleted workout."""
+    aggregate = Workout.objects.aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+    return (aggregate['count'], aggregate['last_id'], aggregate['updated'])
+
+
+def recommend(user_email, limit=10):
+    """Return up to ``limit`` serialized workouts with a ``score``, best first."""
+    catalog = get_catalog()
+    key = RESULT_KEY.format(user_email)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == catalog.version and cached[1] >= limit:
+        return cached[2][:limit]
+
+    best = catalog.top(Profile.for_user(user_email), limit)
+    results = [dict(catalog.items[index], score=round(score, 4)) for index, score in best]
+    cache.set(key, (catalog.version, limit, results), RESULT_TIMEOUT)
+    return results
+
+
+def invalidate(*user_emails):
+    """Drop cached recommendations after activity writes for ``user_emails``."""
+    cache.delete_many([RESULT_KEY.format(user_email) for user_email in user_emails])
@@ -0,0 +1,79 @@
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# DRF's encoder, compact and without the circular reference check
+_stdlib_encoder = JSONEncoder(ensure_ascii=False, check_circular=False, allow_nan=False, separators=(',', ':'))
+_encoder_default = JSONEncoder().default
+
+
+def dumps(data):
+    """
+    Encode ``data`` as compact UTF-8 JSON bytes, with orjson when it is
+    installed and a tuned ``json`` encoder otherwise.
+
+    Both handle the same types as DRF's ``JSONRenderer``.
+    """
+    if orjson is not None:
+        content = orjson.dumps(data, default=_encoder_default, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        content = _stdlib_encoder.encode(data).encode('utf-8')
+    # Escape the line and paragraph separators as JSONRenderer does, for embedding in JavaScript
+    if b'\xe2\x80' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` that encodes compact responses with ``dumps``.
+
+    Indented output (``; indent=`` in the Accept header, or the browsable
+    API) falls back to DRF's encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders a list as newline-delimited JSON, one item per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(dumps(item) + b'\n' for item in items)
+
+
+class CSVRenderer(BaseRenderer):
+    """Renders a list of flat dicts as CSV with a header row"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        if items:
+            writer = csv.DictWriter(buffer, fieldnames=list(items[0]))
+            writer.writeheader()
+            writer.writerows(items)
+        return buffer.getvalue().encode(self.charset)
@@ -0,0 +1,195 @@
+"""
+Pre-aggregated daily activity rollups for OctoFit Tracker.
+
+Each ``ActivityRollup`` row holds the totals of one (user, team,
+activity_type, day) bucket. Activity writes add or subtract their values
+from the matching bucket, and weekly or monthly series are folded from the
+daily buckets, so trend queries never read raw activities. The team is the
+user's team at write time; ``backfill_rollups`` regroups history after
+users change teams.
+
+The same writes keep one ``UserPeriodTotal`` row per user and calendar week
+or month, from which the windowed leaderboards are ranked. Writes that
+touch the current week or month move ``UserPeriodTotal`` to a new cache
+version; writes dated in earlier periods leave cached boards alone.
+"""
+import datetime
+import threading
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from . import caching
+from .models import User, Activity, ActivityRollup, UserPeriodTotal
+from .suspendable import SuspendableMixin
+
+PERIODS = ('day', 'week', 'month')
+# Periods with per-user totals (``UserPeriodTotal``)
+TOTAL_PERIODS = ('week', 'month')
+
+
+def period_start(day, period):
+    """Return the first day of the ``period`` containing ``day``."""
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def fold_series(rows, period):
+    """
+    Fold ``(day, activities, duration, calories)`` rows from daily buckets
+    into a series for ``period``, ordered by period start.
+    """
+    buckets = defaultdict(lambda: [0, 0, 0])
+    for day, activities, duration, calories in rows:
+        bucket = buckets[period_start(day, period)]
+        bucket[0] += activities
+        bucket[1] += duration
+        bucket[2] += calories
+    return [
+        {'period': start.isoformat(), 'activities': activities, 'duration': duration, 'calories': calories}
+        for start, (activities, duration, calories) in sorted(buckets.items())
+    ]
+
+
+class RollupStore(SuspendableMixin):
+    """Applies activity writes to the daily rollup buckets."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def record(self, activities, sign=1):
+        """
+        Add (``sign=1``) or subtract (``sign=-1``) ``activities`` to their
+        buckets. ``activities`` are ``(user_email, activity_type, date,
+        duration, calories_burned)`` tuples.
+        """
+        if not self.enabled:
+            return
+        activities = list(activities)
+        if not activities:
+            return
+        teams = dict(
+            User.objects.filter(email__in={activity[0] for activity in activities}).values_list('email', 'team')
+        )
+        deltas = defaultdict(lambda: [0, 0, 0])
+        period_deltas = defaultdict(lambda: [0, 0])
+        for user_email, activity_type, day, duration, calories in activities:
+            delta = deltas[(user_email, teams.get(user_email) or '', activity_type, day)]
+            delta[0] += sign
+            delta[1] += sign * duration
+            delta[2] += sign * calories
+            for period in TOTAL_PERIODS:
+                period_delta = period_deltas[(period, period_start(day, period), user_email)]
+                period_delta[0] += sign
+                period_delta[1] += sign * calories
+
+        with self._lock, transaction.atomic():
+            for (user_email, team, activity_type, day), (count, duration, calories) in deltas.items():
+                self._apply(
+                    dict(user_email=user_email, team=team, activity_type=activity_type, day=day),
+                    count, duration, calories,
+                )
+            today = datetime.date.today()
+            current = {(period, period_start(today, period)) for period in TOTAL_PERIODS}
+            touched = False
+            for (period, start, user_email), (count, calories) in period_deltas.items():
+                if count or calories:
+                    self._apply_period(dict(period=period, start=start, user_email=user_email), count, calories)
+                    touched = touched or (period, start) in current
+            if touched:
+                caching.invalidate(UserPeriodTotal)
+
+    @staticmethod
+    def _apply_period(total, count, calories):
+        changes = dict(
+            activity_count=F('activity_count') + count,
+            total_calories=F('total_calories') + calories,
+            updated_at=timezone.now(),
+        )
+        if UserPeriodTotal.objects.filter(**total).update(**changes):
+            if count < 0:
+                UserPeriodTotal.objects.filter(activity_count__lte=0, **total).delete()
+            return
+        if count <= 0:
+            return
+        try:
+            with transaction.atomic():
+                UserPeriodTotal.objects.create(activity_count=count, total_calories=calories, **total)
+        except IntegrityError:
+            # Created concurrently; add to the existing total instead
+            UserPeriodTotal.objects.filter(**total).update(**changes)
+
+    @staticmethod
+    def _apply(bucket, count, duration, calories):
+        changes = dict(
+            activity_count=F('activity_count') + count,
+            total_duration=F('total_duration') + duration,
+            total_calories=F('total_calories') + calories,
+        )
+        if ActivityRollup.objects.filter(**bucket).update(**changes):
+            if count < 0:
+                ActivityRollup.objects.filter(activity_count__lte=0, **bucket).delete()
+            return
+        if count <= 0:
+            return
+        try:
+            with transaction.atomic():
+                ActivityRollup.objects.create(
+                    activity_count=count, total_duration=duration, total_calories=calories, **bucket,
+                )
+        except IntegrityError:
+            # Created concurrently; add to the existing bucket instead
+            ActivityRollup.objects.filter(**bucket).update(**changes)
+
+    def rebuild(self, batch_size=1000):
+        """Recompute every bucket and period total from activities in bulk."""
+        teams = dict(User.objects.values_list('email', 'team'))
+        totals = (
+            Activity.objects.values('user_email', 'activity_type', 'date')
+            .annotate(count=Count('id'), duration=Sum('duration'), calories=Sum('calories_burned'))
+            .order_by()
+        )
+        buckets = defaultdict(lambda: [0, 0, 0])
+        period_totals = defaultdict(lambda: [0, 0])
+        for row in totals.iterator():
+            bucket = buckets[(row['user_email'], teams.get(row['user_email']) or '', row['activity_type'], row['date'])]
+            bucket[0] += row['count']
+            bucket[1] += row['duration']
+            bucket[2] += row['calories']
+            for period in TOTAL_PERIODS:
+                total = period_totals[(period, period_start(row['date'], period), row['user_email'])]
+                total[0] += row['count']
+                total[1] += row['calories']
+        with self._lock, transaction.atomic():
+            ActivityRollup.objects.all().delete()
+            ActivityRollup.objects.bulk_create([
+                ActivityRollup(
+                    user_email=user_email, team=team, activity_type=activity_type, day=day,
+                    activity_count=count, total_duration=duration, total_calories=calories,
+                )
+                for (user_email, team, activity_type, day), (count, duration, calories) in buckets.items()
+            ], batch_size=batch_size)
+            UserPeriodTotal.objects.all().delete()
+            UserPeriodTotal.objects.bulk_create([
+                UserPeriodTotal(
+                    period=period, start=start, user_email=user_email, activity_count=count, total_calories=calories,
+                )
+                for (period, start, user_email), (count, calories) in period_totals.items()
+            ], batch_size=batch_size)
+            caching.invalidate(UserPeriodTotal)
+        return len(buckets)
+
+
+def activity_values(activity):
+    """Return the rollup tuple for an ``Activity`` instance."""
+    # Saved instances keep the value they were given, e.g. an ISO date string
+    day = Activity._meta.get_field('date').to_python(activity.date)
+    return (activity.user_email, activity.activity_type, day, activity.duration, activity.calories_burned)
+
+
+rollups = RollupStore()
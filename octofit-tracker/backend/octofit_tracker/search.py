@@ -0,0 +1,219 @@
+"""
+In-process full-text search for OctoFit Tracker.
+
+Each searchable model has an inverted index from token to the documents
+containing it, with a per-field weight. Queries are tokenized the same way.
+Every query token must match, either exactly or as a prefix of an indexed
+token (for as-you-type search), and results are ranked by the field weight
+times the token's inverse document frequency, with exact matches scoring
+above prefix matches. Lookups touch only the postings of the query's
+tokens, so latency does not grow with the number of documents.
+
+Indexes are built lazily per process and updated on model saves and
+deletes in this process. Writes made by other processes, or with
+``bulk_create``, are picked up by a full rebuild every
+``REBUILD_INTERVAL`` seconds. The rebuild runs in a background thread;
+searches keep using the current index until the new one is swapped in,
+with the saves and deletes made meanwhile applied to it.
+"""
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connection
+
+from .models import User, Workout
+
+logger = logging.getLogger(__name__)
+
+REBUILD_INTERVAL = 300
+PREFIX_MATCH_WEIGHT = 0.7
+MIN_PREFIX_LENGTH = 2
+
+_token_re = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _token_re.findall(text.casefold()) if text else []
+
+
+class InvertedIndex:
+    """Token postings for the documents of one model"""
+
+    def __init__(self, fields):
+        # Field name -> weight
+        self.fields = fields
+        self.postings = defaultdict(dict)
+        self.terms = []
+        self.documents = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, values):
+        """Index (or re-index) a document from its ``{field: text}`` values."""
+        weights = defaultdict(float)
+        for field, weight in self.fields.items():
+            for token in tokenize(values.get(field)):
+                weights[token] += weight
+        with self._lock:
+            self._remove(doc_id)
+            for token, weight in weights.items():
+                postings = self.postings[token]
+                if not postings:
+                    bisect.insort(self.terms, token)
+                postings[doc_id] = weight
+            self.documents[doc_id] = tuple(weights)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        for token in self.documents.pop(doc_id, ()):
+            postings = self.postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[token]
+                del self.terms[bisect.bisect_left(self.terms, token)]
+
+    def expand(self, token):
+        """Return ``(term, weight)`` for the indexed terms ``token`` matches."""
+        matches = [(token, 1.0)] if token in self.postings else []
+        if len(token) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_right(self.terms, token)
+            while position < len(self.terms) and self.terms[position].startswith(token):
+                matches.append((self.terms[position], PREFIX_MATCH_WEIGHT))
+                position += 1
+        return matches
+
+    def search(self, query, limit=None):
+        """Return ``(doc_id, score)`` for documents matching every token of ``query``, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            total = len(self.documents)
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for term, match_weight in self.expand(token):
+                    postings = self.postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for doc_id, weight in postings.items():
+                        score = weight * idf * match_weight
+                        if score > token_scores[doc_id]:
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {doc_id: score + token_scores[doc_id] for doc_id, score in scores.items()
+                              if doc_id in token_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+
+class SearchIndex:
+    """Lazily built, periodically rebuilt ``InvertedIndex`` over one model"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        # Saves and deletes made while a rebuild runs, as (pk, values or None)
+        self._pending = None
+        self._rebuild_thread = None
+
+    def get_index(self):
+        index = self._index
+        if index is None:
+            # Nothing to serve yet, so the first search builds the index itself
+            with self._lock:
+                if self._index is None:
+                    self._index = self.build()
+                    self._built_at = time.monotonic()
+                return self._index
+        if time.monotonic() - self._built_at > REBUILD_INTERVAL:
+            self.start_rebuild()
+        return index
+
+    def start_rebuild(self):
+        """Rebuild the index in a background thread unless a rebuild is running."""
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild, name=f'octofit-search-{self.model._meta.model_name}', daemon=True,
+            )
+        self._rebuild_thread.start()
+
+    def _rebuild(self):
+        try:
+            index = self.build()
+        except Exception:
+            logger.exception('Rebuilding the %s search index failed', self.model._meta.label)
+            index = None
+        finally:
+            connection.close()
+        with self._lock:
+            # A reset while building discards the new index too
+            if index is not None and self._index is not None:
+                for pk, values in self._pending:
+                    if values is None:
+                        index.remove(pk)
+                    else:
+                        index.add(pk, values)
+                self._index = index
+            # Retried after another interval if the build failed
+            self._built_at = time.monotonic()
+            self._pending = None
+
+    def build(self):
+        index = InvertedIndex(self.fields)
+        names = list(self.fields)
+        for row in self.model.objects.values_list('pk', *names).iterator(chunk_size=5000):
+            index.add(row[0], dict(zip(names, row[1:])))
+        return index
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+
+    def search(self, query, limit=None):
+        return self.get_index().search(query, limit)
+
+    def update(self, instance):
+        """Re-index a saved instance if the index is loaded."""
+        values = {field: getattr(instance, field) for field in self.fields}
+        index = self._track(instance.pk, values)
+        if index is not None:
+            index.add(instance.pk, values)
+
+    def remove(self, instance, pk=None):
+        pk = instance.pk if pk is None else pk
+        index = self._track(pk, None)
+        if index is not None:
+            index.remove(pk)
+
+    def _track(self, pk, values):
+        """Record a change for a running rebuild; return the index to apply it to now."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((pk, values))
+            return self._index
+
+
+indexes = {
+    Workout: SearchIndex(Workout, {'name': 3.0, 'category': 2.0, 'description': 1.0}),
+    User: SearchIndex(User, {'username': 3.0, 'team': 1.0}),
+}
@@ -1,11 +1,11 @@
+import datetime
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from .models import User, Team, Activity, Leaderboard, Workout
 
 
-class UserSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = User
-        fields = '__all__'
+class ObjectIdModelSerializer(serializers.ModelSerializer):
+    """Model serializer that renders the primary key as a string, as MongoDB ObjectIds are"""
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -13,45 +13,92 @@ class UserSerializer(serializers.ModelSerializer):
         return representation
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class ReadPlan:
+    """
+    Precompiled read-only serialization plan for an ``ObjectIdModelSerializer``.
+
+    Fetches rows with ``values_list(*plan.columns)`` and turns each tuple into
+    the same dict the serializer would produce, without building model
+    instances or walking serializer fields per row. ``fields`` limits the plan,
+    and so the columns read from the database, to a sparse fieldset.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        columns, plan_fields = [], []
+        for key, field in serializer_class().fields.items():
+            if field.write_only or (fields is not None and key not in fields):
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ValueError(f'{serializer_class.__name__}.{key} is not a flat model field')
+            converter = str if key == 'id' else self.get_converter(field)
+            plan_fields.append((key, len(columns), converter))
+            columns.append(field.source)
+        self.columns = tuple(columns)
+        self.fields = tuple(plan_fields)
+        self.keys = tuple(key for key, _, _ in plan_fields)
+
+    @staticmethod
+    def get_converter(field):
+        if isinstance(field, (serializers.CharField, serializers.IntegerField)):
+            # Values already come back from the database as str/int
+            return None
+        if isinstance(field, serializers.DateTimeField):
+            return field.to_representation
+        if isinstance(field, serializers.DateField):
+            output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+            if output_format is not None and output_format.lower() == 'iso-8601':
+                return datetime.date.isoformat
+        return field.to_representation
+
+    def to_representation(self, row):
+        representation = {}
+        for key, index, converter in self.fields:
+            value = row[index]
+            representation[key] = value if converter is None or value is None else converter(value)
+        return representation
+
+
+_read_plans = {}
+
+
+def get_read_plan(serializer_class, fields=None):
+    """
+    Return the cached ``ReadPlan`` for ``serializer_class``, limited to
+    ``fields`` (a tuple of readable field names) when given.
+    """
+    key = (serializer_class, fields)
+    plan = _read_plans.get(key)
+    if plan is None:
+        plan = _read_plans[key] = ReadPlan(serializer_class, fields)
+    return plan
+
+
+class UserSerializer(ObjectIdModelSerializer):
     class Meta:
-        model = Team
+        model = User
         fields = '__all__'
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = str(instance.pk)
-        return representation
 
+class TeamSerializer(ObjectIdModelSerializer):
+    class Meta:
+        model = Team
+        fields = '__all__'
 
-class ActivitySerializer(serializers.ModelSerializer):
+
+class ActivitySerializer(ObjectIdModelSerializer):
     class Meta:
         model = Activity
         fields = '__all__'
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = str(instance.pk)
-        return representation
-
 
-class LeaderboardSerializer(serializers.ModelSerializer):
+class LeaderboardSerializer(ObjectIdModelSerializer):
     class Meta:
         model = Leaderboard
         fields = '__all__'
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = str(instance.pk)
-        return representation
 
-
-class WorkoutSerializer(serializers.ModelSerializer):
+class WorkoutSerializer(ObjectIdModelSerializer):
     class Meta:
         model = Workout
         fields = '__all__'
-
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = str(instance.pk)
-        return representation
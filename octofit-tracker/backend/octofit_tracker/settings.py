@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.metrics.RequestMetricsMiddleware',
+    'octofit_tracker.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,17 +92,72 @@ WSGI_APPLICATION = 'octofit_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
+# Configured from the environment. OCTOFIT_DB_ENGINE=sqlite runs on a local
+# SQLite file (OCTOFIT_DB_NAME) without MongoDB, e.g. for tests.
+
+DB_ENGINE = os.environ.get('OCTOFIT_DB_ENGINE', 'djongo')
+
+if DB_ENGINE == 'sqlite':
+    INSTALLED_APPS.remove('djongo')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('OCTOFIT_DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'djongo',
+            'NAME': os.environ.get('OCTOFIT_DB_NAME', 'octofit_db'),
+            'CLIENT': {
+                'host': os.environ.get('OCTOFIT_DB_HOST', 'localhost'),
+                'port': int(os.environ.get('OCTOFIT_DB_PORT', 27017)),
+                # pymongo connection pool and timeouts
+                'maxPoolSize': int(os.environ.get('OCTOFIT_DB_MAX_POOL_SIZE', 50)),
+                'minPoolSize': int(os.environ.get('OCTOFIT_DB_MIN_POOL_SIZE', 5)),
+                'maxIdleTimeMS': int(os.environ.get('OCTOFIT_DB_MAX_IDLE_MS', 300000)),
+                'waitQueueTimeoutMS': int(os.environ.get('OCTOFIT_DB_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+                'serverSelectionTimeoutMS': int(os.environ.get('OCTOFIT_DB_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+                'connectTimeoutMS': int(os.environ.get('OCTOFIT_DB_CONNECT_TIMEOUT_MS', 5000)),
+                'socketTimeoutMS': int(os.environ.get('OCTOFIT_DB_SOCKET_TIMEOUT_MS', 30000)),
+            },
+        }
+    }
+
+# Keep connections open between requests instead of reconnecting each time
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('OCTOFIT_DB_CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Set OCTOFIT_CACHE_DIR to share cached API responses between worker processes
+
+CACHES = {
     'default': {
-        'ENGINE': 'djongo',
-        'NAME': 'octofit_db',
-        'CLIENT': {
-            'host': 'localhost',
-            'port': 27017,
-        },
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'octofit',
     }
 }
+if os.environ.get('OCTOFIT_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('OCTOFIT_CACHE_DIR'),
+    }
+
 
+# Activity ingestion (octofit_tracker.ingestion)
+# Set OCTOFIT_INGESTION_MODE=buffered to answer POST /api/activities/ with 202 and write in batches
+
+OCTOFIT_INGESTION = {
+    'MODE': os.environ.get('OCTOFIT_INGESTION_MODE', 'sync'),
+    'BUFFER_SIZE': int(os.environ.get('OCTOFIT_INGESTION_BUFFER_SIZE', 10000)),
+    'BATCH_SIZE': int(os.environ.get('OCTOFIT_INGESTION_BATCH_SIZE', 500)),
+    'FLUSH_INTERVAL': float(os.environ.get('OCTOFIT_INGESTION_FLUSH_INTERVAL', 0.5)),
+    'SUBMIT_TIMEOUT': float(os.environ.get('OCTOFIT_INGESTION_SUBMIT_TIMEOUT', 0.05)),
+    'SPILL_DIR': os.environ.get('OCTOFIT_INGESTION_SPILL_DIR', str(BASE_DIR / 'ingestion_spill')),
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -143,6 +200,23 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Django REST framework
+# List endpoints use keyset pagination; see octofit_tracker/pagination.py
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'octofit_tracker.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # orjson when installed, otherwise a compact stdlib encoder
+    'DEFAULT_RENDERER_CLASSES': [
+        'octofit_tracker.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Negotiated response compression (octofit_tracker.compression)
+    'COMPRESSION_ENCODINGS': ['gzip', 'deflate'],
+    'COMPRESSION_MIN_LENGTH': int(os.environ.get('OCTOFIT_COMPRESSION_MIN_LENGTH', 1024)),
+    'COMPRESSION_LEVEL': 6,
+}
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_METHODS = [
@@ -164,3 +238,34 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+
+
+# Runtime profile
+# OCTOFIT_PROFILE=api is for API-only workers: no admin, sessions, messages,
+# static files, CSRF or clickjacking middleware and no browsable API, so
+# workers start faster and each request runs less middleware. The API does
+# not authenticate requests, so DRF authentication is off in this profile.
+# The default "full" profile also serves the admin.
+
+PROFILES = ('full', 'api')
+PROFILE = os.environ.get('OCTOFIT_PROFILE', 'full')
+if PROFILE not in PROFILES:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(f"OCTOFIT_PROFILE must be one of: {', '.join(PROFILES)}")
+
+if PROFILE == 'api':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if not app.startswith('django.contrib.')]
+    MIDDLEWARE = [
+        'octofit_tracker.metrics.RequestMetricsMiddleware',
+        'octofit_tracker.compression.CompressionMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'corsheaders.middleware.CorsMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ]
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['octofit_tracker.renderers.FastJSONRenderer']
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = []
+    REST_FRAMEWORK['UNAUTHENTICATED_USER'] = None
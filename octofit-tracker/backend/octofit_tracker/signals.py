@@ -0,0 +1,131 @@
+from collections import defaultdict
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import caching, recommendations, search
+from .leaderboard import engine
+from .models import Activity, Leaderboard, User, Workout
+from .rollups import activity_values, rollups
+from .sketches import sketches
+
+
+@receiver(pre_save, sender=Activity)
+def remember_previous_activity(sender, instance, raw=False, **kwargs):
+    """Keep the stored values of an activity that is about to be updated."""
+    instance._previous_activity = None
+    if raw or instance.pk is None or not (engine.enabled or rollups.enabled or sketches.enabled):
+        return
+    instance._previous_activity = (
+        Activity.objects.filter(pk=instance.pk)
+        .values_list('user_email', 'activity_type', 'date', 'duration', 'calories_burned')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Activity)
+def update_leaderboard_on_save(sender, instance, created, raw=False, **kwargs):
+    """Fold a created or updated activity into the leaderboard."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_activity', None)
+    if previous is None:
+        engine.record(instance.user_email, instance.calories_burned, 1)
+        return
+    old_email, old_calories = previous[0], previous[4]
+    if old_email != instance.user_email:
+        engine.record(old_email, -old_calories, -1)
+        engine.record(instance.user_email, instance.calories_burned, 1)
+    else:
+        engine.record(instance.user_email, instance.calories_burned - old_calories)
+
+
+@receiver(post_delete, sender=Activity)
+def update_leaderboard_on_delete(sender, instance, **kwargs):
+    """Remove a deleted activity from the leaderboard."""
+    engine.record(instance.user_email, -instance.calories_burned, -1)
+
+
+@receiver(post_save, sender=Activity)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    """Move a created or updated activity into its daily rollup bucket."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_activity', None)
+    if previous is not None:
+        rollups.record([previous], sign=-1)
+    rollups.record([activity_values(instance)])
+
+
+@receiver(post_delete, sender=Activity)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """Remove a deleted activity from its daily rollup bucket."""
+    rollups.record([activity_values(instance)], sign=-1)
+
+
+@receiver(post_save, sender=Activity)
+def update_sketches_on_save(sender, instance, raw=False, **kwargs):
+    """Move a created or updated activity's values into the percentile sketches."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_activity', None)
+    if previous is not None:
+        sketches.record([previous], sign=-1)
+    sketches.record([activity_values(instance)])
+
+
+@receiver(post_delete, sender=Activity)
+def update_sketches_on_delete(sender, instance, **kwargs):
+    """Remove a deleted activity's values from the percentile sketches."""
+    sketches.record([activity_values(instance)], sign=-1)
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def invalidate_recommendations(sender, instance, **kwargs):
+    """Drop cached workout recommendations of the users whose activities changed."""
+    previous = getattr(instance, '_previous_activity', None)
+    if previous is not None and previous[0] != instance.user_email:
+        recommendations.invalidate(previous[0], instance.user_email)
+    else:
+        recommendations.invalidate(instance.user_email)
+
+
+@receiver(post_save, sender=Leaderboard)
+@receiver(post_delete, sender=Leaderboard)
+@receiver(post_save, sender=Workout)
+@receiver(post_delete, sender=Workout)
+def invalidate_cached_responses(sender, **kwargs):
+    """Move cached API responses for the model to a new version."""
+    caching.invalidate(sender)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Workout)
+def update_search_index(sender, instance, **kwargs):
+    """Re-index a saved user or workout for ``?q=`` search."""
+    search.indexes[sender].update(instance)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Workout)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop a deleted user or workout from the search index."""
+    search.indexes[sender].remove(instance)
+
+
+def record_bulk_created(activities):
+    """
+    Fold activities written with ``bulk_create``, which sends no model
+    signals, into the leaderboard, rollups, percentile sketches and
+    recommendation cache.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for activity in activities:
+        totals[activity.user_email][0] += activity.calories_burned
+        totals[activity.user_email][1] += 1
+    for user_email, (calories, count) in totals.items():
+        engine.record(user_email, calories, count)
+    rollups.record(activity_values(activity) for activity in activities)
+    sketches.record(activity_values(activity) for activity in activities)
+    recommendations.invalidate(*totals)
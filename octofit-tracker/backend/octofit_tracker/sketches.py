@@ -0,0 +1,322 @@
+"""
+Streaming percentile sketches for OctoFit Tracker activity statistics.
+
+Each ``ActivitySketch`` row holds the activity count and one quantile
+sketch each for the duration and calories of the activities of one
+activity type or one team (the user's team at write time, as with the
+rollups), so ``/api/stats/percentiles/`` answers from a few hundred
+bucket counters instead of sorting the activities.
+
+Activity writes do not update those rows, which every write of the same
+activity type or team would contend for. Each write inserts an
+``ActivitySketchDelta`` with a sketch of the values it added or removed,
+and the deltas are merged into the ``ActivitySketch`` rows at most every
+``MERGE_INTERVAL`` seconds per process, after the write commits. Reads
+add the pending deltas to the merged sketches, so they are always
+current, in every process. Each process keeps the sketches in memory and
+checks two things per read: the sum of the ``version`` counters that
+merges bump, which tells whether the merged rows must be reloaded, and
+the ids of the pending deltas, so only new deltas are read and added.
+
+``QuantileSketch`` buckets values on a logarithmic scale (as in DDSketch):
+every quantile is within ``RELATIVE_ACCURACY`` of an actual value, sketches
+merge by adding bucket counts, and, unlike t-digest or KLL, a value can be
+removed again, so updated and deleted activities leave no drift. Values of
+zero or less share one bucket and are reported as ``0``.
+"""
+import bisect
+import logging
+import math
+import struct
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+
+from .models import Activity, ActivitySketch, ActivitySketchDelta, User
+from .suspendable import SuspendableMixin
+
+logger = logging.getLogger(__name__)
+
+RELATIVE_ACCURACY = 0.01
+DIMENSIONS = ('activity_type', 'team')
+SKETCH_FORMAT = 1
+MERGE_INTERVAL = 30
+
+_header = struct.Struct('<BqI')
+
+Summary = namedtuple('Summary', ['activities', 'duration', 'calories'])
+
+
+class QuantileSketch:
+    """Log-bucketed counts of positive values, mergeable and with deletions"""
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self):
+        self.buckets = {}
+        self.zero_count = 0
+        self._cumulative = None
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value, weight=1):
+        """Add ``weight`` occurrences of ``value``; a negative weight removes them."""
+        if value <= 0:
+            self.zero_count += weight
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            count = self.buckets.get(index, 0) + weight
+            if count > 0:
+                self.buckets[index] = count
+            else:
+                self.buckets.pop(index, None)
+        self._cumulative = None
+
+    def merge(self, other, weight=1):
+        """Add the counts of ``other``; ``weight=-1`` removes them again."""
+        for index, count in other.buckets.items():
+            count = self.buckets.get(index, 0) + weight * count
+            if count > 0:
+                self.buckets[index] = count
+            else:
+                self.buckets.pop(index, None)
+        self.zero_count += weight * other.zero_count
+        self._cumulative = None
+        return self
+
+    def merge_all(self, others):
+        for other in others:
+            self.merge(other)
+        return self
+
+    def quantile(self, q):
+        """Return the value at quantile ``q`` (0 to 1), or ``None`` when empty."""
+        if self._cumulative is None:
+            indexes = sorted(self.buckets)
+            running, cumulative = max(self.zero_count, 0), []
+            for index in indexes:
+                running += self.buckets[index]
+                cumulative.append(running)
+            self._cumulative = (indexes, cumulative, running)
+        indexes, cumulative, total = self._cumulative
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+        # First bucket whose cumulative count passes the rank
+        position = min(bisect.bisect_right(cumulative, rank), len(indexes) - 1)
+        return 2 * self.gamma ** indexes[position] / (self.gamma + 1)
+
+    def to_bytes(self):
+        indexes = sorted(self.buckets)
+        return _header.pack(SKETCH_FORMAT, self.zero_count, len(indexes)) + struct.pack(
+            f'<{len(indexes)}i{len(indexes)}q', *indexes, *(self.buckets[index] for index in indexes),
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        sketch = cls()
+        data = bytes(data or b'')
+        if not data:
+            return sketch
+        _, sketch.zero_count, length = _header.unpack_from(data)
+        values = struct.unpack_from(f'<{length}i{length}q', data, _header.size)
+        sketch.buckets = dict(zip(values[:length], values[length:]))
+        return sketch
+
+
+def percentiles(sketch, quantiles):
+    """Return ``{'p50': value, ...}`` for ``quantiles`` of ``sketch``."""
+    results = {}
+    for q in quantiles:
+        value = sketch.quantile(q)
+        results[f'p{q * 100:g}'] = round(value, 1) if value is not None else None
+    return results
+
+
+class SketchStore(SuspendableMixin):
+    """Applies activity writes to the stored sketches and serves them from memory."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (merged version, delta ids read, {dimension: {key: [activities, duration, calories]}}, summaries)
+        self._state = None
+        self._merged_at = 0.0
+
+    def record(self, activities, sign=1):
+        """
+        Add (``sign=1``) or remove (``sign=-1``) ``activities``, given as the
+        rollup tuples ``(user_email, activity_type, date, duration,
+        calories_burned)``, as pending deltas.
+        """
+        if not self.enabled:
+            return
+        activities = list(activities)
+        if not activities:
+            return
+        teams = dict(
+            User.objects.filter(email__in={activity[0] for activity in activities}).values_list('email', 'team')
+        )
+        summaries = defaultdict(lambda: [0, QuantileSketch(), QuantileSketch()])
+        for user_email, activity_type, day, duration, calories in activities:
+            for key in (('activity_type', activity_type), ('team', teams.get(user_email) or '')):
+                summary = summaries[key]
+                summary[0] += 1
+                summary[1].add(duration)
+                summary[2].add(calories)
+
+        ActivitySketchDelta.objects.bulk_create([
+            ActivitySketchDelta(
+                dimension=dimension, key=key, activity_count=sign * count,
+                duration=duration.to_bytes(), calories=calories.to_bytes(),
+            )
+            for (dimension, key), (count, duration, calories) in summaries.items()
+        ])
+        if time.monotonic() - self._merged_at > MERGE_INTERVAL:
+            # Set now so the other writes of this process do not queue merges too
+            self._merged_at = time.monotonic()
+            transaction.on_commit(self._merge_after_write)
+
+    def _merge_after_write(self):
+        # The write has committed; a failed merge is retried by a later write
+        try:
+            self.merge_deltas()
+        except Exception:
+            logger.exception('Merging percentile sketch deltas failed')
+
+    def merge_deltas(self, batch_size=5000):
+        """Fold up to ``batch_size`` pending deltas into the stored sketches; return how many."""
+        with self._lock, transaction.atomic():
+            deltas = ActivitySketchDelta.objects.order_by('id')
+            if connection.features.has_select_for_update:
+                # Concurrent merges take different deltas instead of waiting
+                deltas = deltas.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            deltas = list(deltas[:batch_size])
+            grouped = defaultdict(list)
+            for delta in deltas:
+                grouped[(delta.dimension, delta.key)].append(delta)
+            # Rows are locked in key order, so concurrent merges cannot deadlock
+            for (dimension, key), group in sorted(grouped.items()):
+                self._apply(dimension, key, group)
+            if deltas:
+                ActivitySketchDelta.objects.filter(pk__in=[delta.pk for delta in deltas]).delete()
+        self._merged_at = time.monotonic()
+        return len(deltas)
+
+    def _apply(self, dimension, key, deltas):
+        row = ActivitySketch.objects.select_for_update().filter(dimension=dimension, key=key).first()
+        if row is None:
+            if sum(delta.activity_count for delta in deltas) <= 0:
+                return
+            row = ActivitySketch(dimension=dimension, key=key)
+        duration, calories = QuantileSketch.from_bytes(row.duration), QuantileSketch.from_bytes(row.calories)
+        for delta in deltas:
+            weight = 1 if delta.activity_count > 0 else -1
+            row.activity_count += delta.activity_count
+            duration.merge(QuantileSketch.from_bytes(delta.duration), weight)
+            calories.merge(QuantileSketch.from_bytes(delta.calories), weight)
+        # Emptied rows are kept, so the sum of the versions only ever grows
+        row.version += 1
+        row.duration, row.calories = duration.to_bytes(), calories.to_bytes()
+        if row.pk is not None:
+            row.save(update_fields=['activity_count', 'duration', 'calories', 'version'])
+            return
+        try:
+            with transaction.atomic():
+                row.save()
+        except IntegrityError:
+            # Created concurrently; add to the existing row instead
+            self._apply(dimension, key, deltas)
+
+    def rebuild(self, batch_size=1000):
+        """Recompute every sketch from activities, dropping pending deltas."""
+        teams = dict(User.objects.values_list('email', 'team'))
+        summaries = defaultdict(lambda: [0, QuantileSketch(), QuantileSketch()])
+        activities = Activity.objects.values_list('user_email', 'activity_type', 'duration', 'calories_burned')
+        for user_email, activity_type, duration, calories in activities.iterator(chunk_size=5000):
+            for key in (('activity_type', activity_type), ('team', teams.get(user_email) or '')):
+                summary = summaries[key]
+                summary[0] += 1
+                summary[1].add(duration)
+                summary[2].add(calories)
+        with self._lock, transaction.atomic():
+            # Above the old sum, so readers see a new version
+            version = merged_version() + 1
+            ActivitySketchDelta.objects.all().delete()
+            ActivitySketch.objects.all().delete()
+            ActivitySketch.objects.bulk_create([
+                ActivitySketch(
+                    dimension=dimension, key=key, activity_count=count,
+                    duration=duration.to_bytes(), calories=calories.to_bytes(), version=version,
+                )
+                for (dimension, key), (count, duration, calories) in summaries.items()
+            ], batch_size=batch_size)
+        return len(summaries)
+
+    def get_summaries(self, dimension):
+        """
+        Return ``{key: Summary}`` for ``dimension``, from the merged sketches
+        plus the pending deltas as stored right now.
+        """
+        version = merged_version()
+        delta_ids = set(ActivitySketchDelta.objects.values_list('id', flat=True))
+        state = self._state
+        if state is not None and state[0] == version and state[1] == delta_ids:
+            return state[3].get(dimension, {})
+
+        if state is None or state[0] != version or not state[1] <= delta_ids:
+            # Merged or rebuilt since the last read: start from the stored rows
+            summaries = {name: {} for name in DIMENSIONS}
+            for row in ActivitySketch.objects.filter(activity_count__gt=0):
+                summaries.setdefault(row.dimension, {})[row.key] = [
+                    row.activity_count,
+                    QuantileSketch.from_bytes(row.duration),
+                    QuantileSketch.from_bytes(row.calories),
+                ]
+            seen, new_ids = set(), delta_ids
+        else:
+            # Copied on first change below, so a concurrent reader's state stays intact
+            summaries = {name: dict(by_key) for name, by_key in state[2].items()}
+            seen, new_ids = set(state[1]), delta_ids - state[1]
+
+        copied, deltas = set(), []
+        if new_ids:
+            deltas = ActivitySketchDelta.objects.filter(id__gte=min(new_ids)).order_by('id').values_list(
+                'id', 'dimension', 'key', 'activity_count', 'duration', 'calories',
+            )
+        for pk, dimension_name, key, count, duration, calories in deltas:
+            if pk in seen:
+                continue
+            seen.add(pk)
+            by_key = summaries.setdefault(dimension_name, {})
+            if (dimension_name, key) not in copied:
+                copied.add((dimension_name, key))
+                previous = by_key.get(key) or (0, QuantileSketch(), QuantileSketch())
+                by_key[key] = [previous[0], QuantileSketch().merge(previous[1]), QuantileSketch().merge(previous[2])]
+            summary = by_key[key]
+            weight = 1 if count > 0 else -1
+            summary[0] += count
+            summary[1].merge(QuantileSketch.from_bytes(duration), weight)
+            summary[2].merge(QuantileSketch.from_bytes(calories), weight)
+
+        current = {
+            name: {key: Summary(*summary) for key, summary in by_key.items() if summary[0] > 0}
+            for name, by_key in summaries.items()
+        }
+        self._state = (version, seen, summaries, current)
+        return current.get(dimension, {})
+
+
+def merged_version():
+    """Return the sum of the ``ActivitySketch`` versions, which every merge and rebuild raises."""
+    return ActivitySketch.objects.aggregate(version=Sum('version'))['version'] or 0
+
+
+sketches = SketchStore()
@@ -0,0 +1,230 @@
+"""
+Columnar activity snapshots for offline analysis.
+
+``write_snapshot`` streams activities into a single file laid out column by
+column: fixed-width little-endian integers, ``user_email`` and
+``activity_type`` as codes into dictionaries kept in the header (using the
+narrowest unsigned type that fits), and dates as days since 1970-01-01. A
+row takes 22 to 28 bytes on disk.
+
+Every column starts on a 64-byte boundary, so ``Snapshot`` memory-maps the
+file and returns each column as a zero-copy NumPy array (a ``memoryview``
+without NumPy). Only the pages of the columns actually read are loaded,
+and they stay in the OS page cache, not the Python heap.
+
+Layout: ``MAGIC``, the header length as a little-endian uint32, the JSON
+header (row count, dictionaries, and each column's dtype and offset), then
+the column data.
+"""
+import datetime
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+
+from .models import Activity
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is optional
+    numpy = None
+
+MAGIC = b'OCTOSNAP'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Column name -> dtype; ``None`` marks dictionary-encoded columns
+COLUMNS = {
+    'id': '<i8',
+    'user_email': None,
+    'activity_type': None,
+    'date': '<i4',
+    'duration': '<i4',
+    'calories_burned': '<i4',
+}
+
+# dtype -> array/memoryview typecode
+TYPECODES = {'<i8': 'q', '<i4': 'i', '<u4': 'I', '<u2': 'H', '<u1': 'B'}
+
+
+def code_dtype(size):
+    """Return the narrowest unsigned dtype for codes into a dictionary of ``size`` entries."""
+    if size <= 1 << 8:
+        return '<u1'
+    if size <= 1 << 16:
+        return '<u2'
+    return '<u4'
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _write_array(output, values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    values.tofile(output)
+
+
+def _read_arrays(spill, typecode, chunk_items=1 << 20):
+    """Yield the native-order arrays written to ``spill`` by ``_write_array``."""
+    spill.seek(0)
+    itemsize = array(typecode).itemsize
+    while True:
+        data = spill.read(chunk_items * itemsize)
+        if not data:
+            return
+        values = array(typecode, data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        yield values
+
+
+def write_snapshot(path, queryset=None, chunk_size=50000):
+    """
+    Write the activities of ``queryset`` (all activities by default) to a
+    snapshot at ``path``, ordered by id. Returns the snapshot header.
+
+    Columns are spilled to temporary files while streaming, so memory use
+    is bounded by ``chunk_size`` and the dictionaries. The file is written
+    next to ``path`` and moved into place when complete.
+    """
+    queryset = Activity.objects.all() if queryset is None else queryset
+    dictionaries = {name: {} for name, dtype in COLUMNS.items() if dtype is None}
+    typecodes = {name: TYPECODES[dtype] if dtype else 'I' for name, dtype in COLUMNS.items()}
+    spills = {name: tempfile.TemporaryFile() for name in COLUMNS}
+    try:
+        rows = 0
+        chunk = {name: array(typecodes[name]) for name in COLUMNS}
+        users, activity_types = dictionaries['user_email'], dictionaries['activity_type']
+        values = queryset.order_by('pk').values_list(*COLUMNS)
+        for pk, user_email, activity_type, day, duration, calories in values.iterator(chunk_size=chunk_size):
+            chunk['id'].append(pk)
+            chunk['user_email'].append(users.setdefault(user_email, len(users)))
+            chunk['activity_type'].append(activity_types.setdefault(activity_type, len(activity_types)))
+            chunk['date'].append(day.toordinal() - EPOCH_ORDINAL)
+            chunk['duration'].append(duration)
+            chunk['calories_burned'].append(calories)
+            rows += 1
+            if rows % chunk_size == 0:
+                for name, column in chunk.items():
+                    _write_array(spills[name], column)
+                chunk = {name: array(typecodes[name]) for name in COLUMNS}
+        for name, column in chunk.items():
+            _write_array(spills[name], column)
+
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            columns[name] = {'dtype': dtype or code_dtype(len(dictionaries[name]))}
+        header = {
+            'format': FORMAT_VERSION,
+            'rows': rows,
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'dictionaries': {name: list(dictionary) for name, dictionary in dictionaries.items()},
+            'columns': columns,
+        }
+        # Offsets depend on the header length, which depends on the offsets' digits
+        start = 0
+        while True:
+            offset = start
+            for name, column in columns.items():
+                column['offset'] = offset
+                offset = _aligned(offset + rows * int(column['dtype'][-1]))
+            encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+            data_start = _aligned(len(MAGIC) + 4 + len(encoded))
+            if data_start <= start:
+                break
+            start = data_start
+
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.partial', delete=False) as output:
+            try:
+                output.write(MAGIC + len(encoded).to_bytes(4, 'little') + encoded)
+                for name, column in columns.items():
+                    output.write(b'\0' * (column['offset'] - output.tell()))
+                    typecode = TYPECODES[column['dtype']]
+                    if typecode == typecodes[name]:
+                        spills[name].seek(0)
+                        shutil.copyfileobj(spills[name], output)
+                    else:
+                        for values in _read_arrays(spills[name], typecodes[name]):
+                            _write_array(output, array(typecode, values))
+                output.flush()
+                os.fsync(output.fileno())
+            except BaseException:
+                os.remove(output.name)
+                raise
+        os.replace(output.name, path)
+    finally:
+        for spill in spills.values():
+            spill.close()
+    return header
+
+
+class Snapshot:
+    """A memory-mapped snapshot file; columns are read without copying"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            if snapshot_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not an activity snapshot')
+            length = int.from_bytes(snapshot_file.read(4), 'little')
+            self.header = json.loads(snapshot_file.read(length))
+            if self.header.get('format') != FORMAT_VERSION:
+                raise ValueError(f'{path} has unsupported snapshot format {self.header.get("format")}')
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.rows = self.header['rows']
+        self.columns = self.header['columns']
+        self.dictionaries = self.header['dictionaries']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def column(self, name):
+        """
+        Return column ``name`` as a read-only NumPy array backed by the file,
+        or as a ``memoryview`` when NumPy is not installed.
+        """
+        column = self.columns[name]
+        offset, dtype = column['offset'], column['dtype']
+        if numpy is not None:
+            return numpy.frombuffer(self._mmap, dtype=dtype, count=self.rows, offset=offset)
+        if sys.byteorder == 'big':
+            raise RuntimeError('Reading snapshots on big-endian hosts requires NumPy')
+        size = self.rows * int(dtype[-1])
+        return memoryview(self._mmap)[offset:offset + size].cast(TYPECODES[dtype])
+
+    def dates(self):
+        """Return the date column as ``datetime64[D]`` (NumPy) or ``date`` objects."""
+        days = self.column('date')
+        if numpy is not None:
+            return days.astype('datetime64[D]')
+        return [datetime.date.fromordinal(EPOCH_ORDINAL + day) for day in days]
+
+    def decode(self, name, codes):
+        """Map dictionary codes of column ``name`` back to their strings."""
+        dictionary = self.dictionaries[name]
+        if numpy is not None:
+            return numpy.array(dictionary, dtype=object)[numpy.asarray(codes)]
+        return [dictionary[code] for code in codes]
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays returned by ``column`` still use the mapping; it closes with them
+            pass
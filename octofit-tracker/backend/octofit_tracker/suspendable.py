@@ -0,0 +1,24 @@
+"""
+Switching off the incremental stores of OctoFit Tracker.
+
+The leaderboard engine, the daily rollups and the percentile sketches all
+fold activity writes into tables of their own as they happen. Bulk loads
+such as ``populate_db`` suspend them and rebuild the tables afterwards,
+which is much faster than one incremental update per activity.
+"""
+from contextlib import contextmanager
+
+
+class SuspendableMixin:
+    """Adds an ``enabled`` flag, and ``suspended()`` to clear it for a block, to a store."""
+    enabled = True
+
+    @contextmanager
+    def suspended(self):
+        """Skip incremental updates, e.g. while bulk loading data."""
+        previous = self.enabled
+        self.enabled = False
+        try:
+            yield
+        finally:
+            self.enabled = previous
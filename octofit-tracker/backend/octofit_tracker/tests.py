@@ -1,9 +1,46 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipIf
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-from rest_framework import status
+from rest_framework import serializers, status
 from django.urls import reverse
-from .models import User, Team, Activity, Leaderboard, Workout
-from datetime import date
+from django.utils import timezone
+from .models import (
+    User, Team, Activity, ActivityRollup, ActivitySketch, ActivitySketchDelta, Leaderboard, UserPeriodTotal, Workout,
+)
+from . import aggregation, caching, ingestion, metrics, recommendations, renderers, search, snapshots
+from .compression import negotiate_encoding
+from .admin import EstimatedCountPaginator
+from .benchmarks import benchmark_profiles, compare_results, run_benchmarks
+from .db_monitoring import PoolCounters
+from .leaderboard import LeaderboardEngine, assign_ranks, engine, shard_bounds, window_bounds
+from .rollups import rollups
+from .search import InvertedIndex, indexes
+from .sketches import RELATIVE_ACCURACY, QuantileSketch, SketchStore, sketches
+from .snapshots import Snapshot, write_snapshot
+from .views import ActivityViewSet
+from .serializers import UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer
+from datetime import date, timedelta
 
 
 class UserAPITestCase(APITestCase):
@@ -161,3 +198,1650 @@ class APIRootTestCase(APITestCase):
         self.assertIn('activities', response.data)
         self.assertIn('leaderboard', response.data)
         self.assertIn('workouts', response.data)
+
+
+class LeaderboardEngineTestCase(APITestCase):
+    """Tests for incremental leaderboard maintenance"""
+
+    def setUp(self):
+        User.objects.create(
+            username='Iron Man',
+            email='tony.stark@marvel.com',
+            password='stark123',
+            team='Team Marvel',
+        )
+        User.objects.create(
+            username='Batman',
+            email='bruce.wayne@dc.com',
+            password='gotham123',
+            team='Team DC',
+        )
+
+    def log_activity(self, email, calories):
+        return Activity.objects.create(
+            user_email=email,
+            activity_type='Running',
+            duration=30,
+            calories_burned=calories,
+            date=date.today(),
+        )
+
+    def ranks(self):
+        return dict(Leaderboard.objects.values_list('user_email', 'rank'))
+
+    def test_create_activity_updates_leaderboard(self):
+        response = self.client.post('/api/activities/', {
+            'user_email': 'tony.stark@marvel.com',
+            'activity_type': 'Cycling',
+            'duration': 45,
+            'calories_burned': 400,
+            'date': str(date.today()),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        entry = Leaderboard.objects.get(user_email='tony.stark@marvel.com')
+        self.assertEqual(entry.username, 'Iron Man')
+        self.assertEqual(entry.team, 'Team Marvel')
+        self.assertEqual(entry.total_calories, 400)
+        self.assertEqual(entry.total_activities, 1)
+        self.assertEqual(entry.rank, 1)
+
+    def test_ranks_follow_updates_and_deletes(self):
+        self.log_activity('tony.stark@marvel.com', 300)
+        batman_run = self.log_activity('bruce.wayne@dc.com', 200)
+        self.assertEqual(self.ranks(), {'tony.stark@marvel.com': 1, 'bruce.wayne@dc.com': 2})
+
+        batman_run.calories_burned = 500
+        batman_run.save()
+        self.assertEqual(self.ranks(), {'tony.stark@marvel.com': 2, 'bruce.wayne@dc.com': 1})
+
+        batman_run.delete()
+        self.assertEqual(self.ranks(), {'tony.stark@marvel.com': 1})
+
+    def test_ties_share_a_rank(self):
+        self.log_activity('tony.stark@marvel.com', 300)
+        self.log_activity('bruce.wayne@dc.com', 300)
+        self.assertEqual(self.ranks(), {'tony.stark@marvel.com': 1, 'bruce.wayne@dc.com': 1})
+
+    def test_engines_in_separate_processes_agree(self):
+        # Each worker process has its own engine; both write to one table
+        first, second = LeaderboardEngine(), LeaderboardEngine()
+        first.record('a@octofit.test', 300, 1)
+        second.record('b@octofit.test', 100, 1)
+        first.record('c@octofit.test', 240, 1)
+        second.record('b@octofit.test', 150, 1)
+        first.record('d@octofit.test', 200, 1)
+        second.record('e@octofit.test', 100, 1)
+        first.record('c@octofit.test', -40)
+        entries = list(Leaderboard.objects.order_by('-total_calories', 'user_email'))
+        ranks = [entry.rank for entry in entries]
+        self.assertEqual(ranks, [entry.rank for entry in assign_ranks(entries)])
+        self.assertEqual(
+            [(entry.total_calories, entry.rank) for entry in entries],
+            [(300, 1), (250, 2), (200, 3), (200, 3), (100, 5)],
+        )
+
+    def test_concurrent_first_activities(self):
+        self.log_activity('bruce.wayne@dc.com', 400)
+        # Committed by another worker after this one looked the entry up
+        Leaderboard.objects.create(
+            user_email='tony.stark@marvel.com', username='Iron Man', team='Team Marvel',
+            total_calories=300, total_activities=1, rank=2,
+        )
+        select_for_update = Leaderboard.objects.select_for_update
+        lookups = [Leaderboard.objects.none()]
+        with mock.patch.object(
+            Leaderboard.objects, 'select_for_update', lambda: lookups.pop() if lookups else select_for_update(),
+        ):
+            engine.record('tony.stark@marvel.com', 200, 1)
+        entry = Leaderboard.objects.get(user_email='tony.stark@marvel.com')
+        self.assertEqual((entry.total_calories, entry.total_activities), (500, 2))
+        self.assertEqual(self.ranks(), {'tony.stark@marvel.com': 1, 'bruce.wayne@dc.com': 2})
+
+    def test_rebuild_matches_incremental(self):
+        for calories in (100, 250, 50):
+            self.log_activity('tony.stark@marvel.com', calories)
+        self.log_activity('bruce.wayne@dc.com', 600)
+        incremental = set(Leaderboard.objects.values_list('user_email', 'total_calories', 'total_activities', 'rank'))
+        engine.rebuild()
+        rebuilt = set(Leaderboard.objects.values_list('user_email', 'total_calories', 'total_activities', 'rank'))
+        self.assertEqual(incremental, rebuilt)
+
+
+class WindowedLeaderboardTestCase(APITestCase):
+    """Tests for weekly and monthly leaderboards"""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='Iron Man', email='tony.stark@marvel.com', password='x', team='Team Marvel')
+        User.objects.create(username='Batman', email='bruce.wayne@dc.com', password='x', team='Team DC')
+        User.objects.create(username='Thor', email='thor.odinson@marvel.com', password='x', team='Team Marvel')
+        today = date.today()
+        self.log('tony.stark@marvel.com', 200, today)
+        self.log('thor.odinson@marvel.com', 200, today)
+        self.log('bruce.wayne@dc.com', 100, today)
+        self.log('bruce.wayne@dc.com', 1000, today - timedelta(days=70))
+
+    def log(self, email, calories, day):
+        Activity.objects.create(
+            user_email=email, activity_type='Running', duration=30, calories_burned=calories, date=day,
+        )
+
+    def board(self, **params):
+        response = self.client.get('/api/leaderboard/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['user_email'], row['total_calories'], row['rank']) for row in response.data['results']]
+
+    def test_window_bounds(self):
+        self.assertEqual(window_bounds('week', date(2026, 10, 18)), (date(2026, 10, 12), date(2026, 10, 19)))
+        self.assertEqual(window_bounds('month', date(2026, 12, 31)), (date(2026, 12, 1), date(2027, 1, 1)))
+
+    def test_windows(self):
+        self.assertEqual(self.board(), [
+            ('bruce.wayne@dc.com', 1100, 1), ('tony.stark@marvel.com', 200, 2), ('thor.odinson@marvel.com', 200, 2),
+        ])
+        week = self.board(window='week')
+        self.assertEqual(sorted(week[:2]), [('thor.odinson@marvel.com', 200, 1), ('tony.stark@marvel.com', 200, 1)])
+        self.assertEqual(week[2], ('bruce.wayne@dc.com', 100, 3))
+        self.assertEqual(self.board(window='month'), week)
+
+    def test_users_without_leaderboard_entry(self):
+        Leaderboard.objects.filter(user_email='thor.odinson@marvel.com').delete()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            row = self.client.get('/api/leaderboard/', {'window': 'week', 'user': 'thor.odinson@marvel.com'})
+        self.assertEqual(
+            {key: row.data['results'][0][key] for key in ('id', 'username', 'team', 'total_calories', 'rank')},
+            {'id': None, 'username': 'Thor', 'team': 'Team Marvel', 'total_calories': 200, 'rank': 1},
+        )
+        # Profiles are read for the users in the window only
+        lookups = [query['sql'] for query in queries.captured_queries if 'FROM "leaderboard"' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('"leaderboard"."user_email" IN', lookups[0])
+
+    def test_string_dates(self):
+        # Saved instances keep the string; the signals must parse it
+        day = date.today()
+        self.log('thor.odinson@marvel.com', 50, day.isoformat())
+        self.assertEqual(self.board(window='week')[0], ('thor.odinson@marvel.com', 250, 1))
+        rollup = ActivityRollup.objects.get(user_email='thor.odinson@marvel.com', day=day)
+        self.assertEqual((rollup.activity_count, rollup.total_calories), (2, 250))
+
+    def test_response_shape(self):
+        entry = Leaderboard.objects.get(user_email='bruce.wayne@dc.com')
+        total = UserPeriodTotal.objects.get(
+            user_email='bruce.wayne@dc.com', period='week', start=window_bounds('week')[0],
+        )
+        row = self.client.get('/api/leaderboard/', {'window': 'week', 'user': 'bruce.wayne@dc.com'}).data['results']
+        self.assertEqual(row, [{
+            'id': str(entry.pk),
+            'user_email': 'bruce.wayne@dc.com',
+            'username': 'Batman',
+            'team': 'Team DC',
+            'total_calories': 100,
+            'total_activities': 1,
+            'rank': 3,
+            'updated_at': serializers.DateTimeField().to_representation(total.updated_at),
+        }])
+
+    def test_moving_an_activity_out_of_the_window(self):
+        run = Activity.objects.create(
+            user_email='bruce.wayne@dc.com', activity_type='Running', duration=30, calories_burned=500,
+            date=date.today(),
+        )
+        self.assertIn(('bruce.wayne@dc.com', 600, 1), self.board(window='week'))
+        # Only the date changes, so the all-time leaderboard is not written
+        run.date = date.today() - timedelta(days=70)
+        run.save()
+        self.assertIn(('bruce.wayne@dc.com', 100, 3), self.board(window='week'))
+        self.assertIn(('bruce.wayne@dc.com', 100, 3), self.board(window='month'))
+
+    def test_only_writes_to_the_current_window_invalidate(self):
+        version = caching.get_version(UserPeriodTotal)
+        self.log('bruce.wayne@dc.com', 50, date.today() - timedelta(days=70))
+        self.assertEqual(caching.get_version(UserPeriodTotal), version)
+        self.log('bruce.wayne@dc.com', 50, date.today())
+        self.assertNotEqual(caching.get_version(UserPeriodTotal), version)
+
+    def test_period_totals_match_rebuild(self):
+        self.log('thor.odinson@marvel.com', 75, date.today() - timedelta(days=40))
+        columns = ('user_email', 'period', 'start', 'activity_count', 'total_calories')
+        incremental = set(UserPeriodTotal.objects.values_list(*columns))
+        rollups.rebuild()
+        self.assertEqual(set(UserPeriodTotal.objects.values_list(*columns)), incremental)
+
+    def test_tampered_cursor(self):
+        cursor = base64.urlsafe_b64encode(json.dumps({'p': ['x', {}]}).encode()).decode()
+        response = self.client.get('/api/leaderboard/', {'window': 'week', 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_new_activity_and_pagination(self):
+        self.board(window='week')
+        self.log('bruce.wayne@dc.com', 500, date.today())
+        self.assertEqual(self.board(window='week', team='Team DC'), [('bruce.wayne@dc.com', 600, 1)])
+
+        response = self.client.get('/api/leaderboard/', {'window': 'week', 'page_size': 2, 'ordering': 'username'})
+        self.assertEqual([row['username'] for row in response.data['results']], ['Batman', 'Iron Man'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['username'] for row in response.data['results']], ['Thor'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([row['username'] for row in response.data['results']], ['Batman', 'Iron Man'])
+
+    def test_invalid_window(self):
+        response = self.client.get('/api/leaderboard/', {'window': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_view(self):
+        response = async_to_sync(AsyncClient().get)('/api/async/leaderboard/', {'window': 'week', 'fields': 'rank'})
+        self.assertEqual(response.json()['results'], [{'rank': 1}, {'rank': 1}, {'rank': 3}])
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """Tests for keyset pagination on list endpoints"""
+
+    def setUp(self):
+        today = date.today()
+        for day in range(5):
+            for calories in (100, 200):
+                Activity.objects.create(
+                    user_email='tony.stark@marvel.com',
+                    activity_type='Running',
+                    duration=30,
+                    calories_burned=calories,
+                    date=today - timedelta(days=day),
+                )
+
+    def collect(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_walks_every_row_once_in_order(self):
+        ids, pages = self.collect('/api/activities/?page_size=3')
+        expected = [str(pk) for pk in Activity.objects.order_by('-date', '-id').values_list('pk', flat=True)]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 4)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/activities/?page_size=3').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [item['id'] for item in back['results']],
+            [item['id'] for item in first['results']],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/activities/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_null_sort_values(self):
+        for number, team in enumerate([None, 'Team DC', None, 'Team Marvel', None, 'Team DC']):
+            User.objects.create(username=f'Hero {number}', email=f'hero{number}@octofit.test', password='x', team=team)
+
+        def pages(ordering):
+            names, url, params = [], '/api/users/', {'ordering': ordering, 'page_size': 2}
+            while url:
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                names.extend(row['username'] for row in response.data['results'])
+                url, params, last = response.data['next'], None, response.data
+            # And back again from the last page
+            previous = last['previous']
+            while previous:
+                response = self.client.get(previous)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                names_back = [row['username'] for row in response.data['results']]
+                self.assertEqual(names[names.index(names_back[0]):][:len(names_back)], names_back)
+                previous = response.data['previous']
+            return names
+
+        # NULLs sort before every value
+        self.assertEqual(pages('team'), ['Hero 0', 'Hero 2', 'Hero 4', 'Hero 1', 'Hero 5', 'Hero 3'])
+        self.assertEqual(pages('-team'), ['Hero 3', 'Hero 1', 'Hero 5', 'Hero 0', 'Hero 2', 'Hero 4'])
+
+    def test_tampered_cursor_values(self):
+        def cursor(*position):
+            return base64.urlsafe_b64encode(json.dumps({'p': list(position)}).encode()).decode()
+
+        for url, position in [
+            ('/api/activities/', ['abc', 'x']),
+            ('/api/activities/', [None, None]),
+            ('/api/activities/', [{'a': 1}, 1]),
+            ('/api/activities/', [str(date.today()), [1]]),
+            ('/api/activities/?ordering=duration', ['long', 1]),
+            ('/api/leaderboard/?ordering=rank', ['first', 1]),
+        ]:
+            with self.subTest(url=url, position=position):
+                response = self.client.get(url, {'cursor': cursor(*position)})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertEqual(response.data['detail'], 'Invalid cursor')
+        response = self.client.get('/api/activities/', {'cursor': cursor(str(date.today()), 1), 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ActivityBulkAPITestCase(APITestCase):
+    """Tests for bulk activity ingestion"""
+
+    def activity(self, **overrides):
+        data = {
+            'user_email': 'peter.parker@marvel.com',
+            'activity_type': 'Cycling',
+            'duration': 45,
+            'calories_burned': 400,
+            'date': str(date.today()),
+        }
+        data.update(overrides)
+        return data
+
+    def test_bulk_json_array(self):
+        items = [self.activity(), self.activity(calories_burned='lots'), self.activity(calories_burned=100)]
+        response = self.client.post('/api/activities/bulk/', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertIn('calories_burned', response.data['errors'][0]['errors'])
+        self.assertEqual(Activity.objects.count(), 2)
+        entry = Leaderboard.objects.get(user_email='peter.parker@marvel.com')
+        self.assertEqual((entry.total_calories, entry.total_activities), (500, 2))
+
+    def test_bulk_ndjson(self):
+        body = '\n'.join(json.dumps(self.activity(duration=minutes)) for minutes in (10, 20, 30))
+        response = self.client.post('/api/activities/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['errors'], [])
+
+    def test_bulk_ndjson_stops_at_limit(self):
+        # The unparseable last line is never reached
+        body = '\n'.join([json.dumps(self.activity())] * 3 + ['not json'])
+        with mock.patch.object(ActivityViewSet, 'bulk_max_items', 2):
+            response = self.client.post('/api/activities/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'At most 2 items per request.')
+        self.assertEqual(Activity.objects.count(), 0)
+
+    def test_bulk_rejects_non_list(self):
+        response = self.client.post('/api/activities/bulk/', self.activity(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PopulateDbScaleTestCase(TestCase):
+    """Tests for the synthetic data mode of populate_db"""
+
+    def test_scale_mode(self):
+        call_command(
+            'populate_db', '--scale', '--users', '20', '--teams', '3',
+            '--activities-per-user', '4', '--batch-size', '25', '--seed', '7',
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Team.objects.count(), 3)
+        self.assertEqual(Leaderboard.objects.count(), 20)
+        self.assertEqual(
+            Leaderboard.objects.aggregate(total=Sum('total_activities'))['total'],
+            Activity.objects.count(),
+        )
+        first_run = sorted(Activity.objects.values_list('user_email', 'calories_burned', 'date'))
+
+        call_command(
+            'populate_db', '--scale', '--users', '20', '--teams', '3',
+            '--activities-per-user', '4', '--batch-size', '25', '--seed', '7',
+            stdout=StringIO(),
+        )
+        self.assertEqual(sorted(Activity.objects.values_list('user_email', 'calories_burned', 'date')), first_run)
+
+
+class FastReadTestCase(APITestCase):
+    """Tests that the fast read path matches the model serializers"""
+
+    def setUp(self):
+        User.objects.create(username='Thor', email='thor.odinson@marvel.com', password='thunder123', team=None)
+        Team.objects.create(name='Team Marvel', description=None)
+        Activity.objects.create(
+            user_email='thor.odinson@marvel.com',
+            activity_type='Boxing',
+            duration=60,
+            calories_burned=700,
+            date=date(2026, 1, 31),
+        )
+        Workout.objects.create(
+            name='Bat HIIT Training',
+            description='High-intensity interval training for peak performance',
+            difficulty='Advanced',
+            duration=35,
+            calories_estimate=400,
+            category='HIIT',
+        )
+
+    def test_matches_serializer_output(self):
+        resources = [
+            ('users', User, UserSerializer),
+            ('teams', Team, TeamSerializer),
+            ('activities', Activity, ActivitySerializer),
+            ('leaderboard', Leaderboard, LeaderboardSerializer),
+            ('workouts', Workout, WorkoutSerializer),
+        ]
+        for name, model, serializer_class in resources:
+            instance = model.objects.get()
+            expected = json.loads(json.dumps(serializer_class(instance).data))
+            listed = self.client.get(f'/api/{name}/').json()['results']
+            self.assertEqual(listed, [expected], name)
+            retrieved = self.client.get(f'/api/{name}/{instance.pk}/').json()
+            self.assertEqual(retrieved, expected, name)
+            self.assertIsInstance(retrieved['id'], str)
+
+    def test_retrieve_missing(self):
+        self.assertEqual(self.client.get('/api/users/999/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/users/abc/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SparseFieldsetTestCase(APITestCase):
+    """Tests for ?fields= and ?exclude= on list and retrieve"""
+
+    def setUp(self):
+        for day in range(1, 4):
+            Activity.objects.create(
+                user_email='thor.odinson@marvel.com',
+                activity_type='Boxing',
+                duration=60,
+                calories_burned=700 + day,
+                date=date(2026, 1, day),
+            )
+
+    def test_fields_projects_columns(self):
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get('/api/activities/', {'fields': 'activity_type,calories_burned'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {'activity_type': 'Boxing', 'calories_burned': 703})
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('"duration"', sql)
+        self.assertNotIn('"user_email"', sql)
+
+    def test_pagination_still_reads_ordering_key(self):
+        response = self.client.get('/api/activities/', {'fields': 'calories_burned', 'page_size': 2})
+        self.assertEqual([item['calories_burned'] for item in response.data['results']], [703, 702])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'calories_burned': 701}])
+
+    def test_exclude_and_retrieve(self):
+        activity = Activity.objects.get(calories_burned=701)
+        response = self.client.get(f'/api/activities/{activity.pk}/', {'exclude': 'user_email,created_at'})
+        self.assertEqual(set(response.data), {'id', 'activity_type', 'duration', 'calories_burned', 'date'})
+        self.assertEqual(response.data['id'], str(activity.pk))
+
+    def test_invalid_fields(self):
+        response = self.client.get('/api/activities/', {'fields': 'calories_burned,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+        response = self.client.get('/api/teams/', {'exclude': 'id,name,description,created_at'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_view(self):
+        response = async_to_sync(AsyncClient().get)('/api/async/activities/', {'fields': 'date', 'page_size': 1})
+        self.assertEqual(response.json()['results'], [{'date': '2026-01-03'}])
+
+
+class ActivityFilterTestCase(APITestCase):
+    """Tests for activity and leaderboard query parameters"""
+
+    def setUp(self):
+        today = date.today()
+        for email, activity_type, days_ago, calories in [
+            ('tony.stark@marvel.com', 'Running', 0, 300),
+            ('tony.stark@marvel.com', 'Cycling', 3, 500),
+            ('tony.stark@marvel.com', 'Running', 10, 200),
+            ('bruce.wayne@dc.com', 'Running', 1, 400),
+        ]:
+            Activity.objects.create(
+                user_email=email,
+                activity_type=activity_type,
+                duration=30,
+                calories_burned=calories,
+                date=today - timedelta(days=days_ago),
+            )
+        Leaderboard.objects.filter(user_email='bruce.wayne@dc.com').update(team='Team DC')
+
+    def test_filter_by_user_and_date_range(self):
+        week_ago = date.today() - timedelta(days=7)
+        response = self.client.get(f'/api/activities/?user=tony.stark@marvel.com&date_from={week_ago}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['calories_burned'] for item in response.data['results']], [300, 500])
+
+    def test_filter_by_activity_type(self):
+        response = self.client.get('/api/activities/?activity_type=Running')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_invalid_filter_value(self):
+        response = self.client.get('/api/activities/?date_from=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('date_from', response.data)
+
+    def test_ordering_whitelist_with_pagination(self):
+        url = '/api/activities/?ordering=calories_burned&page_size=3'
+        first = self.client.get(url).data
+        second = self.client.get(first['next']).data
+        calories = [item['calories_burned'] for item in first['results'] + second['results']]
+        self.assertEqual(calories, [200, 300, 400, 500])
+        unknown = self.client.get('/api/activities/?ordering=user_email').data['results']
+        self.assertEqual([item['calories_burned'] for item in unknown], [300, 400, 500, 200])
+
+    def test_leaderboard_team_filter(self):
+        response = self.client.get('/api/leaderboard/?team=Team DC')
+        self.assertEqual([item['user_email'] for item in response.data['results']], ['bruce.wayne@dc.com'])
+
+
+class ResponseCacheTestCase(APITestCase):
+    """Tests for cached leaderboard and workout responses"""
+
+    def setUp(self):
+        cache.clear()
+        self.workout = Workout.objects.create(
+            name='Morning Run',
+            description='30-minute moderate-pace run',
+            difficulty='Medium',
+            duration=30,
+            calories_estimate=300,
+            category='Cardio',
+        )
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/api/workouts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        cached = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cached_response_served_without_queries(self):
+        first = self.client.get('/api/workouts/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/workouts/')
+        self.assertEqual(first.content, second.content)
+
+    def test_write_invalidates(self):
+        etag = self.client.get('/api/workouts/')['ETag']
+        response = self.client.patch(f'/api/workouts/{self.workout.pk}/', {'name': 'Evening Run'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        fresh = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, status.HTTP_200_OK)
+        self.assertEqual(fresh.json()['results'][0]['name'], 'Evening Run')
+
+    def test_leaderboard_follows_activity_writes(self):
+        Activity.objects.create(
+            user_email='tony.stark@marvel.com',
+            activity_type='Running',
+            duration=30,
+            calories_burned=300,
+            date=date.today(),
+        )
+        self.assertEqual(self.client.get('/api/leaderboard/').json()['results'][0]['total_calories'], 300)
+        Activity.objects.create(
+            user_email='tony.stark@marvel.com',
+            activity_type='Running',
+            duration=30,
+            calories_burned=200,
+            date=date.today(),
+        )
+        self.assertEqual(self.client.get('/api/leaderboard/').json()['results'][0]['total_calories'], 500)
+
+
+class StatsAPITestCase(APITestCase):
+    """Tests for rollup maintenance and the stats endpoint"""
+
+    def setUp(self):
+        User.objects.create(username='Iron Man', email='tony.stark@marvel.com', password='stark123', team='Team Marvel')
+        User.objects.create(username='Batman', email='bruce.wayne@dc.com', password='gotham123', team='Team DC')
+        self.monday = date(2026, 10, 5)
+        for email, activity_type, days, calories in [
+            ('tony.stark@marvel.com', 'Running', 0, 300),
+            ('tony.stark@marvel.com', 'Running', 0, 100),
+            ('tony.stark@marvel.com', 'Cycling', 2, 500),
+            ('tony.stark@marvel.com', 'Running', 7, 200),
+            ('bruce.wayne@dc.com', 'Boxing', 1, 400),
+        ]:
+            Activity.objects.create(
+                user_email=email,
+                activity_type=activity_type,
+                duration=30,
+                calories_burned=calories,
+                date=self.monday + timedelta(days=days),
+            )
+
+    def series(self, query):
+        response = self.client.get(f'/api/stats/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item['period'], item['activities'], item['calories']) for item in response.data['series']]
+
+    def test_daily_series_from_rollups(self):
+        self.assertEqual(ActivityRollup.objects.count(), 4)
+        with self.assertNumQueries(1):
+            self.client.get('/api/stats/?user=tony.stark@marvel.com')
+        self.assertEqual(self.series('user=tony.stark@marvel.com'), [
+            ('2026-10-05', 2, 400), ('2026-10-07', 1, 500), ('2026-10-12', 1, 200),
+        ])
+
+    def test_weekly_and_monthly_series(self):
+        self.assertEqual(self.series('period=week'), [('2026-10-05', 4, 1300), ('2026-10-12', 1, 200)])
+        self.assertEqual(self.series('period=month&team=Team DC'), [('2026-10-01', 1, 400)])
+
+    def test_updates_and_deletes_move_buckets(self):
+        activity = Activity.objects.get(activity_type='Cycling')
+        activity.activity_type = 'Running'
+        activity.save()
+        self.assertFalse(ActivityRollup.objects.filter(activity_type='Cycling').exists())
+        activity.delete()
+        self.assertEqual(self.series('period=week&activity_type=Running'), [('2026-10-05', 2, 400), ('2026-10-12', 1, 200)])
+
+    def test_backfill_matches_incremental(self):
+        columns = ('user_email', 'team', 'activity_type', 'day', 'activity_count', 'total_duration', 'total_calories')
+        incremental = set(ActivityRollup.objects.values_list(*columns))
+        call_command('backfill_rollups', stdout=StringIO())
+        self.assertEqual(set(ActivityRollup.objects.values_list(*columns)), incremental)
+
+    def test_invalid_period(self):
+        response = self.client.get('/api/stats/?period=year')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AggregationTestCase(APITestCase):
+    """Tests for the leaderboard and team aggregation service"""
+
+    def setUp(self):
+        User.objects.create(username='Iron Man', email='tony.stark@marvel.com', password='stark123', team='Team Marvel')
+        User.objects.create(username='Thor', email='thor.odinson@marvel.com', password='thunder123', team='Team Marvel')
+        User.objects.create(username='Batman', email='bruce.wayne@dc.com', password='gotham123', team='Team DC')
+        with engine.suspended(), rollups.suspended():
+            for email, calories in [
+                ('tony.stark@marvel.com', 300),
+                ('tony.stark@marvel.com', 200),
+                ('thor.odinson@marvel.com', 100),
+                ('bruce.wayne@dc.com', 700),
+                ('unknown@example.com', 50),
+            ]:
+                Activity.objects.create(
+                    user_email=email,
+                    activity_type='Running',
+                    duration=30,
+                    calories_burned=calories,
+                    date=date.today(),
+                )
+
+    def test_backend_selection(self):
+        self.assertFalse(aggregation.uses_mongo())
+
+    def test_user_totals(self):
+        self.assertEqual(aggregation.user_totals(), [
+            {'user_email': 'bruce.wayne@dc.com', 'calories': 700, 'activities': 1},
+            {'user_email': 'tony.stark@marvel.com', 'calories': 500, 'activities': 2},
+            {'user_email': 'thor.odinson@marvel.com', 'calories': 100, 'activities': 1},
+            {'user_email': 'unknown@example.com', 'calories': 50, 'activities': 1},
+        ])
+
+    def test_team_totals_endpoint(self):
+        response = self.client.get('/api/teams/totals/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [
+            {'team': 'Team DC', 'calories': 700, 'activities': 1, 'members': 1},
+            {'team': 'Team Marvel', 'calories': 600, 'activities': 3, 'members': 2},
+            {'team': '', 'calories': 50, 'activities': 1, 'members': 1},
+        ])
+
+
+class ActivityExportTestCase(APITestCase):
+    """Tests for streaming activity exports"""
+
+    def setUp(self):
+        for email, calories, days_ago in [
+            ('tony.stark@marvel.com', 300, 0),
+            ('bruce.wayne@dc.com', 400, 1),
+            ('tony.stark@marvel.com', 200, 2),
+        ]:
+            Activity.objects.create(
+                user_email=email,
+                activity_type='Running',
+                duration=30,
+                calories_burned=calories,
+                date=date.today() - timedelta(days=days_ago),
+            )
+
+    def test_ndjson_export_matches_list(self):
+        response = self.client.get('/api/activities/export/?user=tony.stark@marvel.com')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        exported = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        listed = self.client.get('/api/activities/?user=tony.stark@marvel.com').json()['results']
+        self.assertEqual(exported, listed)
+
+    def test_csv_export(self):
+        response = self.client.get('/api/activities/export/?format=csv&ordering=calories_burned')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['id', 'user_email'])
+        self.assertEqual([row[4] for row in rows[1:]], ['200', '300', '400'])
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_activities', '--user', 'bruce.wayne@dc.com', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['calories_burned'], 400)
+
+
+class AsyncReadTestCase(APITestCase):
+    """Tests that the async read views match the DRF endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        for calories in (100, 200, 300):
+            Activity.objects.create(
+                user_email='tony.stark@marvel.com',
+                activity_type='Running',
+                duration=30,
+                calories_burned=calories,
+                date=date.today(),
+            )
+
+    def test_list_and_retrieve_match(self):
+        async_client = AsyncClient()
+        for name in ('users', 'teams', 'activities', 'leaderboard', 'workouts'):
+            expected = self.client.get(f'/api/{name}/?page_size=2').json()['results']
+            response = async_to_sync(async_client.get)(f'/api/async/{name}/?page_size=2')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['results'], expected, name)
+
+        activity = Activity.objects.first()
+        response = async_to_sync(async_client.get)(f'/api/async/activities/{activity.pk}/')
+        self.assertEqual(response.json(), self.client.get(f'/api/activities/{activity.pk}/').json())
+        missing = async_to_sync(async_client.get)('/api/async/activities/999999/')
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pagination_and_filters(self):
+        async_client = AsyncClient()
+        first = async_to_sync(async_client.get)('/api/async/activities/?ordering=calories_burned&page_size=2').json()
+        self.assertEqual([item['calories_burned'] for item in first['results']], [100, 200])
+        second = async_to_sync(async_client.get)(first['next']).json()
+        self.assertEqual([item['calories_burned'] for item in second['results']], [300])
+        invalid = async_to_sync(async_client.get)('/api/async/activities/?date_from=soon')
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_root(self):
+        response = async_to_sync(AsyncClient().get)('/api/async/')
+        self.assertEqual(set(response.json()), {'users', 'teams', 'activities', 'leaderboard', 'workouts'})
+
+
+class DatabaseDiagnosticsTestCase(APITestCase):
+    """Tests for the database diagnostics endpoint"""
+
+    def test_reports_connection_settings(self):
+        response = self.client.get('/api/diagnostics/db/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['vendor'], connection.vendor)
+        self.assertIn('conn_max_age', response.data)
+        self.assertTrue(response.data['connection_open'])
+
+    def test_pool_counters(self):
+        counters = PoolCounters()
+        for name in ('connections_created', 'connections_created', 'connections_closed', 'checkouts'):
+            counters.increment(name)
+        snapshot = counters.snapshot()
+        self.assertEqual(snapshot['connections_open'], 1)
+        self.assertEqual(snapshot['checked_out'], 1)
+
+
+class RequestMetricsTestCase(APITestCase):
+    """Tests for request instrumentation and the metrics endpoint"""
+
+    def setUp(self):
+        metrics.registry.reset()
+        Activity.objects.create(
+            user_email='tony.stark@marvel.com',
+            activity_type='Running',
+            duration=30,
+            calories_burned=300,
+            date=date.today(),
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/activities/')
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'render;dur=', 'app;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertIn('desc="1 queries"', timing)
+
+    def test_render_time_covers_the_renderer(self):
+        render = renderers.FastJSONRenderer.render
+
+        def slow_render(renderer, *args, **kwargs):
+            time.sleep(0.05)
+            return render(renderer, *args, **kwargs)
+
+        def timings(response):
+            return dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+
+        with mock.patch.object(renderers.FastJSONRenderer, 'render', slow_render):
+            timing = timings(self.client.get('/api/activities/'))
+        self.assertGreaterEqual(float(timing['render']), 50)
+        self.assertLess(float(timing['app']), 50)
+
+    def test_prometheus_histograms(self):
+        self.client.get('/api/activities/')
+        self.client.get('/api/activities/')
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('# TYPE octofit_request_duration_seconds histogram', body)
+        self.assertIn('octofit_requests_total{view="activity-list",method="GET",status="200"} 2', body)
+        self.assertIn('octofit_db_queries_count{view="activity-list",method="GET"} 2', body)
+        self.assertIn('octofit_db_queries_bucket{view="activity-list",method="GET",le="1"} 2', body)
+        self.assertIn('octofit_response_size_bytes_sum{view="activity-list",method="GET"}', body)
+
+
+class BenchmarkTestCase(TestCase):
+    """Tests for the benchmark suite and result comparison"""
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks([200], iterations=2, bulk_batches=1, bulk_batch_size=10)
+        entry = results['scales']['200']
+        self.assertEqual(entry['leaderboard_rebuild']['entries'], 2)
+        self.assertEqual(Activity.objects.count(), entry['activities'] + 10)
+        for prefix in ('users', 'teams', 'activities', 'leaderboard', 'workouts'):
+            self.assertEqual(entry['endpoints'][f'GET /api/{prefix}/']['status_codes'], [200])
+        self.assertIn('p95_ms', entry['endpoints']['GET /api/activities/'])
+        self.assertEqual(entry['bulk_insert']['batch_size'], 10)
+
+    def test_compare_flags_regressions(self):
+        def result(mean_ms, rows_per_second):
+            return {'scales': {'1000': {
+                'bulk_insert': {'rows_per_second': rows_per_second},
+                'endpoints': {'GET /api/users/': {'mean_ms': mean_ms, 'status_codes': [200]}},
+            }}}
+
+        rows = compare_results(result(10.0, 1000.0), result(12.0, 950.0), threshold=0.10)
+        flagged = {(row['name'], row['metric']): row['regression'] for row in rows}
+        self.assertEqual(flagged, {
+            ('GET /api/users/', 'mean_ms'): True,
+            ('bulk_insert', 'rows_per_second'): False,
+        })
+
+    def test_benchmark_profiles(self):
+        results = benchmark_profiles(['full', 'api'], ['/api/', '/admin/'], runs=1, requests=2)
+        full, api = results['profiles']['full'], results['profiles']['api']
+        # admin, auth, contenttypes, sessions, messages and staticfiles
+        self.assertEqual(full['installed_apps'] - api['installed_apps'], 6)
+        self.assertLess(api['middleware'], full['middleware'])
+        self.assertEqual(api['endpoints']['GET /api/']['status_codes'], [200])
+        # No admin in the API-only profile
+        self.assertEqual(full['endpoints']['GET /admin/']['status_codes'], [302])
+        self.assertEqual(api['endpoints']['GET /admin/']['status_codes'], [404])
+        self.assertGreater(api['serving_ms'], api['ready_ms'])
+
+
+class FastRendererTestCase(TestCase):
+    """Tests that the fast JSON encoder matches DRF's JSONRenderer"""
+
+    data = {
+        'results': [{'id': '1', 'date': date(2026, 1, 31), 'score': Decimal('1.50'), 'name': 'Zo\u00eb \u2028'}],
+        'next': None,
+    }
+
+    def test_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.dumps(self.data), expected)
+
+    def test_indented_output(self):
+        content = renderers.FastJSONRenderer().render(self.data, 'application/json; indent=2')
+        self.assertIn(b'\n  ', content)
+
+
+class CompressionTestCase(APITestCase):
+    """Tests for negotiated response compression"""
+
+    def setUp(self):
+        cache.clear()
+        for day in range(1, 31):
+            Activity.objects.create(
+                user_email='thor.odinson@marvel.com',
+                activity_type='Boxing',
+                duration=60,
+                calories_burned=700,
+                date=date(2026, 1, day),
+            )
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br', ['gzip', 'deflate']), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, deflate', ['gzip', 'deflate']), 'deflate')
+        self.assertEqual(negotiate_encoding('*;q=0.1', ['gzip', 'deflate']), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0, br', ['gzip', 'deflate']))
+        self.assertIsNone(negotiate_encoding('', ['gzip', 'deflate']))
+
+    def test_gzip_and_deflate(self):
+        plain = self.client.get('/api/activities/')
+        self.assertNotIn('Content-Encoding', plain)
+
+        response = self.client.get('/api/activities/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        response = self.client.get('/api/activities/', HTTP_ACCEPT_ENCODING='deflate')
+        self.assertEqual(response['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.content), plain.content)
+
+    @override_settings(REST_FRAMEWORK={'COMPRESSION_MIN_LENGTH': 1_000_000})
+    def test_below_threshold(self):
+        response = self.client.get('/api/activities/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_cached_response_etag(self):
+        Workout.objects.create(
+            name='Bat HIIT Training',
+            description='High-intensity interval training for peak performance. ' * 40,
+            difficulty='Advanced',
+            duration=35,
+            calories_estimate=400,
+            category='HIIT',
+        )
+        first = self.client.get('/api/workouts/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        plain = self.client.get('/api/workouts/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+        revalidated = self.client.get('/api/workouts/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_streaming_export(self):
+        plain = b''.join(self.client.get('/api/activities/export/').streaming_content)
+        response = self.client.get('/api/activities/export/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+
+class WorkoutRecommendationTestCase(APITestCase):
+    """Tests for personalized workout recommendations"""
+
+    def setUp(self):
+        cache.clear()
+        workouts = [
+            ('Morning Run', 'Beginner', 30, 250, 'Cardio'),
+            ('Interval Sprints', 'Advanced', 25, 400, 'HIIT'),
+            ('Heavy Lifting', 'Advanced', 60, 450, 'Strength'),
+            ('Gentle Stretch', 'Beginner', 20, 80, 'Flexibility'),
+        ]
+        for name, difficulty, duration, calories, category in workouts:
+            Workout.objects.create(
+                name=name, description=name, difficulty=difficulty, duration=duration,
+                calories_estimate=calories, category=category,
+            )
+
+    def log(self, activity_type, duration, calories):
+        Activity.objects.create(
+            user_email='thor.odinson@marvel.com', activity_type=activity_type, duration=duration,
+            calories_burned=calories, date=date.today(),
+        )
+
+    def recommended(self, **params):
+        response = self.client.get('/api/workouts/recommended/', dict({'user': 'thor.odinson@marvel.com'}, **params))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [workout['name'] for workout in response.data]
+
+    def test_follows_recent_activity(self):
+        self.log('Running', 30, 260)
+        self.assertEqual(self.recommended(limit=1), ['Morning Run'])
+        for _ in range(5):
+            self.log('Weightlifting', 60, 500)
+        self.assertEqual(self.recommended(limit=1), ['Heavy Lifting'])
+
+    def test_response_shape(self):
+        response = self.client.get('/api/workouts/recommended/', {'user': 'thor.odinson@marvel.com'})
+        self.assertEqual(len(response.data), 4)
+        workout = response.data[0]
+        self.assertEqual(set(workout), {
+            'id', 'name', 'description', 'difficulty', 'duration', 'calories_estimate', 'category', 'created_at',
+            'updated_at', 'score',
+        })
+        scores = [workout['score'] for workout in response.data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_pure_python_scores_match(self):
+        for _ in range(3):
+            self.log('Boxing', 40, 450)
+        expected = self.recommended()
+        cache.clear()
+        with mock.patch.object(recommendations, '_numpy', None), mock.patch.object(recommendations, '_catalog', None):
+            self.assertEqual(self.recommended(), expected)
+
+    def test_new_workouts_are_scored(self):
+        self.log('CrossFit', 30, 350)
+        self.assertEqual(self.recommended(limit=1), ['Interval Sprints'])
+        Workout.objects.create(
+            name='CrossFit WOD', description='', difficulty='Intermediate', duration=30,
+            calories_estimate=350, category='HIIT',
+        )
+        self.assertEqual(self.recommended(limit=1), ['CrossFit WOD'])
+
+    def test_follows_changes_from_other_processes(self):
+        self.log('CrossFit', 30, 350)
+        self.assertEqual(self.recommended(limit=1), ['Interval Sprints'])
+        # Written without signals, as another process's cache invalidation never reaches this one
+        Workout.objects.filter(name='Morning Run').update(
+            category='HIIT', difficulty='Advanced', duration=30, calories_estimate=350, updated_at=timezone.now(),
+        )
+        self.assertEqual(self.recommended(limit=1), ['Morning Run'])
+
+    def test_invalid_parameters(self):
+        response = self.client.get('/api/workouts/recommended/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user', response.data)
+        response = self.client.get('/api/workouts/recommended/', {'user': 'thor.odinson@marvel.com', 'limit': 0})
+        self.assertIn('limit', response.data)
+
+
+@override_settings(OCTOFIT_INGESTION={'MODE': 'buffered'})
+class BufferedIngestionTestCase(APITestCase):
+    """Tests for write-behind activity ingestion"""
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.buffer = ingestion.WriteBehindBuffer(
+            capacity=2, batch_size=10, flush_interval=0, submit_timeout=0, spill_dir=self.spill_dir, background=False,
+        )
+        patcher = mock.patch.object(ingestion, '_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, calories=300):
+        return self.client.post('/api/activities/', {
+            'user_email': 'thor.odinson@marvel.com',
+            'activity_type': 'Boxing',
+            'duration': 30,
+            'calories_burned': calories,
+            'date': '2026-01-31',
+        })
+
+    def spill_files(self):
+        return [name for name in os.listdir(self.spill_dir) if name.endswith('.ndjson')]
+
+    def test_accepted_then_flushed(self):
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['calories_burned'], 300)
+        self.assertFalse(Activity.objects.exists())
+
+        self.buffer.flush()
+        self.assertEqual(Activity.objects.get().calories_burned, 300)
+        self.assertEqual(Leaderboard.objects.get().total_calories, 300)
+        self.assertEqual(ActivityRollup.objects.get().total_calories, 300)
+        self.assertEqual(self.buffer.stats()['written'], 1)
+
+    def test_validation_and_backpressure(self):
+        response = self.client.post('/api/activities/', {'user_email': 'not-an-email'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.post()
+        self.post()
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.buffer.stats()['rejected'], 1)
+
+    def test_failed_write_spills_and_replays(self):
+        self.post(100)
+        self.post(200)
+        with mock.patch.object(Activity.objects, 'bulk_create', side_effect=DatabaseError('down')), \
+                self.assertLogs('octofit_tracker.ingestion', 'ERROR'):
+            self.buffer.flush()
+        self.assertFalse(Activity.objects.exists())
+        self.assertEqual(len(self.spill_files()), 1)
+
+        self.assertEqual(self.buffer.replay_spill(), 2)
+        self.assertEqual(sorted(Activity.objects.values_list('calories_burned', flat=True)), [100, 200])
+        self.assertEqual(self.spill_files(), [])
+
+    @skipIf(ingestion.fcntl is None, 'in-flight journals need fcntl')
+    def test_in_flight_batch_of_a_dead_process_is_replayed(self):
+        batch = [ActivitySerializer().run_validation({
+            'user_email': 'thor.odinson@marvel.com', 'activity_type': 'Boxing', 'duration': 30,
+            'calories_burned': calories, 'date': '2026-01-31',
+        }) for calories in (100, 200)]
+        other = ingestion.WriteBehindBuffer(10, 10, 0, 0, self.spill_dir, background=False)
+        other.journal(batch)
+        # The journal of a live process is left alone
+        self.assertEqual(self.buffer.replay_spill(), 0)
+        self.assertFalse(Activity.objects.exists())
+
+        # The process dies before the batch commits, releasing the lock
+        other._journal.close()
+        self.assertEqual(self.buffer.replay_spill(), 2)
+        self.assertEqual(sorted(Activity.objects.values_list('calories_burned', flat=True)), [100, 200])
+        self.assertEqual(self.spill_files(), [])
+        # Only this process's own, empty journal is left
+        journals = os.listdir(os.path.join(self.spill_dir, 'inflight'))
+        self.assertEqual(journals, [os.path.basename(self.buffer._journal.name)])
+
+    def test_committed_batches_leave_an_empty_journal(self):
+        self.post(100)
+        self.buffer.flush()
+        journals = os.path.join(self.spill_dir, 'inflight')
+        self.assertEqual([os.path.getsize(os.path.join(journals, name)) for name in os.listdir(journals)], [0])
+        self.buffer.stop()
+        self.assertEqual(os.listdir(journals), [])
+
+    def test_started_with_the_application(self):
+        with mock.patch.object(self.buffer, 'background', True), mock.patch.object(self.buffer, 'start') as start:
+            with override_settings(OCTOFIT_INGESTION={'MODE': 'buffered'}):
+                ingestion.start()
+            start.assert_called_once_with()
+            with override_settings(OCTOFIT_INGESTION={'MODE': 'sync'}):
+                ingestion.start()
+            start.assert_called_once_with()
+
+    def test_counters_are_thread_safe(self):
+        buffer = ingestion.WriteBehindBuffer(10000, 10, 0, 0, None, background=False)
+        threads = [threading.Thread(target=lambda: [buffer.submit({}) for _ in range(500)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(buffer.stats()['accepted'], 4000)
+
+    @override_settings(OCTOFIT_INGESTION={'MODE': 'sync'})
+    def test_sync_mode(self):
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Activity.objects.exists())
+
+
+class LargeTableAdminTestCase(TestCase):
+    """Tests for the admin changelists of large tables"""
+
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_superuser('support', 'support@octofit.test', 'support123')
+        self.client.login(username='support', password='support123')
+        for number, activity_type in enumerate(['Running', 'Running', 'Yoga']):
+            Activity.objects.create(
+                user_email=f'user{number}@octofit.test', activity_type=activity_type, duration=30,
+                calories_burned=100, date=date(2026, 1, 31),
+            )
+
+    def test_paginator_counts(self):
+        paginator = EstimatedCountPaginator(Activity.objects.all(), 2)
+        self.assertEqual(paginator.count, 3)
+        Activity.objects.all().delete()
+        # Unfiltered counts are cached
+        self.assertEqual(EstimatedCountPaginator(Activity.objects.all(), 2).count, 3)
+
+        with mock.patch.object(EstimatedCountPaginator, 'max_count', 2):
+            Activity.objects.bulk_create([
+                Activity(user_email='thor.odinson@marvel.com', activity_type='Boxing', duration=30,
+                         calories_burned=100, date=date(2026, 1, 31))
+                for _ in range(5)
+            ])
+            paginator = EstimatedCountPaginator(Activity.objects.filter(activity_type='Boxing'), 1)
+            self.assertEqual(paginator.count, 2)
+            self.assertTrue(paginator.count_is_estimate)
+        paginator = EstimatedCountPaginator(Activity.objects.filter(activity_type='Boxing'), 1)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def test_changelist_skips_full_count(self):
+        url = reverse('admin:octofit_tracker_activity_changelist')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Session, user, capped count and the page itself
+        with self.assertNumQueries(4) as queries:
+            response = self.client.get(url, {'q': 'user1@'})
+        self.assertContains(response, 'user1@octofit.test')
+        self.assertNotContains(response, 'user2@octofit.test')
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('LIMIT 10000', sql)
+        self.assertNotIn("LIKE '%", sql)
+
+    def test_capped_count_is_flagged(self):
+        url = reverse('admin:octofit_tracker_activity_changelist')
+        with mock.patch.object(EstimatedCountPaginator, 'max_count', 2):
+            self.assertContains(self.client.get(url, {'q': 'Running'}), 'At least 2 results match')
+            self.assertNotContains(self.client.get(url, {'q': 'Yoga'}), 'results match')
+
+    def test_leaderboard_search_uses_case_sensitive_prefix(self):
+        Leaderboard.objects.create(user_email='thor.odinson@marvel.com', username='Thor', total_calories=100)
+        response = self.client.get(reverse('admin:octofit_tracker_leaderboard_changelist'), {'q': 'Tho'})
+        self.assertContains(response, '<td class="field-username">Thor</td>', html=True)
+        # SQLite's LIKE ignores case either way, so check the lookups themselves
+        nodes, lookups = [response.context['cl'].queryset.query.where], []
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(getattr(node, 'children', []))
+            lookups.append(getattr(node, 'lookup_name', None))
+        self.assertIn('startswith', lookups)
+        self.assertNotIn('istartswith', lookups)
+
+    def test_facet_filter_counts(self):
+        rollups.rebuild()
+        url = reverse('admin:octofit_tracker_activity_changelist')
+        response = self.client.get(url)
+        self.assertContains(response, 'Running (2)')
+        self.assertContains(response, 'Yoga (1)')
+        response = self.client.get(url, {'activity_type': 'Yoga'})
+        self.assertContains(response, 'user2@octofit.test')
+        self.assertNotContains(response, 'user0@octofit.test')
+
+    def test_leaderboard_and_user_changelists(self):
+        User.objects.create(username='Thor', email='thor.odinson@marvel.com', password='x', team='Team Marvel')
+        for name in ('leaderboard', 'user'):
+            response = self.client.get(reverse(f'admin:octofit_tracker_{name}_changelist'), {'q': 'T'})
+            self.assertEqual(response.status_code, 200)
+
+
+class SearchTestCase(APITestCase):
+    """Tests for ?q= search over the in-memory inverted index"""
+
+    def setUp(self):
+        cache.clear()
+        for index in indexes.values():
+            index.reset()
+        workouts = [
+            ('Bat HIIT Training', 'High-intensity interval training for peak performance', 'HIIT'),
+            ('Super Strength', 'Heavy lifting with some interval finishers', 'Strength'),
+            ('Hero Yoga', 'Stretching and balance', 'Flexibility'),
+        ]
+        for name, description, category in workouts:
+            Workout.objects.create(
+                name=name, description=description, difficulty='Intermediate', duration=30,
+                calories_estimate=300, category=category,
+            )
+        User.objects.create(username='Thor', email='thor.odinson@marvel.com', password='x', team='Team Marvel')
+        User.objects.create(username='Batman', email='bruce.wayne@dc.com', password='x', team='Team DC')
+
+    def names(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key = 'name' if 'workouts' in path else 'username'
+        return [item[key] for item in response.data['results']]
+
+    def test_inverted_index(self):
+        index = InvertedIndex({'name': 2.0, 'description': 1.0})
+        index.add(1, {'name': 'Morning Run', 'description': 'easy running'})
+        index.add(2, {'name': 'Running Drills', 'description': None})
+        # Exact matches outrank prefix matches
+        self.assertEqual([doc for doc, _ in index.search('run')], [1, 2])
+        self.assertEqual([doc for doc, _ in index.search('MORNING ru')], [1])
+        self.assertEqual(index.search('swim'), [])
+        index.add(1, {'name': 'Evening Swim'})
+        self.assertEqual([doc for doc, _ in index.search('run')], [2])
+        index.remove(2)
+        self.assertEqual(index.search('running'), [])
+        self.assertEqual(index.terms, ['evening', 'swim'])
+
+    def test_ranked_workout_search(self):
+        self.assertEqual(self.names('/api/workouts/', q='interval'), ['Bat HIIT Training', 'Super Strength'])
+        self.assertEqual(self.names('/api/workouts/', q='hiit'), ['Bat HIIT Training'])
+        self.assertEqual(self.names('/api/workouts/', q='str'), ['Super Strength', 'Hero Yoga'])
+        self.assertEqual(self.names('/api/workouts/', q='interval', ordering='-name'), ['Super Strength', 'Bat HIIT Training'])
+        self.assertEqual(self.names('/api/workouts/', q='zumba'), [])
+
+    def test_ordering(self):
+        self.assertEqual(self.names('/api/users/', ordering='username'), ['Batman', 'Thor'])
+        self.assertEqual(self.names('/api/users/', ordering='-username'), ['Thor', 'Batman'])
+        self.assertEqual(self.names('/api/workouts/', ordering='name', q='str'), ['Hero Yoga', 'Super Strength'])
+        self.assertEqual(
+            self.names('/api/workouts/', ordering='category', page_size=2),
+            ['Hero Yoga', 'Bat HIIT Training'],
+        )
+
+    def test_async_search(self):
+        async_client = AsyncClient()
+        for path, params in [
+            ('workouts', {'q': 'str'}),
+            ('workouts', {'q': 'interval', 'ordering': '-name'}),
+            ('users', {'q': 'team', 'page_size': 1}),
+        ]:
+            expected = self.client.get(f'/api/{path}/', params).json()
+            response = async_to_sync(async_client.get)(f'/api/async/{path}/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['results'], expected['results'], params)
+        response = async_to_sync(async_client.get)('/api/async/workouts/', {'q': 'zumba'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_tampered_search_cursor(self):
+        for position in (['high', 1], [None, 1], [{'a': 1}, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+            with self.subTest(position=position):
+                response = self.client.get('/api/workouts/', {'q': 'str', 'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    def test_rebuild_does_not_block_searches(self):
+        index = indexes[Workout]
+        self.assertEqual(self.names('/api/workouts/', q='yoga'), ['Hero Yoga'])
+        # Built here, since the rebuild thread's connection cannot see the test transaction
+        rebuilt, building = index.build(), threading.Event()
+
+        def slow_build():
+            building.wait(5)
+            return rebuilt
+
+        index._built_at -= search.REBUILD_INTERVAL + 1
+        with mock.patch.object(index, 'build', slow_build):
+            # Served from the current index while the rebuild waits
+            self.assertEqual(self.names('/api/workouts/', q='hero'), ['Hero Yoga'])
+            self.assertIsNotNone(index._rebuild_thread)
+            Workout.objects.create(
+                name='Power Yoga', description='', difficulty='Advanced', duration=45,
+                calories_estimate=350, category='Flexibility',
+            )
+            building.set()
+            index._rebuild_thread.join(5)
+        # Saves made during the rebuild are applied to the new index
+        self.assertEqual(sorted(self.names('/api/workouts/', q='yoga')), ['Hero Yoga', 'Power Yoga'])
+        self.assertIsNone(index._pending)
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.names('/api/workouts/', q='yoga'), ['Hero Yoga'])
+        Workout.objects.create(
+            name='Power Yoga', description='', difficulty='Advanced', duration=45,
+            calories_estimate=350, category='Flexibility',
+        )
+        Workout.objects.get(name='Hero Yoga').delete()
+        self.assertEqual(self.names('/api/workouts/', q='yoga'), ['Power Yoga'])
+
+        user = User.objects.get(username='Batman')
+        user.team = 'Team Marvel'
+        user.save()
+        self.assertEqual(sorted(self.names('/api/users/', q='marvel')), ['Batman', 'Thor'])
+
+    def test_search_pagination_and_fields(self):
+        response = self.client.get('/api/workouts/', {'q': 'str', 'page_size': 1, 'fields': 'name'})
+        self.assertEqual(response.data['results'], [{'name': 'Super Strength'}])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'name': 'Hero Yoga'}])
+
+    def test_admin_search(self):
+        get_user_model().objects.create_superuser('support', 'support@octofit.test', 'support123')
+        self.client.login(username='support', password='support123')
+        response = self.client.get(reverse('admin:octofit_tracker_workout_changelist'), {'q': 'peak'})
+        self.assertContains(response, 'Bat HIIT Training')
+        self.assertNotContains(response, 'Hero Yoga')
+        response = self.client.get(reverse('admin:octofit_tracker_user_changelist'), {'q': 'bruce.w'})
+        self.assertContains(response, 'Batman')
+        self.assertNotContains(response, 'Thor')
+
+
+class PercentileStatsTestCase(APITestCase):
+    """Tests for the quantile sketches and the percentiles endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='Iron Man', email='tony.stark@marvel.com', password='x', team='Team Marvel')
+        User.objects.create(username='Batman', email='bruce.wayne@dc.com', password='x', team='Team DC')
+        for number in range(1, 101):
+            Activity.objects.create(
+                user_email='tony.stark@marvel.com' if number % 2 else 'bruce.wayne@dc.com',
+                activity_type='Running' if number <= 80 else 'Cycling',
+                duration=number, calories_burned=10 * number, date=date(2026, 10, 5),
+            )
+
+    def get(self, query=''):
+        response = self.client.get(f'/api/stats/percentiles/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sketch_accuracy_merge_and_encoding(self):
+        values = [value ** 2 % 9973 + 1 for value in range(5000)]
+        first, second = QuantileSketch(), QuantileSketch()
+        for value in values:
+            (first if value % 3 else second).add(value)
+        merged = QuantileSketch.from_bytes(first.to_bytes()).merge(QuantileSketch.from_bytes(second.to_bytes()))
+        ordered = sorted(values)
+        for q in (0.0, 0.25, 0.5, 0.9, 0.99, 1.0):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertLessEqual(abs(merged.quantile(q) - exact), exact * RELATIVE_ACCURACY)
+        for value in values:
+            merged.add(value, -1)
+        self.assertEqual(merged.count, 0)
+        self.assertIsNone(merged.quantile(0.5))
+
+    def test_percentiles_by_activity_type_and_team(self):
+        # Merged version and pending delta ids, then the merged sketches and the deltas
+        with self.assertNumQueries(4):
+            data = self.get()
+        self.assertEqual(data['relative_error'], RELATIVE_ACCURACY)
+        running = next(result for result in data['results'] if result['activity_type'] == 'Running')
+        self.assertEqual(running['activities'], 80)
+        self.assertAlmostEqual(running['duration']['p50'], 40, delta=40 * RELATIVE_ACCURACY)
+        self.assertAlmostEqual(running['calories_burned']['p99'], 790, delta=790 * RELATIVE_ACCURACY)
+        # Nothing changed: only the version and the delta ids are checked
+        with self.assertNumQueries(2):
+            self.get('by=team')
+
+        [result] = self.get('by=team&team=Team DC&quantiles=0,1')['results']
+        self.assertEqual((result['team'], result['activities']), ('Team DC', 50))
+        for metric, expected in (('duration', {'p0': 2, 'p100': 100}), ('calories_burned', {'p0': 20, 'p100': 1000})):
+            self.assertEqual(result[metric].keys(), expected.keys())
+            for name, value in expected.items():
+                self.assertAlmostEqual(result[metric][name], value, delta=value * RELATIVE_ACCURACY)
+        overall = self.get('by=all&quantiles=0.5')['results']
+        self.assertEqual(overall[0]['activities'], 100)
+        self.assertAlmostEqual(overall[0]['duration']['p50'], 50, delta=50 * RELATIVE_ACCURACY)
+
+    def test_updates_and_deletes(self):
+        Activity.objects.filter(activity_type='Cycling').first().delete()
+        activity = Activity.objects.filter(activity_type='Cycling').first()
+        activity.activity_type = 'Yoga'
+        activity.save()
+        data = self.get('activity_type=Cycling&activity_type=Yoga')
+        self.assertEqual(
+            [(result['activity_type'], result['activities']) for result in data['results']],
+            [('Cycling', 18), ('Yoga', 1)],
+        )
+        Activity.objects.filter(activity_type='Yoga').get().delete()
+        pending = ActivitySketchDelta.objects.count()
+        self.assertEqual(sketches.merge_deltas(), pending)
+        # Added and removed before the merge, so never stored
+        self.assertFalse(ActivitySketch.objects.filter(key='Yoga').exists())
+        self.assertEqual(ActivitySketch.objects.get(key='Cycling').activity_count, 18)
+        Activity.objects.filter(activity_type='Cycling').delete()
+        sketches.merge_deltas()
+        # Emptied sketches are kept, with no activities, and not listed
+        self.assertEqual(ActivitySketch.objects.get(key='Cycling').activity_count, 0)
+        self.assertEqual([result['activity_type'] for result in self.get()['results']], ['Running'])
+
+    def test_writes_add_deltas_without_locking_sketches(self):
+        sketches.merge_deltas()
+        self.assertFalse(ActivitySketchDelta.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            Activity.objects.create(
+                user_email='tony.stark@marvel.com', activity_type='Running', duration=200,
+                calories_burned=2000, date=date(2026, 10, 6),
+            )
+        self.assertNotIn('"activity_sketches"', ' '.join(query['sql'] for query in queries.captured_queries))
+        self.assertEqual(ActivitySketchDelta.objects.count(), 2)
+
+        # Reads include the pending deltas, and merging them changes nothing
+        pending = self.get('by=team&quantiles=0.1,0.5,1')
+        self.assertEqual(pending['results'][1]['activities'], 51)
+        self.assertAlmostEqual(pending['results'][1]['duration']['p100'], 200, delta=200 * RELATIVE_ACCURACY)
+        self.assertEqual(sketches.merge_deltas(), 2)
+        self.assertEqual(self.get('by=team&quantiles=0.1,0.5,1'), pending)
+        self.assertEqual(ActivitySketch.objects.get(key='Team Marvel').activity_count, 51)
+
+    def test_reads_follow_other_processes(self):
+        self.assertEqual(self.get('by=all')['results'][0]['activities'], 100)
+        # A store of its own stands in for another worker process, which shares only the database
+        other = SketchStore()
+        other.record([('bruce.wayne@dc.com', 'Yoga', date(2026, 10, 6), 20, 80)] * 5)
+        self.assertEqual(self.get('by=all')['results'][0]['activities'], 105)
+        other.record([('bruce.wayne@dc.com', 'Yoga', date(2026, 10, 6), 20, 80)], sign=-1)
+        # The version, the delta ids and only the new delta
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get('by=all')['results'][0]['activities'], 104)
+        other.merge_deltas()
+        self.assertEqual(self.get('by=all')['results'][0]['activities'], 104)
+        other.rebuild()
+        self.assertEqual(self.get('by=all')['results'][0]['activities'], 100)
+
+    def test_deltas_are_merged_after_the_write_commits(self):
+        sketches._merged_at = 0.0
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user_email='bruce.wayne@dc.com', activity_type='Yoga', duration=20,
+                calories_burned=80, date=date(2026, 10, 6),
+            )
+        self.assertFalse(ActivitySketchDelta.objects.exists())
+        self.assertEqual(ActivitySketch.objects.get(key='Yoga').activity_count, 1)
+        self.assertEqual(ActivitySketch.objects.get(key='Team DC').activity_count, 51)
+
+    def test_backfill_matches_incremental(self):
+        incremental = self.get('by=team&quantiles=0.1,0.5,0.9')
+        call_command('backfill_rollups', stdout=StringIO())
+        self.assertEqual(self.get('by=team&quantiles=0.1,0.5,0.9'), incremental)
+
+    def test_invalid_parameters(self):
+        for query in ('by=user', 'quantiles=2', 'quantiles=p50'):
+            response = self.client.get(f'/api/stats/percentiles/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivitySnapshotTestCase(TestCase):
+    """Tests for the columnar activity snapshot format and commands"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'activities.snap')
+        for number in range(300):
+            Activity.objects.create(
+                user_email=f'user{number % 7}@octofit.test', activity_type=('Running', 'Yoga', 'Cycling')[number % 3],
+                duration=number, calories_burned=10 * number, date=date(2026, 1, 1) + timedelta(days=number),
+            )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        header = write_snapshot(self.path, chunk_size=64)
+        self.assertEqual(header['rows'], 300)
+        self.assertEqual(header['columns']['activity_type']['dtype'], '<u1')
+        expected = list(Activity.objects.order_by('pk').values_list(
+            'id', 'user_email', 'activity_type', 'date', 'duration', 'calories_burned',
+        ))
+        with Snapshot(self.path) as snapshot:
+            for column in snapshot.columns.values():
+                self.assertEqual(column['offset'] % snapshots.ALIGNMENT, 0)
+            rows = list(zip(
+                snapshot['id'].tolist(),
+                snapshot.decode('user_email', snapshot['user_email']),
+                snapshot.decode('activity_type', snapshot['activity_type']),
+                snapshot.dates().tolist(),
+                snapshot['duration'].tolist(),
+                snapshot['calories_burned'].tolist(),
+            ))
+            # Zero-copy views of the mapped file
+            self.assertFalse(snapshot['duration'].flags.owndata)
+            self.assertFalse(snapshot['duration'].flags.writeable)
+        self.assertEqual(rows, expected)
+
+    def test_without_numpy_and_filters(self):
+        call_command('snapshot_activities', self.path, '--activity-type', 'Yoga', stdout=StringIO())
+        with mock.patch.object(snapshots, 'numpy', None), Snapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 100)
+            self.assertIsInstance(snapshot['duration'], memoryview)
+            self.assertEqual(set(snapshot.decode('activity_type', snapshot['activity_type'])), {'Yoga'})
+            self.assertEqual(sum(snapshot['calories_burned']), 10 * sum(range(1, 300, 3)))
+            self.assertEqual(snapshot.dates()[0], date(2026, 1, 2))
+
+    def test_load_snapshot_command(self):
+        call_command('snapshot_activities', self.path, stdout=StringIO())
+        out = StringIO()
+        call_command('load_snapshot', self.path, '--limit', '1', stdout=out)
+        output = out.getvalue()
+        self.assertIn('300 activities', output)
+        self.assertIn('Dates: 2026-01-01 to 2026-10-27', output)
+        self.assertRegex(output, r'Cycling\s+100\s+15050\s+150500')
+        self.assertNotIn('Yoga ', output)
+
+        with open(self.path, 'r+b') as snapshot_file:
+            snapshot_file.write(b'NOTASNAP')
+        with self.assertRaisesMessage(CommandError, 'is not an activity snapshot'):
+            call_command('load_snapshot', self.path, stdout=StringIO())
+
+
+class RebuildLeaderboardTestCase(TestCase):
+    """Tests for the sharded leaderboard rebuild"""
+
+    def setUp(self):
+        with engine.suspended():
+            for number, calories in enumerate([500, 300, 300, 900, 100, 700]):
+                User.objects.create(
+                    username=f'Hero {number}', email=f'hero{number}@octofit.test', password='x', team=f'Team {number % 2}',
+                )
+                Activity.objects.create(
+                    user_email=f'hero{number}@octofit.test', activity_type='Running', duration=30,
+                    calories_burned=calories, date=date(2026, 10, 5),
+                )
+            # Activities of a user without a profile still count
+            Activity.objects.create(
+                user_email='ghost@octofit.test', activity_type='Yoga', duration=30, calories_burned=300,
+                date=date(2026, 10, 5),
+            )
+
+    def board(self):
+        return list(Leaderboard.objects.order_by('rank', 'user_email').values_list(
+            'user_email', 'username', 'total_calories', 'rank',
+        ))
+
+    def test_shard_bounds_cover_all_users(self):
+        bounds = shard_bounds(3)
+        self.assertEqual(len(bounds), 3)
+        self.assertEqual((bounds[0][0], bounds[-1][1]), (None, None))
+        for (_, high), (low, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(high, low)
+        self.assertEqual(shard_bounds(50), shard_bounds(6))
+        rows = aggregation.user_totals(email_range=bounds[1])
+        self.assertEqual([row['user_email'] for row in rows], ['hero3@octofit.test', 'hero2@octofit.test'])
+
+    def test_rebuild_ranks_in_one_pass(self):
+        out, err = StringIO(), StringIO()
+        call_command('rebuild_leaderboard', '--workers', '1', '--shards', '3', stdout=out, stderr=err)
+        self.assertIn('7 entries (7 created, 0 updated, 0 deleted, 0 unchanged)', out.getvalue())
+        # Tests run with the local-memory cache
+        self.assertIn('Set OCTOFIT_CACHE_DIR', err.getvalue())
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}):
+            err = StringIO()
+            call_command('rebuild_leaderboard', '--workers', '1', stdout=StringIO(), stderr=err)
+            self.assertEqual(err.getvalue(), '')
+        self.assertEqual(self.board(), [
+            ('hero3@octofit.test', 'Hero 3', 900, 1),
+            ('hero5@octofit.test', 'Hero 5', 700, 2),
+            ('hero0@octofit.test', 'Hero 0', 500, 3),
+            ('ghost@octofit.test', 'ghost@octofit.test', 300, 4),
+            ('hero1@octofit.test', 'Hero 1', 300, 4),
+            ('hero2@octofit.test', 'Hero 2', 300, 4),
+            ('hero4@octofit.test', 'Hero 4', 100, 7),
+        ])
+
+    def test_only_changed_entries_are_written(self):
+        engine.rebuild()
+        ids = dict(Leaderboard.objects.values_list('user_email', 'id'))
+        Leaderboard.objects.filter(user_email='hero4@octofit.test').update(total_calories=5000, rank=1)
+        Leaderboard.objects.create(user_email='gone@octofit.test', username='Gone', team='', total_calories=50)
+        Leaderboard.objects.create(user_email='left@octofit.test', username='Left', team='', total_calories=1)
+
+        with self.assertNumQueries(8):
+            # Users, totals, then in a savepoint: the current board, one bulk update, and the stale rows
+            # loaded (for the delete signals) and deleted
+            counts = engine.rebuild_sharded(shards=1)
+        self.assertEqual(
+            {key: counts[key] for key in ('entries', 'created', 'updated', 'deleted', 'unchanged')},
+            {'entries': 7, 'created': 0, 'updated': 1, 'deleted': 2, 'unchanged': 6},
+        )
+        # Existing rows keep their ids
+        self.assertEqual(dict(Leaderboard.objects.values_list('user_email', 'id')), ids)
+        self.assertEqual(Leaderboard.objects.get(user_email='hero4@octofit.test').rank, 7)
@@ -14,11 +14,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 import os
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 from django.views.generic.base import RedirectView
 from rest_framework import routers
-from octofit_tracker import views
+from octofit_tracker import async_views, metrics, views
 from octofit_tracker.views import api_root
 
 codespace_name = os.environ.get('CODESPACE_NAME')
@@ -35,8 +35,20 @@ router.register(r'leaderboard', views.LeaderboardViewSet)
 router.register(r'workouts', views.WorkoutViewSet)
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', RedirectView.as_view(url='/api/', permanent=False)),
     path('api/', api_root, name='api-root'),
+    path('api/stats/', views.StatsView.as_view(), name='stats'),
+    path('api/stats/percentiles/', views.PercentileStatsView.as_view(), name='stats-percentiles'),
+    path('api/diagnostics/db/', views.database_diagnostics, name='database-diagnostics'),
+    path('api/metrics/', metrics.metrics_view, name='metrics'),
+    path('api/async/', async_views.api_root, name='async-root'),
+    path('api/async/<str:resource>/', async_views.AsyncReadView.as_view(), name='async-list'),
+    path('api/async/<str:resource>/<str:pk>/', async_views.AsyncReadView.as_view(), name='async-detail'),
     path('api/', include(router.urls)),
 ]
+
+# Not installed in the API-only profile (OCTOFIT_PROFILE=api)
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -1,10 +1,33 @@
 import os
-from rest_framework import viewsets
-from rest_framework.decorators import api_view
+from collections import namedtuple
+from django.db import models, transaction
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from .models import User, Team, Activity, Leaderboard, Workout
-from .serializers import UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer
+from rest_framework.views import APIView
+from . import ingestion, search
+from .aggregation import team_totals
+from .caching import CachedResponseMixin
+from .db_monitoring import pool_stats
+from .exports import EXPORT_FORMATS
+from .filters import QueryParamFilterBackend, get_requested_fields, get_requested_ordering
+from .leaderboard import WINDOWS, window_bounds, window_leaderboard
+from .models import User, Team, Activity, ActivityRollup, Leaderboard, UserPeriodTotal, Workout
+from .parsers import NDJSONParser
+from .recommendations import recommend
+from .renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from .rollups import PERIODS, fold_series
+from .serializers import (
+    UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer, get_read_plan,
+)
+from .signals import record_bulk_created
+from .sketches import DIMENSIONS, RELATIVE_ACCURACY, QuantileSketch, percentiles, sketches
 
 
 @api_view(['GET'])
@@ -23,44 +46,396 @@ def api_root(request, format=None):
         'activities': reverse('activity-list', request=request, format=format),
         'leaderboard': reverse('leaderboard-list', request=request, format=format),
         'workouts': reverse('workout-list', request=request, format=format),
+        'stats': reverse('stats', request=request, format=format),
+        'percentiles': reverse('stats-percentiles', request=request, format=format),
     })
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class FastReadMixin:
+    """
+    Serve list and retrieve from ``values_list()`` rows through a precompiled
+    ``ReadPlan`` instead of model instances and ``ModelSerializer``.
+
+    The output is identical to the view's serializer, trimmed to the sparse
+    fieldset requested with ``?fields=``/``?exclude=``. Only the columns of
+    that fieldset (plus the pagination ordering key) are read from the
+    database. Object-level permissions are not checked on this path, since
+    no model instance is loaded.
+    """
+
+    def get_read_plan(self):
+        serializer_class = self.get_serializer_class()
+        available = get_read_plan(serializer_class).keys
+        return get_read_plan(serializer_class, get_requested_fields(self.request, available))
+
+    def get_read_columns(self, plan, queryset):
+        """Return the plan's columns followed by any ordering columns the paginator needs."""
+        columns = list(plan.columns)
+        if self.paginator is not None:
+            for name in self.paginator.get_ordering(self.request, queryset, self):
+                if name.lstrip('-') not in columns:
+                    columns.append(name.lstrip('-'))
+        return columns
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_read_plan()
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.values_list(*self.get_read_columns(plan, queryset), named=True)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([plan.to_representation(row) for row in page])
+        return Response([plan.to_representation(row) for row in queryset])
+
+    def retrieve(self, request, *args, **kwargs):
+        plan = self.get_read_plan()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            row = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list(*plan.columns).first()
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            raise Http404
+        return Response(plan.to_representation(row))
+
+
+class IndexedSearchMixin:
+    """
+    Full-text ``?q=`` search on the list endpoint, served from the model's
+    in-memory inverted index (``search.indexes``).
+
+    Matches are listed by relevance, or by ``?ordering=`` when given, and
+    combine with the view's filters, sparse fieldsets and keyset cursors.
+    At most ``search_max_results`` matches are returned.
+    """
+    search_param = 'q'
+    search_max_results = 1000
+    search_ordering = ('-search_score', 'id')
+    # Lets KeysetPagination validate the relevance value in cursors
+    keyset_fields = {'search_score': models.FloatField()}
+
+    def get_search_query(self):
+        return self.request.query_params.get(self.search_param, '').strip()
+
+    def list(self, request, *args, **kwargs):
+        query = self.get_search_query()
+        if not query:
+            return super().list(request, *args, **kwargs)
+        return Response(self.get_search_data(query))
+
+    def get_search_data(self, query):
+        scores = dict(search.indexes[self.queryset.model].search(query, self.search_max_results))
+        queryset = self.filter_queryset(self.get_queryset())
+        if get_requested_ordering(self.request, queryset, self) is None:
+            # Picked up by KeysetPagination in place of the view's default ordering
+            self.keyset_ordering = self.search_ordering
+        plan = self.get_read_plan()
+        columns = [column for column in self.get_read_columns(plan, queryset) if column != 'search_score']
+        if 'id' not in columns:
+            columns.append('id')
+        row_class = namedtuple('SearchRow', columns + ['search_score'])
+        pk_index = columns.index('id')
+        rows = [
+            row_class(*values, scores[values[pk_index]])
+            for values in queryset.filter(pk__in=list(scores)).values_list(*columns)
+        ]
+        page = self.paginator.paginate_list(rows, self.request, self) if self.paginator else None
+        if page is None:
+            rows.sort(key=lambda row: (-row.search_score, row.id))
+        data = [plan.to_representation(row) for row in (rows if page is None else page)]
+        return data if page is None else self.paginator.get_paginated_data(data)
+
+
+@api_view(['GET'])
+def database_diagnostics(request, format=None):
+    """
+    Database connection settings and pool statistics for this worker process
+    """
+    return Response(pool_stats())
+
+
+class UserViewSet(IndexedSearchMixin, FastReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for users
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    filter_backends = [OrderingFilter]
+    ordering_fields = ('username', 'email', 'team', 'created_at')
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(FastReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for teams
     """
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
 
+    @action(detail=False)
+    def totals(self, request):
+        """
+        Calories, activities and active members per team, aggregated in the database.
+        """
+        return Response(team_totals())
 
-class ActivityViewSet(viewsets.ModelViewSet):
+
+class ActivityViewSet(FastReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for activities
     """
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    keyset_ordering = ('-date', '-id')
+    filter_backends = [QueryParamFilterBackend, OrderingFilter]
+    filter_params = {
+        'user': ('user_email', serializers.EmailField()),
+        'activity_type': ('activity_type', serializers.CharField()),
+        'date_from': ('date__gte', serializers.DateField()),
+        'date_to': ('date__lte', serializers.DateField()),
+    }
+    ordering_fields = ('date', 'duration', 'calories_burned', 'created_at')
+    bulk_max_items = 5000
+    bulk_batch_size = 500
+    export_chunk_size = 2000
+
+    def create(self, request, *args, **kwargs):
+        """
+        Create an activity. In buffered ingestion mode the validated activity
+        is queued for a batched write and the response is ``202 Accepted``.
+        """
+        buffer = ingestion.get_buffer()
+        if buffer is None:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        buffer.submit(serializer.validated_data)
+        return Response(serializer.validated_data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer, FastJSONRenderer, BrowsableAPIRenderer])
+    def export(self, request):
+        """
+        Stream every matching activity as NDJSON (default) or CSV.
 
+        Accepts the same filters and ordering as the list endpoint; pick the
+        format with ``?format=csv`` or an ``Accept: text/csv`` header.
+        """
+        export_format = request.accepted_renderer.format
+        if export_format not in EXPORT_FORMATS:
+            export_format = 'ndjson'
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.order_by(*(get_requested_ordering(request, queryset, self) or self.keyset_ordering))
+        generate, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            generate(queryset, self.get_serializer_class(), self.export_chunk_size),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="activities.{export_format}"'
+        return response
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many activities from a JSON array or an NDJSON body.
+
+        Items are validated one by one; valid items are written with batched
+        inserts and invalid ones are reported by index.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of activities.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [f'At most {self.bulk_max_items} activities per request.']})
+
+        serializer = self.get_serializer(data=items, many=True)
+        activities, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                activities.append(Activity(**serializer.child.run_validation(item)))
+            except ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+
+        with transaction.atomic():
+            created = Activity.objects.bulk_create(activities, batch_size=self.bulk_batch_size)
+            record_bulk_created(created)
+
+        if errors and not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'created': len(created),
+            'ids': [str(activity.pk) for activity in created if activity.pk is not None],
+            'errors': errors,
+        }, status=response_status)
+
+
+class LeaderboardViewSet(CachedResponseMixin, FastReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for leaderboard
     """
     queryset = Leaderboard.objects.all().order_by('-total_calories')
     serializer_class = LeaderboardSerializer
+    keyset_ordering = ('-total_calories', 'id')
+    filter_backends = [QueryParamFilterBackend, OrderingFilter]
+    filter_params = {
+        'user': ('user_email', serializers.EmailField()),
+        'team': ('team', serializers.CharField()),
+    }
+    ordering_fields = ('total_calories', 'total_activities', 'rank', 'username')
+
+    def get_window(self):
+        window = self.request.query_params.get('window', 'all')
+        if window not in WINDOWS:
+            raise ValidationError({'window': [f"Must be one of: {', '.join(WINDOWS)}."]})
+        return window
 
+    def get_cache_model(self, request):
+        # Windowed boards change with the current period totals, not with the all-time board
+        window = request.query_params.get('window', 'all')
+        if self.action == 'list' and window in WINDOWS and window != 'all':
+            return UserPeriodTotal
+        return super().get_cache_model(request)
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+    def get_cache_variant(self, request):
+        # A windowed board changes when the week or month rolls over
+        variant = super().get_cache_variant(request)
+        window = request.query_params.get('window', 'all')
+        if window in WINDOWS and window != 'all':
+            variant += f'|{window_bounds(window)[0].isoformat()}'
+        return variant
+
+    def list(self, request, *args, **kwargs):
+        """
+        List the all-time leaderboard, or the current week's or month's
+        with ``?window=week|month``, in the same shape.
+        """
+        window = self.get_window()
+        if window == 'all':
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(lambda request: Response(self.get_window_data(window)), request)
+
+    def get_window_data(self, window):
+        """Filter, order and paginate the ranked rows of a windowed leaderboard."""
+        plan = self.get_read_plan()
+        filters = QueryParamFilterBackend().get_filters(self.request, self)
+        entries = [
+            entry for entry in window_leaderboard(window)
+            if all(getattr(entry, name) == value for name, value in filters.items())
+        ]
+        page = self.paginator.paginate_list(entries, self.request, self) if self.paginator else None
+        data = [
+            plan.to_representation(tuple(getattr(entry, column) for column in plan.columns))
+            for entry in (entries if page is None else page)
+        ]
+        return data if page is None else self.paginator.get_paginated_data(data)
+
+
+class WorkoutViewSet(CachedResponseMixin, IndexedSearchMixin, FastReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for workouts
     """
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
+    filter_backends = [OrderingFilter]
+    ordering_fields = ('name', 'category', 'difficulty', 'duration', 'calories_estimate')
+    recommended_params = {
+        'user': serializers.EmailField(),
+        'limit': serializers.IntegerField(min_value=1, max_value=100, default=10),
+    }
+
+    @action(detail=False)
+    def recommended(self, request):
+        """
+        Workouts ranked for ``?user=`` against their recent activity, best
+        first, each with a ``score``. ``?limit=`` sets how many (default 10).
+        """
+        params, errors = {}, {}
+        for name, field in self.recommended_params.items():
+            try:
+                params[name] = field.run_validation(request.query_params.get(name, serializers.empty))
+            except ValidationError as exc:
+                errors[name] = exc.detail
+        if errors:
+            raise ValidationError(errors)
+        return Response(recommend(params['user'], params['limit']))
+
+
+class StatsView(APIView):
+    """
+    Activity time series served from the daily rollups
+
+    Returns activity count, duration and calories per day, week or month
+    (``?period=``), optionally filtered by user, team, activity type and
+    date range.
+    """
+    filter_params = {
+        'user': ('user_email', serializers.EmailField()),
+        'team': ('team', serializers.CharField()),
+        'activity_type': ('activity_type', serializers.CharField()),
+        'date_from': ('day__gte', serializers.DateField()),
+        'date_to': ('day__lte', serializers.DateField()),
+    }
+
+    def get(self, request, format=None):
+        period = request.query_params.get('period', 'day')
+        if period not in PERIODS:
+            raise ValidationError({'period': [f"Must be one of: {', '.join(PERIODS)}."]})
+        queryset = QueryParamFilterBackend().filter_queryset(request, ActivityRollup.objects.all(), self)
+        rows = queryset.values_list('day', 'activity_count', 'total_duration', 'total_calories')
+        return Response({'period': period, 'series': fold_series(rows.iterator(), period)})
+
+
+class PercentileStatsView(APIView):
+    """
+    Duration and calories percentiles served from the quantile sketches
+
+    Returns the ``?quantiles=`` (default p50, p90, p99) of activity duration
+    and calories per activity type or team (``?by=``), or over all
+    activities with ``?by=all``. ``?activity_type=``/``?team=`` narrow the
+    results to the given keys. Values are within ``relative_error`` of an
+    actual activity value.
+    """
+    groupings = DIMENSIONS + ('all',)
+    default_quantiles = (0.5, 0.9, 0.99)
+
+    def get_quantiles(self, request):
+        value = request.query_params.get('quantiles')
+        if not value:
+            return self.default_quantiles
+        try:
+            quantiles = [float(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            quantiles = []
+        if not quantiles or not all(0 <= q <= 1 for q in quantiles):
+            raise ValidationError({'quantiles': ['Must be comma-separated numbers between 0 and 1.']})
+        return quantiles
+
+    def get(self, request, format=None):
+        by = request.query_params.get('by', 'activity_type')
+        if by not in self.groupings:
+            raise ValidationError({'by': [f"Must be one of: {', '.join(self.groupings)}."]})
+        quantiles = self.get_quantiles(request)
+        summaries = sketches.get_summaries('activity_type' if by == 'all' else by)
+        if by == 'all':
+            # Every activity is in exactly one activity type sketch
+            summaries = {None: (
+                sum(summary.activities for summary in summaries.values()),
+                QuantileSketch().merge_all(summary.duration for summary in summaries.values()),
+                QuantileSketch().merge_all(summary.calories for summary in summaries.values()),
+            )}
+        else:
+            selected = request.query_params.getlist(by)
+            if selected:
+                summaries = {key: summaries[key] for key in selected if key in summaries}
+        results = []
+        for key, (activities, duration, calories) in sorted(summaries.items(), key=lambda item: item[0] or ''):
+            result = {by: key} if by != 'all' else {}
+            result.update(
+                activities=activities,
+                duration=percentiles(duration, quantiles),
+                calories_burned=percentiles(calories, quantiles),
+            )
+            results.append(result)
+        return Response({'by': by, 'relative_error': RELATIVE_ACCURACY, 'results': results})